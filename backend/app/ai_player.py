@@ -1,39 +1,24 @@
-from openai import OpenAI
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Optional
 import os
+import zlib
 from dotenv import load_dotenv
+from app.llm import Completion
+from app.model_router import model_router
+from app.llm_scheduler import PRIORITY_INTERACTIVE
+from app.context_manager import format_party_context
+from app.tracing import span
 
 load_dotenv()
 
 # Model configuration
 DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o")
 
-class AIPlayer:
-    def __init__(self, character: Dict):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.character = character
-        self.conversation_history = []
-        self.model = DEFAULT_MODEL
-        
-    def _build_system_prompt(self) -> str:
-        personality_str = ", ".join(self.character["personality_traits"])
-        
-        return f"""You are {self.character['name']}, a {personality_str} {self.character['race']} {self.character['char_class']}.
-
-CHARACTER STATS:
-- Level: {self.character['level']}
-- HP: {self.character['current_hp']}/{self.character['max_hp']}
-- AC: {self.character['armor_class']}
-- STR: {self.character['strength']}, DEX: {self.character['dexterity']}, CON: {self.character['constitution']}
-- INT: {self.character['intelligence']}, WIS: {self.character['wisdom']}, CHA: {self.character['charisma']}
-
-BACKGROUND: {self.character['background']}
-
-EQUIPMENT: {', '.join(self.character['inventory'])}
+# Shared by every character so providers can cache it as a common prompt prefix
+PLAYER_INSTRUCTIONS = """You are a player in a D&D game, not the Dungeon Master. You roleplay the character described below. React to what the DM describes and make choices for your character.
 
 ROLEPLAY INSTRUCTIONS:
 - Stay in character at all times
-- Your personality is {personality_str}
+- Play to the personality described in your character sheet
 - Interact naturally with other party members
 - Make decisions based on your character's traits and abilities
 - You can discuss plans with other players before acting
@@ -47,35 +32,141 @@ GAME MECHANICS:
 - The DM will tell you when to roll dice
 - In combat, state your intended action on your turn
 - You can ask questions to the DM or other players
-- Work together with your party members
-
-Remember: You are a player in a D&D game, not the Dungeon Master. React to what the DM describes and make choices for your character."""
+- Work together with your party members"""
+
+# Canned replies for when no model can be reached; cheap, in character and stored as "fallback"
+FALLBACK_REPLIES = (
+    "I hesitate and watch how the others react.",
+    "I stay alert and keep close to the party.",
+    "I nod slowly and wait to hear more."
+)
+FALLBACK_COMBAT_ACTION = "I take the Dodge action and wait for an opening."
+
+STATIC_FIELDS = {
+    "name", "race", "char_class", "level", "strength", "dexterity", "constitution",
+    "intelligence", "wisdom", "charisma", "max_hp", "armor_class", "personality_traits", "background"
+}
+
+class PromptStats:
+    def __init__(self):
+        self.renders = 0
+        self.render_hits = 0
+        self.requests = 0
+        self.input_tokens = 0
+        self.cached_tokens = 0
+    
+    def record_render(self, hit: bool):
+        self.renders += 1
+        if hit:
+            self.render_hits += 1
+    
+    def record_completion(self, completion: Completion):
+        self.requests += 1
+        self.input_tokens += completion.input_tokens
+        self.cached_tokens += completion.cached_tokens
+    
+    def snapshot(self) -> Dict:
+        return {
+            "renders": self.renders,
+            "render_hit_ratio": self.render_hits / self.renders if self.renders else 0.0,
+            "requests": self.requests,
+            "input_tokens": self.input_tokens,
+            "cached_tokens": self.cached_tokens,
+            "prefix_hit_ratio": self.cached_tokens / self.input_tokens if self.input_tokens else 0.0
+        }
+
+prompt_stats = PromptStats()
 
-    def get_response(self, dm_message: str, party_context: Optional[List[Dict]] = None) -> str:
-        context_text = ""
-        if party_context:
-            recent_msgs = party_context[-20:]
-            context_text = "\n".join([f"{msg.get('role', 'unknown')}: {msg.get('content', '')}" for msg in recent_msgs])
-            context_text = f"Recent conversation:\n{context_text}\n\n"
+class AIPlayer:
+    def __init__(self, character: Dict):
+        self.character = character
+        self._character_prompt: Optional[str] = None
+        self._state_prompt: Optional[str] = None
+    
+    def _render_character_prompt(self) -> str:
+        personality_str = ", ".join(self.character["personality_traits"])
         
-        full_prompt = f"{self._build_system_prompt()}\n\n{context_text}DM: {dm_message}\n\nRespond as {self.character['name']}:"
+        return f"""YOUR CHARACTER:
+You are {self.character['name']}, a {personality_str} {self.character['race']} {self.character['char_class']}.
+Your personality is {personality_str}.
+
+CHARACTER STATS:
+- Level: {self.character['level']}
+- Max HP: {self.character['max_hp']}
+- AC: {self.character['armor_class']}
+- STR: {self.character['strength']}, DEX: {self.character['dexterity']}, CON: {self.character['constitution']}
+- INT: {self.character['intelligence']}, WIS: {self.character['wisdom']}, CHA: {self.character['charisma']}
+
+BACKGROUND: {self.character['background']}"""
+
+    def _render_state_prompt(self) -> str:
+        return f"""CURRENT STATE:
+- HP: {self.character['current_hp']}/{self.character['max_hp']}
+
+EQUIPMENT: {', '.join(self.character['inventory'])}"""
+
+    def character_sheet(self) -> str:
+        hit = self._character_prompt is not None and self._state_prompt is not None
+        if self._character_prompt is None:
+            self._character_prompt = self._render_character_prompt()
+        if self._state_prompt is None:
+            self._state_prompt = self._render_state_prompt()
+        prompt_stats.record_render(hit)
         
-        try:
-            response = self.client.responses.create(
-                model=self.model,
-                input=full_prompt,
-                temperature=0.8,
-                max_output_tokens=200
-            )
-            
-            content = response.output[0].content
-            if isinstance(content, list):
-                content = content[0].text if hasattr(content[0], 'text') else str(content[0])
-            return content.strip() if isinstance(content, str) else str(content)
-        except Exception as e:
-            return f"[{self.character['name']} seems distracted and doesn't respond] (Error: {str(e)})"
-    
-    def get_combat_action(self, combat_situation: str, party_context: Optional[List[Dict]] = None) -> str:
+        return f"{self._character_prompt}\n\n{self._state_prompt}"
+    
+    def _build_system_prompt(self) -> str:
+        # Static instructions first, per-character sheet next, volatile state last
+        return f"{PLAYER_INSTRUCTIONS}\n\n{self.character_sheet()}"
+    
+    def _build_prompt(self, dm_message: str, party_context: Optional[List[Dict]] = None) -> str:
+        context_text = format_party_context(party_context)
+        return f"{context_text}DM: {dm_message}\n\nRespond as {self.character['name']}:"
+    
+    async def _complete(self, call_type: str, dm_message: str, party_context: Optional[List[Dict]],
+                        priority: int, routing: Optional[Dict]) -> Completion:
+        # Raises LLMError when no reply could be had; callers decide how the character goes quiet.
+        # The completion is returned rather than kept on the player, which prefetches share with live turns
+        with span("build_prompt"):
+            instructions = self._build_system_prompt()
+            prompt = self._build_prompt(dm_message, party_context)
+        completion = await model_router.complete(
+            call_type,
+            priority,
+            routing,
+            instructions=instructions,
+            prompt=prompt,
+            temperature=0.8,
+            max_tokens=200
+        )
+        prompt_stats.record_completion(completion)
+        return completion
+    
+    async def get_response(self, dm_message: str, party_context: Optional[List[Dict]] = None,
+                           priority: int = PRIORITY_INTERACTIVE, routing: Optional[Dict] = None) -> str:
+        return (await self.complete_response(dm_message, party_context, priority, routing)).text
+    
+    async def complete_response(self, dm_message: str, party_context: Optional[List[Dict]] = None,
+                                priority: int = PRIORITY_INTERACTIVE, routing: Optional[Dict] = None) -> Completion:
+        # get_response with the token usage, for callers that account for it
+        return await self._complete("party_response", dm_message, party_context, priority, routing)
+    
+    async def stream_response(self, dm_message: str, party_context: Optional[List[Dict]] = None,
+                              priority: int = PRIORITY_INTERACTIVE,
+                              routing: Optional[Dict] = None) -> AsyncIterator[str]:
+        async for delta in model_router.stream(
+            "party_response",
+            priority,
+            instructions=self._build_system_prompt(),
+            prompt=self._build_prompt(dm_message, party_context),
+            temperature=0.8,
+            max_tokens=200,
+            routing=routing
+        ):
+            yield delta
+    
+    async def get_combat_action(self, combat_situation: str, party_context: Optional[List[Dict]] = None,
+                                priority: int = PRIORITY_INTERACTIVE, routing: Optional[Dict] = None) -> str:
         combat_prompt = f"""COMBAT SITUATION: {combat_situation}
 
 It's your turn in combat. What do you do? 
@@ -91,9 +182,17 @@ Choose from:
 
 State your action clearly and concisely."""
 
-        return self.get_response(combat_prompt, party_context)
+        return (await self._complete("combat_action", combat_prompt, party_context, priority, routing)).text
+    
+    def fallback_response(self, dm_message: str) -> str:
+        # Stable per character and message, so a retried turn doesn't change its story
+        index = zlib.crc32(f"{self.character['name']}:{dm_message}".encode()) % len(FALLBACK_REPLIES)
+        return FALLBACK_REPLIES[index]
     
-    def discuss_with_party(self, topic: str, other_responses: List[str]) -> str:
+    def fallback_combat_action(self) -> str:
+        return FALLBACK_COMBAT_ACTION
+    
+    async def discuss_with_party(self, topic: str, other_responses: List[str]) -> str:
         discussion_context = f"""The party is discussing: {topic}
 
 Other party members have said:
@@ -101,7 +200,15 @@ Other party members have said:
 
 What is your opinion or suggestion? Be brief."""
 
-        return self.get_response(discussion_context)
+        return await self.get_response(discussion_context)
+    
+    def refresh(self, character: Dict):
+        changed = {field: value for field, value in character.items() if self.character.get(field) != value}
+        if changed:
+            self.update_character(changed)
     
     def update_character(self, updates: Dict):
         self.character.update(updates)
+        if STATIC_FIELDS.intersection(updates):
+            self._character_prompt = None
+        self._state_prompt = None
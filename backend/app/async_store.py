@@ -0,0 +1,51 @@
+from typing import Optional
+from sqlalchemy import select
+from app.models import Campaign, CampaignSummary, Character, CombatState, Message
+from app.game_engine import TurnState, turn_state_from
+from app.state_cache import STATE_CACHE_RECENT_MESSAGES, CampaignState, state_cache
+from app.tracing import span
+
+async def load_turn_state(session, campaign_id: int) -> Optional[TurnState]:
+    with span("load_state", campaign_id=campaign_id) as current:
+        if state_cache.listening:
+            state = state_cache.peek(campaign_id)
+        else:
+            version = (await session.execute(
+                select(Campaign.state_version).where(Campaign.id == campaign_id)
+            )).first()
+            if version is None:
+                return None
+            state = state_cache.peek(campaign_id, version[0] or 0)
+        
+        current.set(cached=state is not None)
+        if state is None:
+            state = await _load_campaign_state(session, campaign_id)
+            if state is None:
+                return None
+            state_cache.put(campaign_id, state)
+    return turn_state_from(campaign_id, state)
+
+async def _load_campaign_state(session, campaign_id: int) -> Optional[CampaignState]:
+    campaign = await session.get(Campaign, campaign_id)
+    if not campaign:
+        return None
+    
+    characters = (await session.execute(
+        select(Character).where(Character.campaign_id == campaign_id)
+    )).scalars().all()
+    combat_state = (await session.execute(
+        select(CombatState).where(CombatState.campaign_id == campaign_id)
+    )).scalar_one_or_none()
+    summary = (await session.execute(
+        select(CampaignSummary).where(CampaignSummary.campaign_id == campaign_id)
+    )).scalar_one_or_none()
+    
+    last_summarized = summary.last_message_id if summary else 0
+    messages = (await session.execute(
+        select(Message)
+        .where(Message.campaign_id == campaign_id, Message.id > last_summarized)
+        .order_by(Message.id.desc())
+        .limit(STATE_CACHE_RECENT_MESSAGES)
+    )).scalars().all()
+    
+    return CampaignState(campaign, characters, combat_state, summary, messages)
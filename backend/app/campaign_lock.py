@@ -0,0 +1,119 @@
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+from sqlalchemy import func, select
+from app.database import engine
+import asyncio
+import logging
+import os
+import time
+import weakref
+
+logger = logging.getLogger(__name__)
+
+# Per-campaign serialization settings
+CAMPAIGN_LOCK_TIMEOUT = float(os.getenv("CAMPAIGN_LOCK_TIMEOUT", "60"))
+CAMPAIGN_LOCK_POLL_INTERVAL = float(os.getenv("CAMPAIGN_LOCK_POLL_INTERVAL", "0.05"))
+
+# Advisory locks take a (namespace, campaign_id) key pair so different kinds of work don't collide
+LOCK_TURN = 1
+
+class CampaignLockTimeout(Exception):
+    pass
+
+# Blocks until no other worker holds the campaign; held until the current transaction ends
+def lock_campaign(db, campaign_id: int, namespace: int = LOCK_TURN):
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(select(func.pg_advisory_xact_lock(namespace, campaign_id)))
+
+# Serializes work on a campaign across tasks, worker processes and nodes. Tasks in one process
+# queue on an asyncio.Lock so only one of them polls PostgreSQL for the session-level advisory
+# lock, which is then held on a pooled connection until the work is done.
+class CampaignLocks:
+    def __init__(self, timeout: float = CAMPAIGN_LOCK_TIMEOUT, poll_interval: float = CAMPAIGN_LOCK_POLL_INTERVAL):
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._local: "weakref.WeakValueDictionary[Tuple[int, int], asyncio.Lock]" = weakref.WeakValueDictionary()
+        self.acquired = 0
+        self.timeouts = 0
+        self.held = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+    
+    @asynccontextmanager
+    async def hold(self, campaign_id: int, namespace: int = LOCK_TURN, timeout: Optional[float] = None):
+        key = (namespace, campaign_id)
+        timeout = self.timeout if timeout is None else timeout
+        started = time.perf_counter()
+        deadline = started + timeout
+        
+        local = self._local.get(key)
+        if local is None:
+            local = self._local[key] = asyncio.Lock()
+        try:
+            await asyncio.wait_for(local.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise CampaignLockTimeout(f"Campaign {campaign_id} is busy")
+        
+        try:
+            conn = await self._acquire_advisory(key, deadline)
+            self._record_wait(time.perf_counter() - started)
+            self.held += 1
+            try:
+                yield
+            finally:
+                self.held -= 1
+                if conn is not None:
+                    await asyncio.to_thread(self._release_advisory, conn, key)
+        finally:
+            local.release()
+    
+    async def _acquire_advisory(self, key: Tuple[int, int], deadline: float):
+        if engine.dialect.name != "postgresql":
+            return None
+        
+        conn = await asyncio.to_thread(engine.connect)
+        try:
+            while True:
+                locked = await asyncio.to_thread(
+                    lambda: conn.execute(select(func.pg_try_advisory_lock(*key))).scalar()
+                )
+                # End the implicit transaction; the session-level lock outlives it
+                await asyncio.to_thread(conn.commit)
+                if locked:
+                    return conn
+                if time.perf_counter() + self.poll_interval > deadline:
+                    self.timeouts += 1
+                    raise CampaignLockTimeout(f"Campaign {key[1]} is busy")
+                await asyncio.sleep(self.poll_interval)
+        except BaseException:
+            await asyncio.to_thread(conn.close)
+            raise
+    
+    def _release_advisory(self, conn, key: Tuple[int, int]):
+        try:
+            conn.execute(select(func.pg_advisory_unlock(*key)))
+            conn.commit()
+            conn.close()
+        except Exception:
+            # A connection that may still hold the lock must not go back to the pool
+            logger.exception("Failed to release advisory lock %s; discarding connection", key)
+            conn.invalidate()
+            conn.close()
+    
+    def _record_wait(self, seconds: float):
+        self.acquired += 1
+        self.wait_seconds_total += seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+    
+    def stats(self) -> Dict:
+        return {
+            "backend": "advisory" if engine.dialect.name == "postgresql" else "local",
+            "held": self.held,
+            "acquired": self.acquired,
+            "timeouts": self.timeouts,
+            "avg_wait_seconds": self.wait_seconds_total / self.acquired if self.acquired else 0.0,
+            "max_wait_seconds": self.max_wait_seconds
+        }
+
+campaign_locks = CampaignLocks()
@@ -1,6 +1,6 @@
-import random
-from typing import Dict, List
-from app.dice import DiceRoller
+from typing import Dict, List, Optional
+import numpy as np
+from app.dice import DiceRoller, campaign_rng
 
 class CharacterGenerator:
     RACES = [
@@ -37,26 +37,25 @@ class CharacterGenerator:
     }
     
     @staticmethod
-    def generate_character() -> Dict:
-        race = random.choice(CharacterGenerator.RACES)
-        char_class = random.choice(CharacterGenerator.CLASSES)
-        name = random.choice(CharacterGenerator.FIRST_NAMES[race])
+    def generate_character(rng: Optional[np.random.Generator] = None) -> Dict:
+        rng = rng or campaign_rng(None)
+        race = CharacterGenerator._choice(rng, CharacterGenerator.RACES)
+        char_class = CharacterGenerator._choice(rng, CharacterGenerator.CLASSES)
+        name = CharacterGenerator._choice(rng, CharacterGenerator.FIRST_NAMES[race])
         
-        str_score = DiceRoller.ability_score()
-        dex_score = DiceRoller.ability_score()
-        con_score = DiceRoller.ability_score()
-        int_score = DiceRoller.ability_score()
-        wis_score = DiceRoller.ability_score()
-        cha_score = DiceRoller.ability_score()
+        str_score, dex_score, con_score, int_score, wis_score, cha_score = DiceRoller.ability_scores(6, rng)
         
         hp_dice = CharacterGenerator.CLASS_HP_DICE[char_class]
         max_hp = hp_dice + DiceRoller.modifier(con_score)
         
         ac = 10 + DiceRoller.modifier(dex_score)
         
-        personality = random.sample(CharacterGenerator.PERSONALITIES, 2)
+        personality = [
+            CharacterGenerator.PERSONALITIES[index]
+            for index in rng.choice(len(CharacterGenerator.PERSONALITIES), 2, replace=False)
+        ]
         
-        background = CharacterGenerator._generate_background(name, race, char_class, personality)
+        background = CharacterGenerator._generate_background(name, race, char_class, personality, rng)
         
         return {
             "name": name,
@@ -78,14 +77,15 @@ class CharacterGenerator:
         }
     
     @staticmethod
-    def _generate_background(name: str, race: str, char_class: str, personality: List[str]) -> str:
+    def _generate_background(name: str, race: str, char_class: str, personality: List[str],
+                             rng: np.random.Generator) -> str:
         backgrounds = [
             f"{name} is a {personality[0]} {race} {char_class} who seeks adventure and glory.",
             f"A {personality[1]} {race}, {name} became a {char_class} to protect their village.",
             f"{name}, a {personality[0]} {race} {char_class}, is driven by a mysterious past.",
             f"Once a simple {race}, {name} discovered their talent as a {char_class} and embraced destiny."
         ]
-        return random.choice(backgrounds)
+        return CharacterGenerator._choice(rng, backgrounds)
     
     @staticmethod
     def _starting_equipment(char_class: str) -> List[str]:
@@ -104,5 +104,9 @@ class CharacterGenerator:
         return equipment.get(char_class, ["Basic Equipment", "20 gold"])
     
     @staticmethod
-    def generate_party(size: int) -> List[Dict]:
-        return [CharacterGenerator.generate_character() for _ in range(size)]
+    def _choice(rng: np.random.Generator, options: List):
+        return options[int(rng.integers(len(options)))]
+    
+    @staticmethod
+    def generate_party(size: int, rng: Optional[np.random.Generator] = None) -> List[Dict]:
+        return [CharacterGenerator.generate_character(rng) for _ in range(size)]
@@ -0,0 +1,385 @@
+from typing import Dict, List, Optional, Tuple
+from app.ai_player import AIPlayer
+from app.game_engine import GameEngine, combatant_key, turn_state_from
+from app.llm import LLMError
+from app.llm_resilience import resilient_llm
+from app.llm_scheduler import PRIORITY_PREFETCH
+from app.models import CombatEvent
+from app.prefetch_store import prefetch_store
+from app.state_cache import CampaignState
+from app.tracing import background_task, span
+from app.unit_of_work import TurnTransaction
+import asyncio
+import hashlib
+import os
+
+# Combat turn configuration
+COMBAT_PREFETCH_DEPTH = int(os.getenv("COMBAT_PREFETCH_DEPTH", "2"))
+COMBAT_MAX_AUTO_TURNS = int(os.getenv("COMBAT_MAX_AUTO_TURNS", "12"))
+
+def shared_key(situation: str, round_number: int) -> str:
+    # A character acts once a round, so the round keeps a shared action from being replayed
+    # on a later turn that happens to face the same battlefield
+    return hashlib.sha1(f"{round_number}:{situation}".encode()).hexdigest()
+
+class CombatPrefetcher:
+    # Background get_combat_action calls keyed by combatant. A prefetched action is only used if the
+    # battlefield it was asked about is still the one on the table when the combatant's turn comes.
+    # Finished actions also go to the prefetch store, for when the turn is run by another worker.
+    def __init__(self):
+        self._tasks: Dict[Tuple[int, int], Tuple[str, asyncio.Task]] = {}
+        self.scheduled = 0
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.stale = 0
+    
+    def schedule(self, campaign_id: int, character_id: int, situation: str, round_number: int,
+                 ai_player: AIPlayer, party_context: Optional[List[Dict]] = None, routing: Optional[Dict] = None):
+        key = (campaign_id, character_id)
+        current = self._tasks.get(key)
+        if current is not None:
+            if current[0] == situation:
+                return
+            current[1].cancel()
+            self.stale += 1
+        
+        async def fetch() -> str:
+            action = await ai_player.get_combat_action(situation, party_context, PRIORITY_PREFETCH, routing)
+            background_task(
+                "share_combat_prefetch",
+                asyncio.to_thread(
+                    prefetch_store.save, campaign_id, "combat", shared_key(situation, round_number), character_id, action
+                ),
+                campaign_id=campaign_id, character_id=character_id
+            )
+            return action
+        
+        task = background_task("combat_prefetch", fetch(), campaign_id=campaign_id, character_id=character_id)
+        # Failures of actions nobody ends up waiting for are not worth a warning
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._tasks[key] = (situation, task)
+        self.scheduled += 1
+    
+    async def take(self, campaign_id: int, character_id: int, situation: str,
+                   round_number: int) -> Optional[asyncio.Future]:
+        entry = self._tasks.pop((campaign_id, character_id), None)
+        if entry is not None and entry[0] != situation:
+            entry[1].cancel()
+            self.stale += 1
+            entry = None
+        
+        if entry is not None:
+            self.hits += 1
+            return entry[1]
+        
+        rows = await asyncio.to_thread(
+            prefetch_store.take, campaign_id, "combat", shared_key(situation, round_number), character_id
+        )
+        if not rows:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.shared_hits += 1
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(rows[-1]["text"])
+        return future
+    
+    def cancel_campaign(self, campaign_id: int):
+        for key in [key for key in self._tasks if key[0] == campaign_id]:
+            self._tasks.pop(key)[1].cancel()
+    
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "scheduled": self.scheduled,
+            "pending": sum(1 for _, task in self._tasks.values() if not task.done()),
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+combat_prefetcher = CombatPrefetcher()
+
+class CombatEngine:
+    def __init__(self, engine: GameEngine):
+        self.engine = engine
+    
+    def _combat(self, campaign_id: int) -> Tuple[Optional[CampaignState], Optional[object]]:
+        state = self.engine.get_campaign_state(campaign_id)
+        combat = state.combat_state if state else None
+        return state, combat
+    
+    async def _load(self, campaign_id: int) -> Tuple[Optional[CampaignState], Optional[object]]:
+        # A state cache miss reads through the sync session, which would block the event loop
+        return await asyncio.to_thread(self._combat, campaign_id)
+    
+    def _hit_points(self, state: CampaignState) -> Dict[str, Tuple[int, int]]:
+        hit_points = {f"c{char.id}": (char.current_hp, char.max_hp) for char in state.characters}
+        for enemy in state.combat_state.enemies or []:
+            hit_points[enemy["enemy_id"]] = (enemy["hp"], enemy["max_hp"])
+        return hit_points
+    
+    def status(self, campaign_id: int) -> Optional[Dict]:
+        return self._status(self.engine.get_campaign_state(campaign_id))
+    
+    def _status(self, state: Optional[CampaignState]) -> Optional[Dict]:
+        combat = state.combat_state if state else None
+        if combat is None:
+            return None
+        
+        hit_points = self._hit_points(state)
+        order = []
+        for entry in combat.initiative_order or []:
+            current, maximum = hit_points.get(combatant_key(entry), (0, 0))
+            order.append({**entry, "hp": current, "max_hp": maximum, "down": current <= 0})
+        return {
+            "is_active": bool(combat.is_active),
+            "round_number": combat.round_number,
+            "current_turn": combat.current_turn,
+            "current": order[combat.current_turn] if combat.is_active and order else None,
+            "initiative_order": order,
+            "enemies": combat.enemies or []
+        }
+    
+    def situation(self, state: CampaignState) -> str:
+        # The round number and whose turn it is are left out so a prefetched action stays valid
+        # until hit points actually change
+        hit_points = self._hit_points(state)
+        enemies = {enemy["enemy_id"]: enemy for enemy in state.combat_state.enemies or []}
+        lines = ["Combatants in initiative order:"]
+        for entry in state.combat_state.initiative_order or []:
+            key = combatant_key(entry)
+            current, maximum = hit_points.get(key, (0, 0))
+            side = "enemy" if key in enemies else "party"
+            health = "down" if current <= 0 else f"{current}/{maximum} HP"
+            armor = f", AC {enemies[key]['armor_class']}" if key in enemies else ""
+            lines.append(f"- {entry['character_name']} ({side}): {health}{armor}")
+        return "\n".join(lines)
+    
+    def _next_turn(self, state: CampaignState, hit_points: Dict[str, Tuple[int, int]]) -> Tuple[int, int]:
+        combat = state.combat_state
+        order = combat.initiative_order or []
+        current_turn, round_number = combat.current_turn or 0, combat.round_number or 1
+        for step in range(1, len(order) + 1):
+            index = (current_turn + step) % len(order)
+            if hit_points.get(combatant_key(order[index]), (0, 0))[0] > 0:
+                wrapped = current_turn + step >= len(order)
+                return index, round_number + (1 if wrapped else 0)
+        return current_turn, round_number
+    
+    def _outcome(self, state: CampaignState, hit_points: Dict[str, Tuple[int, int]]) -> Optional[str]:
+        party_up = any(hit_points[f"c{char.id}"][0] > 0 for char in state.characters)
+        enemies = state.combat_state.enemies or []
+        if not party_up:
+            return "defeat"
+        if enemies and all(hit_points[enemy["enemy_id"]][0] <= 0 for enemy in enemies):
+            return "victory"
+        return None
+    
+    def _advance(self, state: CampaignState, turn: TurnTransaction) -> Optional[str]:
+        campaign_id = state.campaign.id
+        hit_points = self._hit_points(state)
+        combat = state.combat_state
+        
+        outcome = self._outcome(state, hit_points)
+        if outcome:
+            turn.update_combat(campaign_id, is_active=False)
+            turn.add_combat_event(campaign_id, combat.round_number, combat.current_turn, "end", {"outcome": outcome})
+            return outcome
+        
+        current_turn, round_number = self._next_turn(state, hit_points)
+        turn.update_combat(campaign_id, current_turn=current_turn, round_number=round_number)
+        turn.add_combat_event(campaign_id, round_number, current_turn, "advance", {"turn": [round_number, current_turn]})
+        return None
+    
+    async def advance_turn(self, campaign_id: int) -> Dict:
+        state, combat = await self._load(campaign_id)
+        if combat is None or not combat.is_active:
+            return {"error": "Combat is not active"}
+        
+        turn = self.engine.begin_turn()
+        outcome = self._advance(state, turn)
+        await self.engine.commit_turn(turn)
+        state, _ = await self._load(campaign_id)
+        self.prefetch(state)
+        return {"outcome": outcome, "combat": self._status(state)}
+    
+    async def apply_effect(self, campaign_id: int, target: str, hp_change: int, note: Optional[str] = None) -> Dict:
+        state, combat = await self._load(campaign_id)
+        if combat is None or not combat.is_active:
+            return {"error": "Combat is not active"}
+        
+        hit_points = self._hit_points(state)
+        if target not in hit_points:
+            return {"error": f"Unknown combatant {target}"}
+        current, maximum = hit_points[target]
+        new_hp = max(0, min(maximum, current + hp_change))
+        hit_points[target] = (new_hp, maximum)
+        
+        turn = self.engine.begin_turn()
+        if target.startswith("c"):
+            name = next(char.name for char in state.characters if f"c{char.id}" == target)
+            turn.update_character(campaign_id, int(target[1:]), current_hp=new_hp)
+        else:
+            name = next(enemy["name"] for enemy in combat.enemies if enemy["enemy_id"] == target)
+            turn.update_combat(campaign_id, enemies=[
+                dict(enemy, hp=new_hp) if enemy["enemy_id"] == target else enemy for enemy in combat.enemies
+            ])
+        
+        delta = {"hp": {target: new_hp - current}}
+        if note:
+            delta["note"] = note
+        turn.add_combat_event(campaign_id, combat.round_number, combat.current_turn, "effect", delta)
+        
+        change = new_hp - current
+        verb = f"takes {-change} damage" if change < 0 else f"regains {change} hit points"
+        turn.add_message(
+            campaign_id=campaign_id,
+            role="system",
+            content=f"{name} {verb}{f' ({note})' if note else ''}" + (" and goes down!" if new_hp == 0 else "."),
+            message_type="combat"
+        )
+        
+        outcome = self._outcome(state, hit_points)
+        if outcome:
+            turn.update_combat(campaign_id, is_active=False)
+            turn.add_combat_event(campaign_id, combat.round_number, combat.current_turn, "end", {"outcome": outcome})
+        await self.engine.commit_turn(turn)
+        
+        state, _ = await self._load(campaign_id)
+        if outcome:
+            combat_prefetcher.cancel_campaign(campaign_id)
+        else:
+            self.prefetch(state)
+        return {"outcome": outcome, "hp": new_hp, "combat": self._status(state)}
+    
+    def prefetch(self, state: Optional[CampaignState], depth: int = COMBAT_PREFETCH_DEPTH, offset: int = 0):
+        # Takes an already loaded state: the prefetches are tasks on the event loop, which must not
+        # wait on the database
+        combat = state.combat_state if state else None
+        if combat is None or not combat.is_active or not combat.initiative_order:
+            return
+        
+        campaign_id = state.campaign.id
+        # Warm the next few party members in initiative order, starting with whoever acts now
+        hit_points = self._hit_points(state)
+        order = combat.initiative_order
+        upcoming = []
+        for step in range(offset, len(order)):
+            entry = order[(combat.current_turn + step) % len(order)]
+            if "character_id" in entry and hit_points.get(combatant_key(entry), (0, 0))[0] > 0:
+                wrapped = combat.current_turn + step >= len(order)
+                upcoming.append((entry, (combat.round_number or 1) + (1 if wrapped else 0)))
+            if len(upcoming) >= depth:
+                break
+        if not upcoming:
+            return
+        
+        situation = self.situation(state)
+        party_context = turn_state_from(campaign_id, state).party_context
+        ai_players = self.engine._get_ai_players(campaign_id, state.characters)
+        for entry, round_number in upcoming:
+            combat_prefetcher.schedule(
+                campaign_id, entry["character_id"], situation, round_number, ai_players[entry["character_id"]],
+                party_context, (state.campaign.settings or {}).get("model_routing")
+            )
+    
+    async def run_ai_turns(self, campaign_id: int, max_turns: int = COMBAT_MAX_AUTO_TURNS) -> Dict:
+        # Party members act until it is an enemy's turn (the DM's call), combat ends or max_turns is hit
+        actions = []
+        outcome = None
+        for _ in range(max_turns):
+            state, combat = await self._load(campaign_id)
+            if combat is None or not combat.is_active or not combat.initiative_order:
+                break
+            entry = combat.initiative_order[combat.current_turn]
+            if "enemy_id" in entry:
+                break
+            
+            turn = self.engine.begin_turn()
+            if self._hit_points(state)[combatant_key(entry)][0] > 0:
+                situation = self.situation(state)
+                
+                def ask() -> asyncio.Future:
+                    ai_players = self.engine._get_ai_players(campaign_id, state.characters)
+                    return asyncio.ensure_future(ai_players[entry["character_id"]].get_combat_action(
+                        situation, turn_state_from(campaign_id, state).party_context,
+                        routing=(state.campaign.settings or {}).get("model_routing")
+                    ))
+                
+                task = await combat_prefetcher.take(
+                    campaign_id, entry["character_id"], situation, combat.round_number or 1
+                )
+                prefetched = task is not None
+                if task is None:
+                    task = ask()
+                # The next party members think while this one's action is being resolved
+                self.prefetch(state, offset=1)
+                status = "ok"
+                with span("combat_action", campaign_id=campaign_id, character_id=entry["character_id"],
+                          prefetched=prefetched) as current:
+                    try:
+                        try:
+                            action = await task
+                        except asyncio.CancelledError:
+                            # combat/end cancels a campaign's prefetches, possibly one already taken here;
+                            # unless this request itself is being cancelled, ask again without it
+                            if not prefetched or not task.cancelled() or asyncio.current_task().cancelling():
+                                raise
+                            prefetched = False
+                            current.set(prefetched=False)
+                            action = await ask()
+                    except LLMError:
+                        status = "fallback"
+                        resilient_llm.record_fallback()
+                        ai_players = self.engine._get_ai_players(campaign_id, state.characters)
+                        action = ai_players[entry["character_id"]].fallback_combat_action()
+                    current.set(status=status)
+                
+                turn.add_message(
+                    campaign_id=campaign_id,
+                    role="player",
+                    content=f"{entry['character_name']}: {action}",
+                    character_id=entry["character_id"],
+                    message_type="combat" if status == "ok" else "fallback"
+                )
+                turn.add_combat_event(
+                    campaign_id, combat.round_number, combat.current_turn, "action",
+                    {"actor": combatant_key(entry), "status": status}
+                )
+                actions.append({
+                    "character_id": entry["character_id"],
+                    "character_name": entry["character_name"],
+                    "action": action,
+                    "status": status,
+                    "prefetched": prefetched
+                })
+            
+            outcome = self._advance(state, turn)
+            await self.engine.commit_turn(turn)
+            if outcome:
+                break
+        
+        state, _ = await self._load(campaign_id)
+        self.prefetch(state)
+        return {"actions": actions, "outcome": outcome, "combat": self._status(state)}
+    
+    def events(self, campaign_id: int, after_id: int = 0, limit: int = 100) -> List[Dict]:
+        events = self.engine.db.query(CombatEvent)\
+            .filter(CombatEvent.campaign_id == campaign_id, CombatEvent.id > after_id)\
+            .order_by(CombatEvent.id)\
+            .limit(limit)\
+            .all()
+        return [
+            {
+                "id": event.id,
+                "round_number": event.round_number,
+                "turn": event.turn,
+                "kind": event.kind,
+                "delta": event.delta
+            }
+            for event in events
+        ]
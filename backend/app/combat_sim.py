@@ -0,0 +1,230 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import numpy as np
+import os
+from app.dice import DiceExpression, DiceExpressionError, DiceRoller, campaign_rng, parse_expression, sample_expression
+
+# Combat simulation limits
+COMBAT_SIM_TRIALS = int(os.getenv("COMBAT_SIM_TRIALS", "2000"))
+COMBAT_SIM_MAX_TRIALS = int(os.getenv("COMBAT_SIM_MAX_TRIALS", "20000"))
+COMBAT_SIM_MAX_ROUNDS = int(os.getenv("COMBAT_SIM_MAX_ROUNDS", "20"))
+COMBAT_SIM_MAX_COMBATANTS = 30
+COMBAT_SIM_MAX_ATTACKS = int(os.getenv("COMBAT_SIM_MAX_ATTACKS", "10"))
+COMBAT_SIM_MAX_DAMAGE_DICE = int(os.getenv("COMBAT_SIM_MAX_DAMAGE_DICE", "40"))
+COMBAT_SIM_MAX_DAMAGE_SIDES = 100
+
+# Typical level 1 weapon or cantrip damage die per class
+CLASS_DAMAGE_DICE = {
+    "Fighter": "1d8", "Wizard": "1d10", "Cleric": "1d8", "Rogue": "1d6",
+    "Ranger": "1d8", "Paladin": "1d8", "Bard": "1d8", "Barbarian": "1d12",
+    "Warlock": "1d10", "Monk": "1d6"
+}
+SPELLCASTING_ABILITY = {"Wizard": "intelligence", "Cleric": "wisdom", "Bard": "charisma", "Warlock": "charisma"}
+
+# (min win rate, max share of party HP lost) per difficulty, checked from easiest to hardest
+DIFFICULTY_THRESHOLDS = (
+    ("easy", 0.98, 0.25),
+    ("medium", 0.9, 0.5),
+    ("hard", 0.7, 1.0)
+)
+
+@dataclass
+class Combatant:
+    name: str
+    max_hp: int
+    armor_class: int
+    attack_bonus: int
+    damage: str
+    initiative_bonus: int = 0
+    attacks: int = 1
+    count: int = 1
+
+@dataclass
+class SimulationResult:
+    trials: int
+    win_rate: float
+    loss_rate: float
+    stalemate_rate: float
+    avg_rounds: float
+    median_rounds: float
+    p90_rounds: float
+    avg_hp_lost: float
+    avg_hp_lost_fraction: float
+    avg_party_deaths: float
+    difficulty: str = ""
+    per_character_hp_lost: Dict[str, float] = field(default_factory=dict)
+    
+    def to_dict(self) -> Dict:
+        return dict(self.__dict__)
+
+def proficiency_bonus(level: int) -> int:
+    return 2 + (max(level, 1) - 1) // 4
+
+def combatant_from_character(char) -> Combatant:
+    modifiers = {
+        ability: DiceRoller.modifier(getattr(char, ability))
+        for ability in ("strength", "dexterity", "intelligence", "wisdom", "charisma")
+    }
+    ability = SPELLCASTING_ABILITY.get(char.char_class)
+    modifier = modifiers[ability] if ability else max(modifiers["strength"], modifiers["dexterity"])
+    die = CLASS_DAMAGE_DICE.get(char.char_class, "1d6")
+    return Combatant(
+        name=char.name,
+        max_hp=max(char.current_hp if char.current_hp is not None else char.max_hp, 1),
+        armor_class=char.armor_class,
+        attack_bonus=proficiency_bonus(char.level) + modifier,
+        # Cantrips add no modifier to damage
+        damage=die if ability else f"{die}{max(modifier, 0):+d}",
+        initiative_bonus=modifiers["dexterity"]
+    )
+
+def combatant_count(combatants: List[Combatant]) -> int:
+    return sum(max(c.count, 1) for c in combatants)
+
+def _expand(combatants: List[Combatant]) -> List[Combatant]:
+    return [c for c in combatants for _ in range(max(c.count, 1))]
+
+def _dice_only(expression: DiceExpression) -> DiceExpression:
+    return DiceExpression(text=expression.text, terms=expression.terms, modifier=0)
+
+def rate_difficulty(win_rate: float, hp_lost_fraction: float) -> str:
+    for difficulty, min_win_rate, max_hp_lost in DIFFICULTY_THRESHOLDS:
+        if win_rate >= min_win_rate and hp_lost_fraction <= max_hp_lost:
+            return difficulty
+    return "deadly"
+
+def simulate(party: List[Combatant], enemies: List[Combatant], trials: int = COMBAT_SIM_TRIALS,
+             max_rounds: int = COMBAT_SIM_MAX_ROUNDS, rng: Optional[np.random.Generator] = None) -> SimulationResult:
+    # Every fight runs side by side: state is a (trials, combatants) array and each initiative
+    # slot is resolved for all trials at once
+    rng = rng or campaign_rng(None)
+    trials = max(1, min(trials, COMBAT_SIM_MAX_TRIALS))
+    # Counted before expanding so a huge count is rejected without building its copies
+    party_size = combatant_count(party)
+    total = party_size + combatant_count(enemies)
+    if not party_size or party_size == total:
+        raise ValueError("Both sides need at least one combatant")
+    if total > COMBAT_SIM_MAX_COMBATANTS:
+        raise ValueError(f"Simulations support at most {COMBAT_SIM_MAX_COMBATANTS} combatants")
+    
+    fighters = _expand(party) + _expand(enemies)
+    damage = [parse_expression(f.damage) for f in fighters]
+    critical = [_dice_only(expr) for expr in damage]
+    max_hp = np.array([f.max_hp for f in fighters], dtype=np.int64)
+    armor_class = np.array([f.armor_class for f in fighters])
+    attack_bonus = np.array([f.attack_bonus for f in fighters])
+    attacks = np.array([f.attacks for f in fighters])
+    is_party = np.arange(total) < party_size
+    trial_index = np.arange(trials)
+    
+    hp = np.tile(max_hp, (trials, 1))
+    initiative = rng.integers(1, 21, size=(trials, total)) + np.array([f.initiative_bonus for f in fighters])
+    # Small noise breaks initiative ties randomly
+    order = np.argsort(-(initiative + rng.random((trials, total))), axis=1)
+    rounds = np.zeros(trials, dtype=np.int64)
+    ongoing = np.ones(trials, dtype=bool)
+    
+    for _ in range(max_rounds):
+        if not ongoing.any():
+            break
+        rounds += ongoing
+        for slot in range(total):
+            actor = order[:, slot]
+            for swing in range(int(attacks.max())):
+                acting = ongoing & (hp[trial_index, actor] > 0) & (attacks[actor] > swing)
+                if not acting.any():
+                    continue
+                
+                # Each attacker picks a random conscious opponent
+                opponents = (hp > 0) & (is_party[None, :] != is_party[actor][:, None])
+                scores = np.where(opponents, rng.random((trials, total)), -1.0)
+                target = scores.argmax(axis=1)
+                acting &= opponents[trial_index, target]
+                
+                natural = rng.integers(1, 21, size=trials)
+                crit = natural == 20
+                hit = crit | ((natural != 1) & (natural + attack_bonus[actor] >= armor_class[target]))
+                
+                # Damage is only rolled for the trials where this fighter actually landed a hit
+                landed = acting & hit
+                dealt = np.zeros(trials, dtype=np.int64)
+                for fighter in np.unique(actor[landed]):
+                    rows = landed & (actor == fighter)
+                    count = int(rows.sum())
+                    rolled = sample_expression(damage[fighter], count, rng)
+                    rolled += np.where(crit[rows], sample_expression(critical[fighter], count, rng), 0)
+                    dealt[rows] = np.maximum(rolled, 0)
+                hp[trial_index, target] -= dealt
+            
+            party_up = (hp[:, :party_size] > 0).any(axis=1)
+            enemies_up = (hp[:, party_size:] > 0).any(axis=1)
+            ongoing &= party_up & enemies_up
+    
+    party_up = (hp[:, :party_size] > 0).any(axis=1)
+    enemies_up = (hp[:, party_size:] > 0).any(axis=1)
+    wins = party_up & ~enemies_up
+    losses = ~party_up
+    lost = (max_hp[:party_size] - np.clip(hp[:, :party_size], 0, None))
+    hp_lost_fraction = float(lost.sum(axis=1).mean() / max_hp[:party_size].sum())
+    
+    result = SimulationResult(
+        trials=trials,
+        win_rate=float(wins.mean()),
+        loss_rate=float(losses.mean()),
+        stalemate_rate=float((party_up & enemies_up).mean()),
+        avg_rounds=float(rounds.mean()),
+        median_rounds=float(np.median(rounds)),
+        p90_rounds=float(np.percentile(rounds, 90)),
+        avg_hp_lost=float(lost.sum(axis=1).mean()),
+        avg_hp_lost_fraction=hp_lost_fraction,
+        avg_party_deaths=float((hp[:, :party_size] <= 0).sum(axis=1).mean()),
+        per_character_hp_lost={
+            fighter.name: float(lost[:, i].mean()) for i, fighter in enumerate(fighters[:party_size])
+        }
+    )
+    result.difficulty = rate_difficulty(result.win_rate, hp_lost_fraction)
+    return result
+
+def default_enemies(party_level: int, party_size: int) -> List[Combatant]:
+    # A rough stand-in when no stat block is available: a bandit-like foe per two party members
+    level = max(party_level, 1)
+    return [Combatant(
+        name="Bandit",
+        max_hp=11 + 5 * (level - 1),
+        armor_class=12 + level // 4,
+        attack_bonus=3 + level // 3,
+        damage=f"1d6{1 + level // 4:+d}",
+        initiative_bonus=1,
+        count=max((party_size + 1) // 2, 1)
+    )]
+
+def default_party(party_level: int, party_size: int = 4) -> List[Combatant]:
+    level = max(party_level, 1)
+    return [
+        Combatant(
+            name=f"Adventurer {i + 1}",
+            max_hp=10 + 7 * (level - 1),
+            armor_class=14,
+            attack_bonus=proficiency_bonus(level) + 3,
+            damage="1d8+3",
+            initiative_bonus=2
+        )
+        for i in range(party_size)
+    ]
+
+def validate_combatant(combatant: Combatant):
+    if combatant.max_hp < 1 or combatant.count < 1 or combatant.attacks < 1:
+        raise ValueError(f"{combatant.name} needs positive hit points, count and attacks")
+    if combatant.count > COMBAT_SIM_MAX_COMBATANTS:
+        raise ValueError(f"{combatant.name}: count must be at most {COMBAT_SIM_MAX_COMBATANTS}")
+    if combatant.attacks > COMBAT_SIM_MAX_ATTACKS:
+        raise ValueError(f"{combatant.name}: attacks must be at most {COMBAT_SIM_MAX_ATTACKS}")
+    try:
+        expression = parse_expression(combatant.damage)
+    except DiceExpressionError as e:
+        raise ValueError(f"{combatant.name}: {e}")
+    # Damage is rolled for every hit of every trial, so it gets tighter limits than a dice roll
+    if sum(term.count for term in expression.terms) > COMBAT_SIM_MAX_DAMAGE_DICE:
+        raise ValueError(f"{combatant.name}: damage can roll at most {COMBAT_SIM_MAX_DAMAGE_DICE} dice")
+    if any(term.sides > COMBAT_SIM_MAX_DAMAGE_SIDES for term in expression.terms):
+        raise ValueError(f"{combatant.name}: damage dice can have at most {COMBAT_SIM_MAX_DAMAGE_SIDES} sides")
@@ -0,0 +1,192 @@
+from typing import Dict, List, Optional
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from app.models import Campaign, CampaignSummary, Message
+from app.database import SessionLocal
+from app.model_router import model_router
+from app.llm_scheduler import PRIORITY_SUMMARY
+from app.state_cache import bump_version, state_cache
+from app.tracing import background_task
+import asyncio
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Model configuration
+DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o")
+
+# Context window configuration
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_TOKEN_BUDGETS = {
+    "gpt-5": 6000,
+    "gpt-5-mini": 4000,
+    "gpt-4o": 4000,
+    "gpt-4o-mini": 3000,
+    "gpt-4-turbo": 4000,
+    "gpt-3.5-turbo": 2000
+}
+CONTEXT_MAX_MESSAGES = int(os.getenv("CONTEXT_MAX_MESSAGES", "100"))
+
+# Rolling summary configuration
+SUMMARY_KEEP_RECENT = int(os.getenv("SUMMARY_KEEP_RECENT", "10"))
+SUMMARY_MIN_NEW_MESSAGES = int(os.getenv("SUMMARY_MIN_NEW_MESSAGES", "20"))
+SUMMARY_MAX_WORDS = int(os.getenv("SUMMARY_MAX_WORDS", "250"))
+
+_summary_tasks: Dict[int, asyncio.Task] = {}
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+def token_budget(model: str) -> int:
+    return CONTEXT_TOKEN_BUDGETS.get(model, CONTEXT_TOKEN_BUDGET)
+
+def format_party_context(party_context: Optional[List[Dict]]) -> str:
+    if not party_context:
+        return ""
+    
+    lines = []
+    for msg in party_context:
+        if msg.get("role") == "summary":
+            lines.append(f"Story so far: {msg.get('content', '')}")
+        else:
+            lines.append(f"{msg.get('role', 'unknown')}: {msg.get('content', '')}")
+    return "Recent conversation:\n" + "\n".join(lines) + "\n\n"
+
+class ContextManager:
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def build_context(self, campaign_id: int, model: str = DEFAULT_MODEL) -> List[Dict]:
+        summary = self.db.query(CampaignSummary).filter(CampaignSummary.campaign_id == campaign_id).first()
+        last_summarized = summary.last_message_id if summary else 0
+        
+        rows = self.db.query(Message)\
+            .filter(Message.campaign_id == campaign_id, Message.id > last_summarized)\
+            .order_by(Message.id.desc())\
+            .limit(CONTEXT_MAX_MESSAGES)\
+            .all()
+        
+        return pack_context(campaign_id, summary, rows, model)
+
+def pack_context(campaign_id: int, summary: Optional[CampaignSummary], rows: List[Message],
+                 model: str = DEFAULT_MODEL) -> List[Dict]:
+    # rows are the unsummarized messages, newest first
+    budget = token_budget(model)
+    summary_entry = None
+    if summary and summary.content:
+        summary_entry = {"role": "summary", "content": summary.content}
+        budget -= estimate_tokens(summary.content)
+    
+    # Newest first until the budget runs out, then back into chronological order
+    party_context = []
+    for msg in rows:
+        cost = estimate_tokens(msg.content)
+        if cost > budget and party_context:
+            break
+        budget -= cost
+        role = "assistant" if msg.role == "player" else "user"
+        party_context.append({"role": role, "content": msg.content})
+    party_context.reverse()
+    
+    if summary_entry:
+        party_context.insert(0, summary_entry)
+    
+    if len(rows) >= SUMMARY_KEEP_RECENT + SUMMARY_MIN_NEW_MESSAGES:
+        schedule_summary(campaign_id)
+    
+    return party_context
+
+def schedule_summary(campaign_id: int):
+    if campaign_id in _summary_tasks:
+        return
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    _summary_tasks[campaign_id] = background_task("summary", _update_summary(campaign_id), campaign_id=campaign_id)
+
+def _summary_input(campaign_id: int) -> Optional[Dict]:
+    db = SessionLocal()
+    try:
+        summary = db.query(CampaignSummary).filter(CampaignSummary.campaign_id == campaign_id).first()
+        last_message_id = summary.last_message_id if summary else None
+        messages = db.query(Message)\
+            .filter(Message.campaign_id == campaign_id, Message.id > (last_message_id or 0))\
+            .order_by(Message.id)\
+            .all()
+        to_fold = messages[:-SUMMARY_KEEP_RECENT]
+        if len(to_fold) < SUMMARY_MIN_NEW_MESSAGES:
+            return None
+        
+        settings = db.query(Campaign.settings).filter(Campaign.id == campaign_id).scalar() or {}
+        return {
+            "content": summary.content if summary else "",
+            "based_on": last_message_id,
+            "events": "\n".join(f"{msg.role}: {msg.content}" for msg in to_fold),
+            "last_message_id": to_fold[-1].id,
+            "routing": settings.get("model_routing")
+        }
+    finally:
+        db.close()
+
+def _save_summary(campaign_id: int, content: str, based_on: Optional[int], last_message_id: int):
+    # Written only if the summary is still the one the new text was built from; another worker
+    # folding the same messages at the same time loses instead of overwriting
+    db = SessionLocal()
+    try:
+        if based_on is None:
+            # campaign_id is unique, so a concurrent first summary fails here rather than doubling up
+            db.add(CampaignSummary(campaign_id=campaign_id, content=content, last_message_id=last_message_id))
+            db.flush()
+        else:
+            updated = db.execute(
+                update(CampaignSummary)
+                .where(CampaignSummary.campaign_id == campaign_id, CampaignSummary.last_message_id == based_on)
+                .values(content=content, last_message_id=last_message_id)
+            ).rowcount
+            if not updated:
+                db.rollback()
+                return
+        version = bump_version(db, campaign_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    state_cache.invalidate(campaign_id, version)
+
+async def _update_summary(campaign_id: int):
+    # No transaction is open while the model writes the summary; reads and the write each get a short one
+    try:
+        current = await asyncio.to_thread(_summary_input, campaign_id)
+        if current is None:
+            return
+        
+        prompt = f"""CURRENT SUMMARY:
+{current["content"] or "The adventure has just begun."}
+
+NEW EVENTS:
+{current["events"]}
+
+Rewrite the summary so it covers the new events. Keep names, places, quests, items, decisions and unresolved threads. Use at most {SUMMARY_MAX_WORDS} words."""
+
+        completion = await model_router.complete(
+            "summary",
+            PRIORITY_SUMMARY,
+            current["routing"],
+            instructions="You keep a concise running summary of a D&D campaign for the players.",
+            prompt=prompt,
+            temperature=0.3,
+            max_tokens=SUMMARY_MAX_WORDS * 2
+        )
+        
+        await asyncio.to_thread(
+            _save_summary, campaign_id, completion.text, current["based_on"], current["last_message_id"]
+        )
+    except Exception:
+        # Keep the previous summary; the next turn past the threshold will try again
+        pass
+    finally:
+        _summary_tasks.pop(campaign_id, None)
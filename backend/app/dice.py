@@ -1,11 +1,157 @@
-import random
-from typing import List, Tuple
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Tuple
+import numpy as np
+import os
+import re
+
+# Dice expression limits, so a single request can't ask for an unbounded amount of work
+DICE_MAX_COUNT = int(os.getenv("DICE_MAX_COUNT", "10000"))
+DICE_MAX_SIDES = int(os.getenv("DICE_MAX_SIDES", "1000"))
+DICE_MAX_TERMS = 20
+# Keeps totals well inside the int64 arrays used for sampling
+DICE_MAX_MODIFIER = 1_000_000
+
+STANDARD_DICE = ("d4", "d6", "d8", "d10", "d12", "d20", "d100")
+
+_TERM = re.compile(r"([+-])?(?:(\d*)d(\d+|%)(?:(kh|kl|dh|dl|k)(\d+))?|(\d+))", re.IGNORECASE)
+
+class DiceExpressionError(ValueError):
+    pass
+
+@dataclass(frozen=True)
+class DiceTerm:
+    count: int
+    sides: int
+    sign: int = 1
+    keep: Optional[str] = None
+    keep_count: int = 0
+    
+    @property
+    def kept(self) -> int:
+        return self.keep_count if self.keep else self.count
+
+@dataclass(frozen=True)
+class DiceExpression:
+    text: str
+    terms: Tuple[DiceTerm, ...]
+    modifier: int = 0
+    
+    @property
+    def dice_count(self) -> int:
+        return sum(term.count for term in self.terms)
+
+@dataclass
+class DiceResult:
+    expression: str
+    total: int
+    modifier: int
+    rolls: List[List[int]]
+    kept: List[List[int]]
+    
+    @property
+    def final_total(self) -> int:
+        return self.total + self.modifier
+
+@lru_cache(maxsize=1024)
+def parse_expression(text: str) -> DiceExpression:
+    source = re.sub(r"\s*([+-])\s*", r"\1", text.strip()).lower()
+    if not source:
+        raise DiceExpressionError("Empty dice expression")
+    
+    terms = []
+    modifier = 0
+    position = 0
+    while position < len(source):
+        match = _TERM.match(source, position)
+        if not match or match.end() == position or (position > 0 and not match.group(1)):
+            raise DiceExpressionError(f"Invalid dice expression: {text}")
+        position = match.end()
+        
+        sign = -1 if match.group(1) == "-" else 1
+        if match.group(6) is not None:
+            modifier += sign * int(match.group(6))
+            continue
+        
+        count = int(match.group(2)) if match.group(2) else 1
+        sides = 100 if match.group(3) == "%" else int(match.group(3))
+        # "k" alone means keep highest; drop-lowest/highest are rewritten as keeps
+        keep = {"k": "kh", "kh": "kh", "kl": "kl", "dl": "kh", "dh": "kl"}.get(match.group(4))
+        keep_count = int(match.group(5)) if match.group(5) else 0
+        if match.group(4) in ("dl", "dh"):
+            keep_count = count - keep_count
+        
+        if count < 1 or sides < 1:
+            raise DiceExpressionError(f"Dice need at least one die and one side: {text}")
+        if sides > DICE_MAX_SIDES:
+            raise DiceExpressionError(f"Dice can have at most {DICE_MAX_SIDES} sides")
+        if keep and not 0 < keep_count <= count:
+            raise DiceExpressionError(f"Cannot keep {keep_count} of {count} dice: {text}")
+        terms.append(DiceTerm(count=count, sides=sides, sign=sign, keep=keep, keep_count=keep_count))
+    
+    if abs(modifier) > DICE_MAX_MODIFIER:
+        raise DiceExpressionError(f"Dice modifiers must be between -{DICE_MAX_MODIFIER} and {DICE_MAX_MODIFIER}")
+    if len(terms) > DICE_MAX_TERMS:
+        raise DiceExpressionError(f"Dice expressions can have at most {DICE_MAX_TERMS} dice terms")
+    expression = DiceExpression(text=source, terms=tuple(terms), modifier=modifier)
+    if expression.dice_count > DICE_MAX_COUNT:
+        raise DiceExpressionError(f"Dice expressions can roll at most {DICE_MAX_COUNT} dice")
+    return expression
+
+_default_rng = np.random.default_rng()
+
+def campaign_rng(seed: Optional[int], counter: int = 0) -> np.random.Generator:
+    # Each roll of a seeded campaign gets its own stream, so any worker can reproduce roll N
+    if seed is None:
+        return _default_rng
+    return np.random.default_rng([seed, counter])
+
+def _keep(rolls: np.ndarray, term: DiceTerm) -> np.ndarray:
+    if not term.keep:
+        return rolls
+    ordered = np.sort(rolls, axis=-1)
+    return ordered[..., -term.keep_count:] if term.keep == "kh" else ordered[..., :term.keep_count]
+
+def sample_expression(expression: DiceExpression, times: int, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    rng = rng or _default_rng
+    totals = np.full(times, expression.modifier, dtype=np.int64)
+    for term in expression.terms:
+        rolls = rng.integers(1, term.sides + 1, size=(times, term.count))
+        totals += term.sign * _keep(rolls, term).sum(axis=1)
+    return totals
+
+def roll_expression(expression: DiceExpression, rng: Optional[np.random.Generator] = None) -> DiceResult:
+    rng = rng or _default_rng
+    total = 0
+    all_rolls = []
+    all_kept = []
+    for term in expression.terms:
+        rolls = rng.integers(1, term.sides + 1, size=term.count)
+        kept = _keep(rolls, term)
+        total += term.sign * int(kept.sum())
+        all_rolls.append(rolls.tolist())
+        all_kept.append(kept.tolist())
+    return DiceResult(
+        expression=expression.text,
+        total=total,
+        modifier=expression.modifier,
+        rolls=all_rolls,
+        kept=all_kept
+    )
 
 class DiceRoller:
     @staticmethod
-    def roll(sides: int, count: int = 1) -> Tuple[int, List[int]]:
-        rolls = [random.randint(1, sides) for _ in range(count)]
-        return sum(rolls), rolls
+    def evaluate(expression: str, rng: Optional[np.random.Generator] = None) -> DiceResult:
+        return roll_expression(parse_expression(expression), rng)
+    
+    @staticmethod
+    def sample(expression: str, times: int, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+        return sample_expression(parse_expression(expression), times, rng)
+    
+    @staticmethod
+    def roll(sides: int, count: int = 1, rng: Optional[np.random.Generator] = None) -> Tuple[int, List[int]]:
+        result = DiceRoller.evaluate(f"{count}d{sides}", rng)
+        return result.total, result.rolls[0]
     
     @staticmethod
     def d4(count: int = 1) -> Tuple[int, List[int]]:
@@ -36,10 +182,12 @@ class DiceRoller:
         return DiceRoller.roll(100, count)
     
     @staticmethod
-    def ability_score() -> int:
-        rolls = [random.randint(1, 6) for _ in range(4)]
-        rolls.sort(reverse=True)
-        return sum(rolls[:3])
+    def ability_score(rng: Optional[np.random.Generator] = None) -> int:
+        return DiceRoller.evaluate("4d6kh3", rng).final_total
+    
+    @staticmethod
+    def ability_scores(count: int = 6, rng: Optional[np.random.Generator] = None) -> List[int]:
+        return DiceRoller.sample("4d6kh3", count, rng).tolist()
     
     @staticmethod
     def modifier(score: int) -> int:
@@ -0,0 +1,240 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from math import comb
+from typing import Dict, Optional, Tuple
+import numpy as np
+import os
+from app.dice import DiceExpression, DiceExpressionError, DiceTerm, campaign_rng, parse_expression, sample_expression
+
+# Exact analysis limits; anything larger is estimated with Monte Carlo instead
+DICE_EXACT_MAX_OUTCOMES = int(os.getenv("DICE_EXACT_MAX_OUTCOMES", "100000"))
+DICE_EXACT_MAX_KEEP_DICE = int(os.getenv("DICE_EXACT_MAX_KEEP_DICE", "20"))
+# Array cells the keep/drop dynamic program may touch; it grows with sides² × count² × kept dice
+DICE_EXACT_MAX_KEEP_WORK = int(os.getenv("DICE_EXACT_MAX_KEEP_WORK", "50000000"))
+DICE_MONTE_CARLO_TRIALS = int(os.getenv("DICE_MONTE_CARLO_TRIALS", "100000"))
+DICE_MONTE_CARLO_MAX_TRIALS = 1000000
+# Monte Carlo is bounded by dice rolled rather than trials, so huge pools get fewer trials
+DICE_MONTE_CARLO_MAX_ROLLS = int(os.getenv("DICE_MONTE_CARLO_MAX_ROLLS", "20000000"))
+MONTE_CARLO_CHUNK_ROLLS = 1000000
+DICE_STATS_CACHE_SIZE = int(os.getenv("DICE_STATS_CACHE_SIZE", "1024"))
+
+ANALYSIS_METHODS = ("auto", "exact", "monte_carlo")
+
+class DistributionTooLarge(DiceExpressionError):
+    pass
+
+@dataclass(frozen=True)
+class Distribution:
+    # probs[i] is the probability of rolling minimum + i
+    minimum: int
+    probs: np.ndarray
+    exact: bool = True
+    
+    @property
+    def maximum(self) -> int:
+        return self.minimum + len(self.probs) - 1
+    
+    @property
+    def mean(self) -> float:
+        return float(np.dot(self.probs, np.arange(self.minimum, self.maximum + 1)))
+    
+    @property
+    def std(self) -> float:
+        values = np.arange(self.minimum, self.maximum + 1)
+        return float(np.sqrt(np.dot(self.probs, (values - self.mean) ** 2)))
+    
+    def p_at_least(self, target: int) -> float:
+        index = target - self.minimum
+        if index <= 0:
+            # Partial distributions (such as the 2-19 slice of a d20) carry less than all the mass
+            return min(float(self.probs.sum()), 1.0)
+        if index >= len(self.probs):
+            return 0.0
+        return float(self.probs[index:].sum())
+    
+    def percentile(self, fraction: float) -> int:
+        index = int(np.searchsorted(np.cumsum(self.probs), fraction - 1e-12))
+        return self.minimum + min(index, len(self.probs) - 1)
+    
+    def outcomes(self) -> Dict[int, float]:
+        return {self.minimum + i: float(p) for i, p in enumerate(self.probs) if p > 0}
+
+def _convolve(a: Distribution, b: Distribution) -> Distribution:
+    return Distribution(a.minimum + b.minimum, np.convolve(a.probs, b.probs), a.exact and b.exact)
+
+def _negate(dist: Distribution) -> Distribution:
+    return Distribution(-dist.maximum, dist.probs[::-1].copy(), dist.exact)
+
+@lru_cache(maxsize=DICE_STATS_CACHE_SIZE)
+def _sum_distribution(count: int, sides: int) -> Distribution:
+    # Convolution powers are built by halving, so 8d6 reuses the cached 4d6
+    if count == 1:
+        return Distribution(1, np.full(sides, 1.0 / sides))
+    half = _sum_distribution(count // 2, sides)
+    rest = _sum_distribution(count - count // 2, sides)
+    return _convolve(half, rest)
+
+@lru_cache(maxsize=DICE_STATS_CACHE_SIZE)
+def _keep_distribution(count: int, sides: int, keep: str, keep_count: int) -> Distribution:
+    # Walk the faces from the kept end, choosing how many dice show each face; the kept dice are
+    # the first keep_count dice placed. States are (dice placed, dice kept) -> weights by kept sum.
+    faces = range(sides, 0, -1) if keep == "kh" else range(1, sides + 1)
+    max_sum = keep_count * sides
+    states = {(0, 0): np.zeros(max_sum + 1)}
+    states[(0, 0)][0] = 1.0
+    for face in faces:
+        next_states: Dict[Tuple[int, int], np.ndarray] = {}
+        for (placed, kept), weights in states.items():
+            remaining = count - placed
+            for shown in range(remaining + 1):
+                newly_kept = min(shown, keep_count - kept)
+                shifted = np.zeros(max_sum + 1)
+                offset = newly_kept * face
+                shifted[offset:] = weights[:max_sum + 1 - offset] * comb(remaining, shown)
+                key = (placed + shown, kept + newly_kept)
+                if key in next_states:
+                    next_states[key] += shifted
+                else:
+                    next_states[key] = shifted
+        states = next_states
+    
+    weights = states[(count, keep_count)] / float(sides) ** count
+    return Distribution(keep_count, weights[keep_count:])
+
+def _keep_work(term: DiceTerm) -> int:
+    # Faces × (placed, shown) pairs × width of the kept-sum arrays
+    return term.sides * (term.count + 1) * (term.count + 2) // 2 * (term.keep_count * term.sides + 1)
+
+def term_distribution(term: DiceTerm) -> Distribution:
+    if term.keep and term.keep_count < term.count:
+        if term.count > DICE_EXACT_MAX_KEEP_DICE:
+            raise DistributionTooLarge(f"Exact keep/drop analysis supports at most {DICE_EXACT_MAX_KEEP_DICE} dice")
+        if _keep_work(term) > DICE_EXACT_MAX_KEEP_WORK:
+            raise DistributionTooLarge(f"Keep/drop term {term.count}d{term.sides} is too large for exact analysis")
+        dist = _keep_distribution(term.count, term.sides, term.keep, term.keep_count)
+    else:
+        dist = _sum_distribution(term.count, term.sides)
+    return dist if term.sign > 0 else _negate(dist)
+
+@lru_cache(maxsize=DICE_STATS_CACHE_SIZE)
+def exact_distribution(text: str) -> Distribution:
+    return _expression_distribution(parse_expression(text))
+
+def _expression_distribution(expression: DiceExpression) -> Distribution:
+    outcomes = sum(term.kept * (term.sides - 1) + 1 for term in expression.terms)
+    if outcomes > DICE_EXACT_MAX_OUTCOMES:
+        raise DistributionTooLarge(f"Expression has more than {DICE_EXACT_MAX_OUTCOMES} possible totals")
+    
+    dist = Distribution(expression.modifier, np.ones(1))
+    for term in expression.terms:
+        dist = _convolve(dist, term_distribution(term))
+    return dist
+
+def monte_carlo_distribution(expression: DiceExpression, trials: int = DICE_MONTE_CARLO_TRIALS,
+                             rng: Optional[np.random.Generator] = None) -> Distribution:
+    rng = rng or campaign_rng(None)
+    dice = max(expression.dice_count, 1)
+    trials = max(1, min(trials, DICE_MONTE_CARLO_MAX_ROLLS // dice))
+    chunk = max(1, MONTE_CARLO_CHUNK_ROLLS // dice)
+    totals = np.concatenate([
+        sample_expression(expression, min(chunk, trials - start), rng) for start in range(0, trials, chunk)
+    ])
+    minimum = int(totals.min())
+    counts = np.bincount(totals - minimum)
+    return Distribution(minimum, counts / trials, exact=False)
+
+def distribution(text: str, method: str = "auto", trials: int = DICE_MONTE_CARLO_TRIALS) -> Distribution:
+    if method not in ANALYSIS_METHODS:
+        raise DiceExpressionError(f"method must be one of: {', '.join(ANALYSIS_METHODS)}")
+    expression = parse_expression(text)
+    if method != "monte_carlo":
+        try:
+            return exact_distribution(expression.text)
+        except DistributionTooLarge:
+            if method == "exact":
+                raise
+    return _cached_monte_carlo(expression.text, min(trials, DICE_MONTE_CARLO_MAX_TRIALS))
+
+@lru_cache(maxsize=DICE_STATS_CACHE_SIZE)
+def _cached_monte_carlo(text: str, trials: int) -> Distribution:
+    return monte_carlo_distribution(parse_expression(text), trials)
+
+def _summary(dist: Distribution) -> Dict:
+    return {
+        "exact": dist.exact,
+        "min": dist.minimum,
+        "max": dist.maximum,
+        "mean": dist.mean,
+        "std": dist.std,
+        "median": dist.percentile(0.5),
+        "p10": dist.percentile(0.1),
+        "p90": dist.percentile(0.9)
+    }
+
+@lru_cache(maxsize=DICE_STATS_CACHE_SIZE)
+def analyze(text: str, dc: Optional[int] = None, method: str = "auto",
+            trials: int = DICE_MONTE_CARLO_TRIALS, include_outcomes: bool = True) -> Dict:
+    dist = distribution(text, method, trials)
+    result = {"expression": parse_expression(text).text, **_summary(dist)}
+    if dc is not None:
+        result["dc"] = dc
+        result["p_at_least_dc"] = dist.p_at_least(dc)
+    if include_outcomes:
+        result["outcomes"] = dist.outcomes()
+    return result
+
+@lru_cache(maxsize=DICE_STATS_CACHE_SIZE)
+def attack_odds(attack: str, damage: str, armor_class: int) -> Dict:
+    attack_expression = parse_expression(attack)
+    d20_terms = [term for term in attack_expression.terms if term.sides == 20 and term.kept == 1]
+    if len(d20_terms) != 1 or d20_terms[0].sign < 0:
+        raise DiceExpressionError("Attack rolls need exactly one d20 (for example 1d20+5 or 2d20kh1+5)")
+    d20 = d20_terms[0]
+    others = DiceExpression(
+        text=attack_expression.text,
+        terms=tuple(term for term in attack_expression.terms if term is not d20),
+        modifier=attack_expression.modifier
+    )
+    
+    # A natural 1 always misses and a natural 20 always hits and crits; only 2-19 are compared to AC
+    natural = term_distribution(d20)
+    p_crit = float(natural.probs[-1])
+    middle = Distribution(2, natural.probs[1:-1].copy())
+    try:
+        bonus = _expression_distribution(others)
+    except DistributionTooLarge:
+        bonus = monte_carlo_distribution(others)
+    p_hit = _convolve(middle, bonus).p_at_least(armor_class)
+    
+    # Critical hits roll the damage dice twice but add the flat modifier once
+    damage_expression = parse_expression(damage)
+    damage_dist = distribution(damage_expression.text)
+    crit_damage = 2 * damage_dist.mean - damage_expression.modifier
+    expected = p_hit * max(damage_dist.mean, 0.0) + p_crit * max(crit_damage, 0.0)
+    
+    return {
+        "attack": attack_expression.text,
+        "damage": damage_expression.text,
+        "armor_class": armor_class,
+        "exact": bonus.exact and damage_dist.exact,
+        "p_hit": p_hit + p_crit,
+        "p_crit": p_crit,
+        "p_miss": 1.0 - p_hit - p_crit,
+        "average_damage_on_hit": damage_dist.mean,
+        "average_damage_on_crit": crit_damage,
+        "expected_damage": expected
+    }
+
+def cache_stats() -> Dict:
+    def info(cached) -> Dict:
+        stats = cached.cache_info()
+        return {"hits": stats.hits, "misses": stats.misses, "size": stats.currsize}
+    
+    return {
+        "analyze": info(analyze),
+        "attack_odds": info(attack_odds),
+        "exact_distribution": info(exact_distribution),
+        "monte_carlo": info(_cached_monte_carlo),
+        "sum_distribution": info(_sum_distribution),
+        "keep_distribution": info(_keep_distribution)
+    }
@@ -1,21 +1,99 @@
-from openai import OpenAI
-from typing import List, Dict, Optional
-import os
+from dataclasses import asdict
+from typing import Any, Awaitable, Callable, List, Dict, Optional, Tuple
+import asyncio
+import json
 from dotenv import load_dotenv
+from app.model_router import model_router
+from app.llm_scheduler import PRIORITY_SUGGESTION
+from app.suggestion_cache import suggestion_cache
+from app.combat_sim import Combatant, default_enemies, default_party, simulate, validate_combatant
 
 load_dotenv()
 
-# Model configuration
-DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o")
+ENCOUNTER_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "description": {"type": "string"},
+        "enemies": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "count": {"type": "integer"},
+                    "hit_points": {"type": "integer"},
+                    "armor_class": {"type": "integer"},
+                    "attack_bonus": {"type": "integer"},
+                    "damage": {"type": "string"}
+                },
+                "required": ["name", "count", "hit_points", "armor_class", "attack_bonus", "damage"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["description", "enemies"],
+    "additionalProperties": False
+}
+
+DEFAULT_SCENARIOS = [
+    "1. A mysterious stranger approaches with a quest",
+    "2. Strange sounds echo from a nearby cave",
+    "3. The party encounters bandits on the road"
+]
 
 class DMAssistant:
-    def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.model = DEFAULT_MODEL
+    def __init__(self, routing: Optional[Dict] = None):
+        # The campaign's model_routing setting, if any
+        self.routing = routing
     
-    def suggest_scenarios(self, context: str, party_info: List[Dict]) -> List[str]:
+    async def suggest_scenarios(self, context: str, party_info: List[Dict]) -> List[str]:
         party_summary = self._summarize_party(party_info)
+        key = suggestion_cache.key("scenarios", party=party_summary, context=context)
+        return await self._cached(key, lambda: self._generate_scenarios(context, party_summary), DEFAULT_SCENARIOS)
+    
+    async def suggest_npc_dialogue(self, npc_description: str, situation: str) -> str:
+        key = suggestion_cache.key("npc_dialogue", npc=npc_description, situation=situation)
+        return await self._cached(
+            key,
+            lambda: self._generate_npc_dialogue(npc_description, situation),
+            "[NPC speaks but you can't quite make out the words]"
+        )
+    
+    async def suggest_encounter(self, party_level: int, environment: str,
+                                party: Optional[List[Combatant]] = None) -> Dict:
+        party = party or default_party(party_level)
+        key = suggestion_cache.key(
+            "encounter",
+            level=party_level,
+            environment=environment,
+            party=[asdict(member) for member in party]
+        )
+        return await self._cached(
+            key,
+            lambda: self._generate_encounter(party_level, environment, party),
+            lambda: self._rate_encounter(
+                f"A group of enemies appears in the {environment}",
+                default_enemies(party_level, len(party)),
+                party
+            )
+        )
+    
+    async def _cached(self, key: str, generate: Callable[[], Awaitable[Any]], fallback: Any) -> Any:
+        cached = suggestion_cache.get(key)
+        if cached is not None:
+            suggestion_cache.prefetch(key, generate)
+            return cached
         
+        try:
+            result = await generate()
+        except Exception:
+            return await fallback() if callable(fallback) else fallback
+        
+        suggestion_cache.add(key, result)
+        suggestion_cache.prefetch(key, generate)
+        return result
+    
+    async def _generate_scenarios(self, context: str, party_summary: str) -> List[str]:
         prompt = f"""You are assisting a Dungeon Master in a D&D game.
 
 PARTY COMPOSITION:
@@ -32,33 +110,23 @@ Generate 3 diverse scenario suggestions for the DM. Each should be:
 
 Format as a numbered list."""
 
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a creative D&D scenario generator helping a DM."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.9,
-                max_tokens=300
-            )
-            
-            suggestions_text = response.choices[0].message.content.strip()
-            suggestions = [line.strip() for line in suggestions_text.split('\n') if line.strip() and any(c.isdigit() for c in line[:3])]
-            
-            return suggestions[:3] if suggestions else [
-                "1. A mysterious stranger approaches with a quest",
-                "2. Strange sounds echo from a nearby cave",
-                "3. The party encounters bandits on the road"
-            ]
-        except Exception as e:
-            return [
-                "1. A mysterious stranger approaches with a quest",
-                "2. Strange sounds echo from a nearby cave",
-                "3. The party encounters bandits on the road"
-            ]
+        completion = await model_router.complete(
+            "scenarios",
+            PRIORITY_SUGGESTION,
+            self.routing,
+            instructions="You are a creative D&D scenario generator helping a DM.",
+            prompt=prompt,
+            temperature=0.9,
+            max_tokens=300
+        )
+        
+        suggestions_text = completion.text
+        suggestions = [line.strip() for line in suggestions_text.split('\n') if line.strip() and any(c.isdigit() for c in line[:3])]
+        if not suggestions:
+            raise ValueError("No numbered suggestions in completion")
+        return suggestions[:3]
     
-    def suggest_npc_dialogue(self, npc_description: str, situation: str) -> str:
+    async def _generate_npc_dialogue(self, npc_description: str, situation: str) -> str:
         prompt = f"""Generate a brief dialogue line for an NPC in a D&D game.
 
 NPC: {npc_description}
@@ -66,54 +134,79 @@ SITUATION: {situation}
 
 Provide a single line of dialogue (1-2 sentences) that this NPC would say. Make it flavorful and in-character."""
 
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a D&D NPC dialogue generator."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.8,
-                max_tokens=100
-            )
-            
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            return "[NPC speaks but you can't quite make out the words]"
+        completion = await model_router.complete(
+            "npc_dialogue",
+            PRIORITY_SUGGESTION,
+            self.routing,
+            instructions="You are a D&D NPC dialogue generator.",
+            prompt=prompt,
+            temperature=0.8,
+            max_tokens=100
+        )
+        
+        return completion.text
     
-    def suggest_encounter(self, party_level: int, environment: str) -> Dict:
+    async def _generate_encounter(self, party_level: int, environment: str, party: List[Combatant]) -> Dict:
         prompt = f"""Generate a combat encounter for a D&D party.
 
 Party Level: {party_level}
+Party Size: {len(party)}
 Environment: {environment}
 
 Provide:
-1. Enemy type(s) and number
-2. Brief tactical setup
-3. Potential complications
+1. A brief description with the tactical setup and potential complications
+2. A stat block for each enemy type: name, how many, hit points, armor class, attack bonus and damage dice (for example "1d8+2")
 
-Keep it brief and balanced for the party level."""
+Keep it balanced for the party level."""
 
+        completion = await model_router.complete(
+            "encounter",
+            PRIORITY_SUGGESTION,
+            self.routing,
+            instructions="You are a D&D encounter designer.",
+            prompt=prompt,
+            temperature=0.8,
+            max_tokens=400,
+            schema=ENCOUNTER_SCHEMA
+        )
+        
+        description, enemies = self._parse_encounter(completion.text)
+        return await self._rate_encounter(description, enemies or default_enemies(party_level, len(party)), party)
+    
+    def _parse_encounter(self, text: str) -> Tuple[str, List[Combatant]]:
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a D&D encounter designer."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.8,
-                max_tokens=200
-            )
-            
-            return {
-                "description": response.choices[0].message.content.strip(),
-                "difficulty": "medium"
-            }
-        except Exception as e:
-            return {
-                "description": f"A group of enemies appears in the {environment}",
-                "difficulty": "medium"
-            }
+            payload = json.loads(text)
+        except ValueError:
+            return text, []
+        if not isinstance(payload, dict):
+            return text, []
+        
+        # Stat blocks that don't parse are skipped; the caller substitutes generic enemies if none are left
+        enemies = []
+        for block in payload.get("enemies") or []:
+            try:
+                enemy = Combatant(
+                    name=str(block["name"]),
+                    max_hp=int(block["hit_points"]),
+                    armor_class=int(block["armor_class"]),
+                    attack_bonus=int(block["attack_bonus"]),
+                    damage=str(block["damage"]),
+                    count=int(block["count"])
+                )
+                validate_combatant(enemy)
+            except (KeyError, TypeError, ValueError):
+                continue
+            enemies.append(enemy)
+        return str(payload.get("description") or text), enemies
+    
+    async def _rate_encounter(self, description: str, enemies: List[Combatant], party: List[Combatant]) -> Dict:
+        result = await asyncio.to_thread(simulate, party, enemies)
+        return {
+            "description": description,
+            "enemies": [asdict(enemy) for enemy in enemies],
+            "difficulty": result.difficulty,
+            "simulation": result.to_dict()
+        }
     
     def _summarize_party(self, party_info: List[Dict]) -> str:
         summary = []
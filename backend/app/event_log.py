@@ -0,0 +1,134 @@
+from typing import Dict, List, Optional
+from sqlalchemy import insert
+from app.database import SessionLocal
+from app.models import Message
+from app.state_cache import bump_version, state_cache
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Write-behind configuration
+MESSAGE_DURABILITY = os.getenv("MESSAGE_DURABILITY", "strict")
+EVENT_LOG_QUEUE_SIZE = int(os.getenv("EVENT_LOG_QUEUE_SIZE", "1000"))
+EVENT_LOG_BATCH_SIZE = int(os.getenv("EVENT_LOG_BATCH_SIZE", "100"))
+EVENT_LOG_FLUSH_INTERVAL = float(os.getenv("EVENT_LOG_FLUSH_INTERVAL", "0.05"))
+EVENT_LOG_MAX_RETRIES = int(os.getenv("EVENT_LOG_MAX_RETRIES", "3"))
+
+DURABILITY_MODES = ("strict", "async")
+
+class EventLog:
+    def __init__(self, maxsize: int = EVENT_LOG_QUEUE_SIZE, batch_size: int = EVENT_LOG_BATCH_SIZE,
+                 flush_interval: float = EVENT_LOG_FLUSH_INTERVAL):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.flush_seconds_total = 0.0
+        self.last_flush_seconds = 0.0
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    def start(self):
+        if self.running:
+            return
+        self.queue = asyncio.Queue(maxsize=self.maxsize)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self):
+        if not self.running:
+            return
+        # Let the worker drain everything already queued, then stop it
+        await self.queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+    
+    async def enqueue(self, rows: List[Dict]):
+        # put() waits while the queue is full, which pushes back on the request that is writing
+        for row in rows:
+            await self.queue.put(row)
+            self.enqueued += 1
+    
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+    
+    async def _flush(self, batch: List[Dict]):
+        for attempt in range(EVENT_LOG_MAX_RETRIES):
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception:
+                logger.exception("Event log flush failed (attempt %d of %d)", attempt + 1, EVENT_LOG_MAX_RETRIES)
+                await asyncio.sleep(0.1 * 2 ** attempt)
+                continue
+            
+            self.last_flush_seconds = time.perf_counter() - started
+            self.flush_seconds_total += self.last_flush_seconds
+            self.flushed += len(batch)
+            self.batches += 1
+            return
+        
+        self.dropped += len(batch)
+        logger.error("Dropped %d messages after %d failed flushes", len(batch), EVENT_LOG_MAX_RETRIES)
+    
+    def _write(self, batch: List[Dict]):
+        db = SessionLocal()
+        try:
+            db.execute(insert(Message), batch)
+            versions = {
+                campaign_id: bump_version(db, campaign_id)
+                for campaign_id in {row["campaign_id"] for row in batch}
+            }
+            db.commit()
+            for campaign_id, version in versions.items():
+                state_cache.invalidate(campaign_id, version)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    
+    def stats(self) -> Dict:
+        return {
+            "durability": MESSAGE_DURABILITY,
+            "running": self.running,
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "queue_capacity": self.maxsize,
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "last_flush_seconds": self.last_flush_seconds,
+            "avg_flush_seconds": self.flush_seconds_total / self.batches if self.batches else 0.0
+        }
+
+event_log = EventLog()
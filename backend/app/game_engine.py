@@ -1,171 +1,600 @@
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional
+from sqlalchemy import func, update
 from sqlalchemy.orm import Session
-from app.models import Campaign, Character, Message, CombatState
+from app.models import Campaign, CampaignSummary, Character, Message, CombatState
 from app.character_generator import CharacterGenerator
-from app.ai_player import AIPlayer
-from app.dice import DiceRoller
+from app.ai_player import AIPlayer, DEFAULT_MODEL
+from app.llm import LLMError
+from app.llm_resilience import resilient_llm
+from app.context_manager import pack_context
+from app.campaign_lock import lock_campaign
+from app.state_cache import STATE_CACHE_RECENT_MESSAGES, CampaignState, bump_version, state_cache
+from app.dice import STANDARD_DICE, DiceExpressionError, DiceRoller, campaign_rng, parse_expression, roll_expression
+from app.player_registry import player_registry
+from app.combat_sim import COMBAT_SIM_MAX_COMBATANTS, Combatant, combatant_count, validate_combatant
+from app.party_batch import PARTY_MODES, get_batch_responses, party_mode_stats
+from app.speculation import speculator
+from app.model_router import validate_routing
+from app.tracing import span
+from app.unit_of_work import TurnTransaction
+from app.event_log import MESSAGE_DURABILITY, event_log
+from dataclasses import dataclass
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import numpy as np
+import os
+import time
+
+# Party fan-out configuration
+PARTY_RESPONSE_CONCURRENCY = int(os.getenv("PARTY_RESPONSE_CONCURRENCY", "6"))
+PARTY_RESPONSE_TIMEOUT = float(os.getenv("PARTY_RESPONSE_TIMEOUT", "30"))
+# Share of the response timeout a batched turn may spend on its one call before falling back
+PARTY_BATCH_TIMEOUT_SHARE = float(os.getenv("PARTY_BATCH_TIMEOUT_SHARE", "0.5"))
+
+@dataclass
+class TurnState:
+    campaign_id: int
+    characters: List[Character]
+    settings: Dict
+    party_context: List[Dict]
+
+def combatant_key(entry: Dict) -> str:
+    # Compact identifier used in combat deltas: "c3" for character 3, "e1" for the first enemy
+    return entry["enemy_id"] if "enemy_id" in entry else f"c{entry['character_id']}"
+
+def character_fields(char) -> Dict:
+    return {
+        "name": char.name,
+        "race": char.race,
+        "char_class": char.char_class,
+        "level": char.level,
+        "strength": char.strength,
+        "dexterity": char.dexterity,
+        "constitution": char.constitution,
+        "intelligence": char.intelligence,
+        "wisdom": char.wisdom,
+        "charisma": char.charisma,
+        "max_hp": char.max_hp,
+        "current_hp": char.current_hp,
+        "armor_class": char.armor_class,
+        "personality_traits": char.personality_traits,
+        "background": char.background,
+        "inventory": char.inventory
+    }
+
+def turn_state_from(campaign_id: int, state: CampaignState) -> TurnState:
+    with span("pack_context", campaign_id=campaign_id):
+        party_context = pack_context(campaign_id, state.summary, state.messages, DEFAULT_MODEL)
+    return TurnState(
+        campaign_id=campaign_id,
+        characters=order_by_initiative(list(state.characters), state.combat_state),
+        settings=dict(state.campaign.settings or {}),
+        party_context=party_context
+    )
+
+def turn_fingerprint(state: TurnState) -> str:
+    # Everything a player's prompt is built from besides the DM's message
+    payload = json.dumps(
+        [state.party_context, [character_fields(char) for char in state.characters]],
+        sort_keys=True, default=str
+    )
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+def order_by_initiative(characters: List[Character], combat_state: Optional[CombatState]) -> List[Character]:
+    if not combat_state or not combat_state.is_active or not combat_state.initiative_order:
+        return characters
+    
+    rank = {
+        entry["character_id"]: idx for idx, entry in enumerate(combat_state.initiative_order) if "character_id" in entry
+    }
+    return sorted(characters, key=lambda char: rank.get(char.id, len(rank)))
 
 class GameEngine:
     def __init__(self, db: Session):
         self.db = db
-        self.ai_players: Dict[int, AIPlayer] = {}
-        self.executor = ThreadPoolExecutor(max_workers=5)
     
-    def create_campaign(self, name: str, description: str, party_size: int) -> Campaign:
+    def create_campaign(self, name: str, description: str, party_size: int,
+                        dice_seed: Optional[int] = None) -> Campaign:
         campaign = Campaign(
             name=name,
             description=description,
-            party_size=party_size
+            party_size=party_size,
+            settings={"dice_seed": dice_seed} if dice_seed is not None else {}
         )
         self.db.add(campaign)
-        self.db.commit()
-        self.db.refresh(campaign)
-        
-        party = CharacterGenerator.generate_party(party_size)
-        for char_data in party:
-            character = Character(
-                campaign_id=campaign.id,
-                **char_data
-            )
-            self.db.add(character)
+        self.db.flush()
         
-        combat_state = CombatState(campaign_id=campaign.id)
-        self.db.add(combat_state)
+        # Stream 0 of a seeded campaign generates the party; dice rolls start at 1
+        characters = [
+            Character(campaign_id=campaign.id, **char_data)
+            for char_data in CharacterGenerator.generate_party(party_size, campaign_rng(dice_seed, 0))
+        ]
+        self.db.add_all(characters)
+        self.db.add(CombatState(campaign_id=campaign.id))
+        self.db.flush()
         
+        self._initialize_ai_players(campaign.id, characters)
         self.db.commit()
         
-        self._initialize_ai_players(campaign.id)
-        
         return campaign
     
-    def _initialize_ai_players(self, campaign_id: int):
-        characters = self.db.query(Character).filter(Character.campaign_id == campaign_id).all()
+    def begin_turn(self) -> TurnTransaction:
+        return TurnTransaction(self.db)
+    
+    async def commit_turn(self, turn: TurnTransaction, session=None, durable: bool = False):
+        # In async durability mode messages are handed to the write-behind log and get no ID;
+        # durable forces the write for callers whose client keys messages on their IDs
+        with span("commit_turn", messages=len(turn.messages)):
+            if MESSAGE_DURABILITY == "async" and event_log.running and not durable:
+                await event_log.enqueue(turn.take_messages())
+            changes = turn.pending_changes()
+            if session is not None:
+                await turn.commit_async(session)
+            else:
+                # The sync session would block the event loop for the whole round trip
+                await asyncio.to_thread(turn.commit)
+            self._write_through(changes, turn.versions)
+    
+    def _commit(self, turn: TurnTransaction):
+        with span("commit_turn", messages=len(turn.messages)):
+            changes = turn.pending_changes()
+            turn.commit()
+            self._write_through(changes, turn.versions)
+    
+    def _write_through(self, changes: Dict[int, Dict], versions: Dict[int, int]):
+        for campaign_id, change in changes.items():
+            if campaign_id not in versions:
+                continue
+            state_cache.apply(
+                campaign_id,
+                versions[campaign_id],
+                characters=change["characters"],
+                combat_state=change["combat_state"],
+                messages=[row for row in change["messages"] if row.get("id")]
+            )
+    
+    def load_turn_state(self, campaign_id: int) -> Optional[TurnState]:
+        state = self.get_campaign_state(campaign_id)
+        if state is None:
+            return None
+        return turn_state_from(campaign_id, state)
+    
+    def get_campaign_state(self, campaign_id: int) -> Optional[CampaignState]:
+        with span("load_state", campaign_id=campaign_id) as current:
+            if state_cache.listening:
+                state = state_cache.peek(campaign_id)
+            else:
+                version = self.db.query(Campaign.state_version).filter(Campaign.id == campaign_id).first()
+                if version is None:
+                    return None
+                state = state_cache.peek(campaign_id, version[0] or 0)
+            
+            current.set(cached=state is not None)
+            if state is None:
+                state = self._load_campaign_state(campaign_id)
+                if state is not None:
+                    state_cache.put(campaign_id, state)
+            return state
+    
+    def _load_campaign_state(self, campaign_id: int) -> Optional[CampaignState]:
+        campaign = self.get_campaign(campaign_id)
+        if not campaign:
+            return None
+        
+        summary = self.db.query(CampaignSummary).filter(CampaignSummary.campaign_id == campaign_id).first()
+        last_summarized = summary.last_message_id if summary else 0
+        messages = self.db.query(Message)\
+            .filter(Message.campaign_id == campaign_id, Message.id > last_summarized)\
+            .order_by(Message.id.desc())\
+            .limit(STATE_CACHE_RECENT_MESSAGES)\
+            .all()
+        
+        return CampaignState(
+            campaign=campaign,
+            characters=self.db.query(Character).filter(Character.campaign_id == campaign_id).all(),
+            combat_state=self.db.query(CombatState).filter(CombatState.campaign_id == campaign_id).first(),
+            summary=summary,
+            messages=messages
+        )
+    
+    def _initialize_ai_players(self, campaign_id: int,
+                               characters: Optional[List[Character]] = None) -> Dict[int, AIPlayer]:
+        with span("init_ai_players", campaign_id=campaign_id):
+            if characters is None:
+                characters = self.db.query(Character).filter(Character.campaign_id == campaign_id).all()
+            ai_players = {char.id: AIPlayer(character_fields(char)) for char in characters}
+            
+            player_registry.put(campaign_id, ai_players)
+        return ai_players
+    
+    def _get_ai_players(self, campaign_id: int, characters: List[Character]) -> Dict[int, AIPlayer]:
+        # AI players hold no state of their own beyond the character rows, so any worker can
+        # rebuild them; reused ones are brought up to date with rows another worker may have changed
+        ai_players = player_registry.get(campaign_id)
+        if ai_players is None or any(char.id not in ai_players for char in characters):
+            return self._initialize_ai_players(campaign_id, characters)
+        
         for char in characters:
-            char_dict = {
-                "name": char.name,
-                "race": char.race,
-                "char_class": char.char_class,
-                "level": char.level,
-                "strength": char.strength,
-                "dexterity": char.dexterity,
-                "constitution": char.constitution,
-                "intelligence": char.intelligence,
-                "wisdom": char.wisdom,
-                "charisma": char.charisma,
-                "max_hp": char.max_hp,
-                "current_hp": char.current_hp,
-                "armor_class": char.armor_class,
-                "personality_traits": char.personality_traits,
-                "background": char.background,
-                "inventory": char.inventory
-            }
-            self.ai_players[char.id] = AIPlayer(char_dict)
+            ai_players[char.id].refresh(character_fields(char))
+        return ai_players
     
     def get_campaign(self, campaign_id: int) -> Optional[Campaign]:
         return self.db.query(Campaign).filter(Campaign.id == campaign_id).first()
     
-    def get_characters(self, campaign_id: int) -> List[Character]:
-        return self.db.query(Character).filter(Character.campaign_id == campaign_id).all()
-    
-    def add_message(self, campaign_id: int, role: str, content: str, 
-                   character_id: Optional[int] = None, message_type: str = "narrative") -> Message:
-        message = Message(
-            campaign_id=campaign_id,
-            character_id=character_id,
-            role=role,
-            content=content,
-            message_type=message_type
-        )
-        self.db.add(message)
+    def update_settings(self, campaign_id: int, updates: Dict) -> Dict:
+        lock_campaign(self.db, campaign_id)
+        campaign = self.get_campaign(campaign_id)
+        if not campaign:
+            return {"error": "Campaign not found"}
+        
+        if "party_mode" in updates and updates["party_mode"] not in PARTY_MODES:
+            return {"error": f"party_mode must be one of: {', '.join(PARTY_MODES)}"}
+        if updates.get("dice_seed") is not None and updates["dice_seed"] < 0:
+            return {"error": "dice_seed must not be negative"}
+        error = validate_routing(updates.get("model_routing") or {})
+        if error:
+            return {"error": error}
+        
+        settings = {**(campaign.settings or {}), **updates}
+        campaign.settings = settings
+        version = bump_version(self.db, campaign_id)
         self.db.commit()
-        self.db.refresh(message)
-        return message
+        state_cache.apply(campaign_id, version, campaign={"settings": settings})
+        if not settings.get("speculative_drafts"):
+            speculator.cancel_campaign(campaign_id)
+        return dict(settings)
+    
+    def get_characters(self, campaign_id: int) -> List[Character]:
+        state = self.get_campaign_state(campaign_id)
+        return list(state.characters) if state else []
     
-    def get_messages(self, campaign_id: int, limit: int = 50) -> List[Message]:
-        return self.db.query(Message)\
-            .filter(Message.campaign_id == campaign_id)\
-            .order_by(Message.timestamp.desc())\
+    def get_messages(self, campaign_id: int, limit: int = 50,
+                     before_id: Optional[int] = None, after_id: Optional[int] = None) -> List[Message]:
+        # Keyset pagination over (campaign_id, id); results are always newest first
+        query = self.db.query(Message).filter(Message.campaign_id == campaign_id)
+        if before_id is not None:
+            query = query.filter(Message.id < before_id)
+        
+        if after_id is not None:
+            messages = query.filter(Message.id > after_id)\
+                .order_by(Message.id.asc())\
+                .limit(limit)\
+                .all()
+            return list(reversed(messages))
+        
+        return query.order_by(Message.id.desc())\
             .limit(limit)\
             .all()
     
-    async def get_party_responses(self, campaign_id: int, dm_message: str) -> List[Dict]:
-        if campaign_id not in [player_id for player_id in self.ai_players.keys()]:
-            self._initialize_ai_players(campaign_id)
+    def latest_message_id(self, campaign_id: int) -> int:
+        return self.db.query(func.max(Message.id)).filter(Message.campaign_id == campaign_id).scalar() or 0
+    
+    def speculate(self, campaign_id: int, draft: str, state: Optional[TurnState] = None) -> Dict:
+        state = state or self.load_turn_state(campaign_id)
+        if state is None:
+            return {"error": "Campaign not found"}
+        if not state.settings.get("speculative_drafts"):
+            return {"status": "disabled"}
+        if state.settings.get("party_mode") == "batch":
+            # Batch turns answer for the whole party in one call, so per-character guesses wouldn't be reused
+            return {"status": "unsupported"}
         
-        characters = self.get_characters(campaign_id)
-        recent_messages = self.get_messages(campaign_id, limit=10)
+        ai_players = self._get_ai_players(campaign_id, state.characters)
+        status = speculator.submit(
+            campaign_id, draft, turn_fingerprint(state), ai_players, state.party_context,
+            state.settings.get("model_routing")
+        )
+        return {"status": status}
+    
+    async def take_speculation(self, campaign_id: int, dm_message: str,
+                               state: Optional[TurnState] = None) -> Dict[int, asyncio.Future]:
+        # Must run before the DM message is committed, since drafts were generated without it in the context
+        state = state or await asyncio.to_thread(self.load_turn_state, campaign_id)
+        if state is None or not state.settings.get("speculative_drafts"):
+            return {}
+        fingerprint = turn_fingerprint(state)
+        speculative = speculator.take(campaign_id, dm_message, fingerprint)
+        if speculative:
+            return speculative
         
-        party_context = []
-        for msg in reversed(recent_messages):
-            role = "assistant" if msg.role == "player" else "user"
-            party_context.append({"role": role, "content": msg.content})
+        # The drafts may have been sent to, and answered by, another worker
+        shared = await asyncio.to_thread(speculator.take_shared, campaign_id, dm_message, fingerprint)
+        loop = asyncio.get_running_loop()
+        for character_id, result in shared.items():
+            speculative[character_id] = loop.create_future()
+            speculative[character_id].set_result(result)
+        return speculative
+    
+    async def get_party_responses(self, campaign_id: int, dm_message: str,
+                                  concurrency: Optional[int] = None,
+                                  timeout: Optional[float] = None,
+                                  turn: Optional[TurnTransaction] = None,
+                                  state: Optional[TurnState] = None) -> List[Dict]:
+        state = state or self.load_turn_state(campaign_id)
+        characters = state.characters
+        ai_players = self._get_ai_players(campaign_id, characters)
+        party_context = state.party_context
         
-        responses = []
-        loop = asyncio.get_event_loop()
+        semaphore = asyncio.Semaphore(max(1, concurrency or PARTY_RESPONSE_CONCURRENCY))
+        timeout = timeout or PARTY_RESPONSE_TIMEOUT
+        party_mode = state.settings.get("party_mode", "individual")
+        routing = state.settings.get("model_routing")
+        started = time.perf_counter()
         
+        speculative = await self.take_speculation(campaign_id, dm_message, state)
+        replies: Dict[int, Optional[str]] = {}
+        completions = []
+        if party_mode == "batch" and len(characters) > 1:
+            with span("party_batch", campaign_id=campaign_id, characters=len(characters)):
+                try:
+                    replies, completion = await asyncio.wait_for(
+                        get_batch_responses(ai_players, characters, dm_message, party_context, routing),
+                        timeout * PARTY_BATCH_TIMEOUT_SHARE
+                    )
+                except asyncio.TimeoutError:
+                    completion = None
+            if completion is not None:
+                completions.append(completion)
+            # Characters the batch missed answer within what is left of the timeout, so the turn
+            # as a whole never waits longer than an individual one
+            timeout = max(timeout - (time.perf_counter() - started), 0.0)
+        
+        fallbacks = set()
+        
+        async def respond(char: Character) -> Optional[str]:
+            with span("party_response", campaign_id=campaign_id, character_id=char.id) as current:
+                text = await reply(char)
+                current.set(status="no_response" if text is None else "fallback" if char.id in fallbacks else "ok")
+            return text
+        
+        async def reply(char: Character) -> Optional[str]:
+            if char.id in speculative:
+                try:
+                    text, completion = await asyncio.wait_for(speculative[char.id], timeout)
+                except asyncio.TimeoutError:
+                    return None
+                except LLMError:
+                    # The draft's reply failed; the live call below gets its own retries
+                    pass
+                else:
+                    speculator.record_used(completion)
+                    if completion is not None:
+                        completions.append(completion)
+                    return text
+            
+            async with semaphore:
+                try:
+                    completion = await asyncio.wait_for(
+                        ai_players[char.id].complete_response(dm_message, party_context, routing=routing),
+                        timeout
+                    )
+                except asyncio.TimeoutError:
+                    return None
+                except LLMError:
+                    fallbacks.add(char.id)
+                    resilient_llm.record_fallback()
+                    return ai_players[char.id].fallback_response(dm_message)
+            completions.append(completion)
+            return completion.text
+        
+        pending = [char for char in characters if char.id not in replies]
+        with span("party_responses", campaign_id=campaign_id, mode=party_mode, speculative=len(speculative)):
+            results = await asyncio.gather(*(respond(char) for char in pending))
+        replies.update(zip([char.id for char in pending], results))
+        party_mode_stats.record(party_mode, time.perf_counter() - started, completions)
+        
+        own_turn = turn is None
+        if own_turn:
+            turn = self.begin_turn()
+        
+        responses = []
+        rows = []
         for char in characters:
-            if char.id in self.ai_players:
-                response = await loop.run_in_executor(
-                    self.executor,
-                    self.ai_players[char.id].get_response,
-                    dm_message,
-                    party_context
-                )
-                
+            response = replies[char.id]
+            if response is None:
                 responses.append({
                     "character_id": char.id,
                     "character_name": char.name,
-                    "response": response
+                    "response": None,
+                    "status": "no_response"
                 })
-                
-                self.add_message(
-                    campaign_id=campaign_id,
-                    role="player",
-                    content=f"{char.name}: {response}",
-                    character_id=char.id
-                )
+                continue
+            
+            responses.append({
+                "character_id": char.id,
+                "character_name": char.name,
+                "response": response,
+                "status": "fallback" if char.id in fallbacks else "ok"
+            })
+            rows.append((responses[-1], turn.add_message(
+                campaign_id=campaign_id,
+                role="player",
+                content=f"{char.name}: {response}",
+                character_id=char.id,
+                message_type="fallback" if char.id in fallbacks else "narrative"
+            )))
+        
+        def set_message_ids():
+            for entry, row in rows:
+                entry["message_id"] = row.get("id")
+        
+        turn.after_commit(set_message_ids)
+        if own_turn:
+            await self.commit_turn(turn)
         
         return responses
     
-    def roll_dice(self, dice_type: str, count: int = 1, modifier: int = 0) -> Dict:
-        dice_methods = {
-            "d4": DiceRoller.d4,
-            "d6": DiceRoller.d6,
-            "d8": DiceRoller.d8,
-            "d10": DiceRoller.d10,
-            "d12": DiceRoller.d12,
-            "d20": DiceRoller.d20,
-            "d100": DiceRoller.d100
-        }
+    async def stream_party_responses(self, campaign_id: int, dm_message: str,
+                                     concurrency: Optional[int] = None,
+                                     timeout: Optional[float] = None,
+                                     speculative: Optional[Dict[int, asyncio.Future]] = None,
+                                     state: Optional[TurnState] = None) -> AsyncIterator[Dict]:
+        # Pass the state loaded before the DM message was committed; the prompt adds that message itself
+        state = state or self.load_turn_state(campaign_id)
+        characters = state.characters
+        ai_players = self._get_ai_players(campaign_id, characters)
+        party_context = state.party_context
+        
+        semaphore = asyncio.Semaphore(max(1, concurrency or PARTY_RESPONSE_CONCURRENCY))
+        timeout = timeout or PARTY_RESPONSE_TIMEOUT
+        queue: asyncio.Queue = asyncio.Queue()
+        speculative = speculative or {}
+        routing = state.settings.get("model_routing")
+        
+        async def pump(char: Character):
+            with span("party_response", campaign_id=campaign_id, character_id=char.id, streamed=True):
+                chunks = []
+                fallback = False
+                answered = False
+                if char.id in speculative:
+                    # A reply generated from the draft is sent whole rather than token by token
+                    try:
+                        text, completion = await asyncio.wait_for(speculative[char.id], timeout)
+                    except TimeoutError:
+                        await queue.put({"type": "no_response", "character_id": char.id, "character_name": char.name})
+                        return
+                    except LLMError:
+                        # The draft's reply failed; stream a live one with its own retries, as dm-input does
+                        pass
+                    else:
+                        speculator.record_used(completion)
+                        chunks.append(text)
+                        answered = True
+                if not answered:
+                    async with semaphore:
+                        try:
+                            async with asyncio.timeout(timeout):
+                                async for delta in ai_players[char.id].stream_response(
+                                    dm_message, party_context, routing=routing
+                                ):
+                                    chunks.append(delta)
+                                    await queue.put({"type": "token", "character_id": char.id, "delta": delta})
+                        except TimeoutError:
+                            await queue.put({"type": "no_response", "character_id": char.id, "character_name": char.name})
+                            return
+                        except LLMError:
+                            fallback = True
+                
+                if fallback:
+                    # Replaces whatever was streamed before the failure
+                    resilient_llm.record_fallback()
+                    chunks = [ai_players[char.id].fallback_response(dm_message)]
+                await queue.put({
+                    "type": "done",
+                    "character_id": char.id,
+                    "character_name": char.name,
+                    "response": "".join(chunks).strip(),
+                    "fallback": fallback
+                })
+        
+        tasks = [asyncio.create_task(pump(char)) for char in characters]
+        pending = len(tasks)
+        try:
+            while pending:
+                event = await queue.get()
+                if event["type"] == "done":
+                    turn = self.begin_turn()
+                    row = turn.add_message(
+                        campaign_id=campaign_id,
+                        role="player",
+                        content=f"{event['character_name']}: {event['response']}",
+                        character_id=event["character_id"],
+                        message_type="fallback" if event["fallback"] else "narrative"
+                    )
+                    # Streamed events carry the row ID, which the client swaps in for its placeholder
+                    await self.commit_turn(turn, durable=True)
+                    event["message_id"] = row.get("id")
+                if event["type"] != "token":
+                    pending -= 1
+                yield event
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    def dice_rng(self, campaign_id: int) -> np.random.Generator:
+        state = self.get_campaign_state(campaign_id)
+        seed = (state.campaign.settings or {}).get("dice_seed") if state else None
+        if seed is None:
+            return campaign_rng(None)
         
-        if dice_type not in dice_methods:
-            return {"error": "Invalid dice type"}
+        # The roll counter lives in the database so every worker continues the same sequence
+        counter = self.db.execute(
+            update(Campaign)
+            .where(Campaign.id == campaign_id)
+            .values(dice_rolls=func.coalesce(Campaign.dice_rolls, 0) + 1)
+            .returning(Campaign.dice_rolls)
+        ).scalar_one()
+        return campaign_rng(seed, counter)
+    
+    def roll_dice(self, dice_type: Optional[str] = None, count: int = 1, modifier: int = 0,
+                  expression: Optional[str] = None, campaign_id: Optional[int] = None) -> Dict:
+        if expression is None:
+            if dice_type not in STANDARD_DICE:
+                return {"error": "Invalid dice type"}
+            expression = f"{count}{dice_type}{modifier:+d}"
+        
+        try:
+            parsed = parse_expression(expression)
+        except DiceExpressionError as e:
+            return {"error": str(e)}
         
-        total, rolls = dice_methods[dice_type](count)
-        final_total = total + modifier
+        rng = campaign_rng(None)
+        if campaign_id is not None:
+            rng = self.dice_rng(campaign_id)
+            self.db.commit()
+        result = roll_expression(parsed, rng)
         
         return {
+            "expression": parsed.text,
             "dice_type": dice_type,
-            "count": count,
-            "rolls": rolls,
-            "total": total,
-            "modifier": modifier,
-            "final_total": final_total
+            "count": parsed.dice_count,
+            "rolls": [roll for rolls in result.rolls for roll in rolls],
+            "terms": [
+                {"dice": f"{term.count}d{term.sides}", "sign": term.sign, "rolls": rolls, "kept": kept}
+                for term, rolls, kept in zip(parsed.terms, result.rolls, result.kept)
+            ],
+            "total": result.total,
+            "modifier": result.modifier,
+            "final_total": result.final_total
         }
     
-    def start_combat(self, campaign_id: int) -> Dict:
-        combat_state = self.db.query(CombatState).filter(CombatState.campaign_id == campaign_id).first()
-        if not combat_state:
+    def start_combat(self, campaign_id: int, enemies: Optional[List[Combatant]] = None) -> Dict:
+        # Checked before taking the lock, so an oversized stat block never holds up the campaign
+        enemies = enemies or []
+        try:
+            for enemy in enemies:
+                validate_combatant(enemy)
+        except ValueError as e:
+            return {"error": str(e)}
+        
+        lock_campaign(self.db, campaign_id)
+        state = self.get_campaign_state(campaign_id)
+        if not state or not state.combat_state:
             return {"error": "Combat state not found"}
         
-        characters = self.get_characters(campaign_id)
+        characters = state.characters
+        if len(characters) + combatant_count(enemies) > COMBAT_SIM_MAX_COMBATANTS:
+            return {"error": f"Combat supports at most {COMBAT_SIM_MAX_COMBATANTS} combatants"}
+        
+        enemy_states = []
+        for enemy in enemies:
+            for copy in range(enemy.count):
+                enemy_states.append({
+                    "enemy_id": f"e{len(enemy_states) + 1}",
+                    "name": enemy.name if enemy.count == 1 else f"{enemy.name} {copy + 1}",
+                    "hp": enemy.max_hp,
+                    "max_hp": enemy.max_hp,
+                    "armor_class": enemy.armor_class,
+                    "attack_bonus": enemy.attack_bonus,
+                    "damage": enemy.damage,
+                    "initiative_bonus": enemy.initiative_bonus
+                })
+        rolls = DiceRoller.sample("1d20", len(characters) + len(enemy_states), self.dice_rng(campaign_id)).tolist()
         initiative_order = []
         
-        for char in characters:
+        for char, roll in zip(characters, rolls):
             dex_mod = DiceRoller.modifier(char.dexterity)
-            roll, _ = DiceRoller.d20()
             initiative = roll + dex_mod
             
             initiative_order.append({
@@ -174,24 +603,51 @@ class GameEngine:
                 "initiative": initiative
             })
         
+        for enemy, roll in zip(enemy_states, rolls[len(characters):]):
+            initiative_order.append({
+                "enemy_id": enemy["enemy_id"],
+                "character_name": enemy["name"],
+                "initiative": roll + enemy["initiative_bonus"]
+            })
+        
         initiative_order.sort(key=lambda x: x["initiative"], reverse=True)
         
-        combat_state.is_active = True
-        combat_state.current_turn = 0
-        combat_state.round_number = 1
-        combat_state.initiative_order = initiative_order
-        self.db.commit()
+        turn = self.begin_turn()
+        turn.update_combat(
+            campaign_id,
+            is_active=True,
+            current_turn=0,
+            round_number=1,
+            initiative_order=initiative_order,
+            enemies=enemy_states
+        )
+        turn.add_combat_event(campaign_id, 1, 0, "start", {"order": [combatant_key(entry) for entry in initiative_order]})
+        self._commit(turn)
         
         return {
             "message": "Combat started!",
-            "initiative_order": initiative_order
+            "initiative_order": initiative_order,
+            "enemies": enemy_states
         }
     
     def end_combat(self, campaign_id: int):
-        combat_state = self.db.query(CombatState).filter(CombatState.campaign_id == campaign_id).first()
-        if combat_state:
-            combat_state.is_active = False
-            combat_state.current_turn = 0
-            combat_state.round_number = 1
-            combat_state.initiative_order = []
-            self.db.commit()
+        lock_campaign(self.db, campaign_id)
+        state = self.get_campaign_state(campaign_id)
+        if state and state.combat_state:
+            turn = self.begin_turn()
+            turn.update_combat(
+                campaign_id,
+                is_active=False,
+                current_turn=0,
+                round_number=1,
+                initiative_order=[],
+                enemies=[]
+            )
+            turn.add_combat_event(
+                campaign_id,
+                state.combat_state.round_number or 1,
+                state.combat_state.current_turn or 0,
+                "end",
+                {}
+            )
+            self._commit(turn)
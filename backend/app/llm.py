@@ -0,0 +1,206 @@
+from openai import AsyncOpenAI, RateLimitError
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Type
+import asyncio
+import json
+import os
+import random
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Backend configuration
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_KEEPALIVE_CONNECTIONS", "10"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+
+# Fake backend configuration (offline load testing)
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.5"))
+FAKE_LLM_JITTER = float(os.getenv("FAKE_LLM_JITTER", "0.2"))
+FAKE_LLM_OUTPUT_TOKENS = int(os.getenv("FAKE_LLM_OUTPUT_TOKENS", "60"))
+
+class LLMError(Exception):
+    pass
+
+class RateLimited(LLMError):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def _retry_after(error: RateLimitError) -> Optional[float]:
+    headers = error.response.headers if error.response is not None else {}
+    try:
+        return float(headers.get("retry-after-ms")) / 1000
+    except (TypeError, ValueError):
+        pass
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+@dataclass
+class Completion:
+    text: str
+    model: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+
+class LLMBackend:
+    name = "base"
+    
+    async def complete(self, model: str, instructions: str, prompt: str,
+                       temperature: float = 0.8, max_tokens: int = 200,
+                       schema: Optional[Dict] = None) -> Completion:
+        raise NotImplementedError
+    
+    async def stream(self, model: str, instructions: str, prompt: str,
+                     temperature: float = 0.8, max_tokens: int = 200) -> AsyncIterator[str]:
+        completion = await self.complete(model, instructions, prompt, temperature, max_tokens)
+        yield completion.text
+    
+    async def close(self):
+        pass
+
+class OpenAIBackend(LLMBackend):
+    name = "openai"
+    
+    def __init__(self):
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+            ),
+            timeout=LLM_REQUEST_TIMEOUT
+        )
+        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client)
+    
+    async def complete(self, model: str, instructions: str, prompt: str,
+                       temperature: float = 0.8, max_tokens: int = 200,
+                       schema: Optional[Dict] = None) -> Completion:
+        extra = {}
+        if schema is not None:
+            extra["text"] = {"format": {"type": "json_schema", "name": "structured_reply", "schema": schema, "strict": True}}
+        
+        try:
+            response = await self.client.responses.create(
+                model=model,
+                instructions=instructions,
+                input=prompt,
+                temperature=temperature,
+                max_output_tokens=max_tokens,
+                **extra
+            )
+        except RateLimitError as e:
+            raise RateLimited(str(e), _retry_after(e)) from e
+        
+        usage = response.usage
+        cached_tokens = 0
+        if usage and usage.input_tokens_details:
+            cached_tokens = usage.input_tokens_details.cached_tokens or 0
+        
+        return Completion(
+            text=response.output_text.strip(),
+            model=model,
+            input_tokens=usage.input_tokens if usage else 0,
+            output_tokens=usage.output_tokens if usage else 0,
+            cached_tokens=cached_tokens
+        )
+    
+    async def stream(self, model: str, instructions: str, prompt: str,
+                     temperature: float = 0.8, max_tokens: int = 200) -> AsyncIterator[str]:
+        try:
+            events = await self.client.responses.create(
+                model=model,
+                instructions=instructions,
+                input=prompt,
+                temperature=temperature,
+                max_output_tokens=max_tokens,
+                stream=True
+            )
+        except RateLimitError as e:
+            raise RateLimited(str(e), _retry_after(e)) from e
+        async for event in events:
+            if event.type == "response.output_text.delta":
+                yield event.delta
+    
+    async def close(self):
+        await self.client.close()
+
+class FakeBackend(LLMBackend):
+    name = "fake"
+    
+    WORDS = [
+        "I", "draw", "my", "blade", "and", "step", "forward", "carefully", "watching",
+        "the", "shadows", "while", "whispering", "to", "our", "party", "about", "a", "plan"
+    ]
+    
+    def __init__(self, latency: float = FAKE_LLM_LATENCY, jitter: float = FAKE_LLM_JITTER,
+                 output_tokens: int = FAKE_LLM_OUTPUT_TOKENS):
+        self.latency = latency
+        self.jitter = jitter
+        self.output_tokens = output_tokens
+    
+    def _words(self, max_tokens: int) -> List[str]:
+        return [self.WORDS[i % len(self.WORDS)] for i in range(min(self.output_tokens, max_tokens))]
+    
+    def _delay(self) -> float:
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+    
+    async def complete(self, model: str, instructions: str, prompt: str,
+                       temperature: float = 0.8, max_tokens: int = 200,
+                       schema: Optional[Dict] = None) -> Completion:
+        await asyncio.sleep(self._delay())
+        words = self._words(max_tokens)
+        text = " ".join(words) + "."
+        output_tokens = len(words)
+        if schema is not None:
+            keys = list(schema.get("properties", {}))
+            text = json.dumps({key: text for key in keys})
+            output_tokens *= max(1, len(keys))
+        return Completion(
+            text=text,
+            model=model,
+            input_tokens=(len(instructions) + len(prompt)) // 4,
+            output_tokens=output_tokens
+        )
+    
+    async def stream(self, model: str, instructions: str, prompt: str,
+                     temperature: float = 0.8, max_tokens: int = 200) -> AsyncIterator[str]:
+        words = self._words(max_tokens)
+        delay = self._delay()
+        # Spend a fifth of the latency before the first token, the rest spread across the reply
+        await asyncio.sleep(delay / 5)
+        for i, word in enumerate(words):
+            await asyncio.sleep(delay * 4 / 5 / len(words))
+            yield word if i == 0 else f" {word}"
+        yield "."
+
+BACKENDS: Dict[str, Type[LLMBackend]] = {
+    "openai": OpenAIBackend,
+    "fake": FakeBackend
+}
+
+_backend: Optional[LLMBackend] = None
+
+def get_backend() -> LLMBackend:
+    global _backend
+    if _backend is None:
+        if LLM_BACKEND not in BACKENDS:
+            raise ValueError(f"Unknown LLM backend: {LLM_BACKEND}")
+        _backend = BACKENDS[LLM_BACKEND]()
+    return _backend
+
+def set_backend(backend: LLMBackend):
+    global _backend
+    _backend = backend
+
+async def shutdown():
+    global _backend
+    if _backend is not None:
+        await _backend.close()
+        _backend = None
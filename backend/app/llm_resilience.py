@@ -0,0 +1,239 @@
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional
+from app.llm import Completion, LLMError, RateLimited, get_backend
+from app.llm_scheduler import PRIORITY_INTERACTIVE, llm_scheduler
+import asyncio
+import os
+import random
+import time
+
+# Retry, hedging and circuit breaker configuration
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.25"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "4"))
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_LATENCY_SAMPLES = 200
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+class CircuitOpen(LLMError):
+    pass
+
+class CircuitBreaker:
+    # Closed until LLM_BREAKER_THRESHOLD calls fail in a row, then open for the cooldown. After
+    # that a single trial call is let through; its outcome closes or re-opens the breaker.
+    def __init__(self, threshold: int = LLM_BREAKER_THRESHOLD, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self.opens = 0
+        self.rejected = 0
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+    
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+    
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+    
+    def record_failure(self):
+        self.failures += 1
+        if self.trial_in_flight or self.failures >= self.threshold:
+            if self.opened_at is None or self.trial_in_flight:
+                self.opens += 1
+            self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+    
+    def record_abandoned(self):
+        # A cancelled trial (e.g. the losing half of a hedge) says nothing about the backend
+        self.trial_in_flight = False
+    
+    def snapshot(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "opens": self.opens,
+            "rejected": self.rejected
+        }
+
+class LatencyTracker:
+    def __init__(self, samples: int = LLM_LATENCY_SAMPLES):
+        self._latencies: Dict[str, Deque[float]] = {}
+        self.samples = samples
+    
+    def record(self, model: str, seconds: float):
+        if model not in self._latencies:
+            self._latencies[model] = deque(maxlen=self.samples)
+        self._latencies[model].append(seconds)
+    
+    def percentile(self, model: str, fraction: float) -> Optional[float]:
+        latencies = self._latencies.get(model)
+        if not latencies or len(latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(latencies)
+        return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+    
+    def snapshot(self) -> Dict:
+        return {
+            model: {
+                "samples": len(latencies),
+                "p50": sorted(latencies)[len(latencies) // 2],
+                "p95": self.percentile(model, 0.95)
+            }
+            for model, latencies in self._latencies.items()
+        }
+
+class ResilientLLM:
+    # Sits between callers and the scheduler. Transient failures are retried with exponential
+    # backoff and full jitter; rate limits are left to the scheduler, which already waited out
+    # Retry-After. Interactive completions still running past the model's p95 get a duplicate
+    # request and whichever answers first wins.
+    def __init__(self):
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.latency = LatencyTracker()
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.fallbacks = 0
+    
+    def _breaker(self) -> CircuitBreaker:
+        name = get_backend().name
+        if name not in self.breakers:
+            self.breakers[name] = CircuitBreaker()
+        return self.breakers[name]
+    
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+    
+    async def _attempt(self, breaker: CircuitBreaker, priority: int, model: str, **kwargs) -> Completion:
+        started = time.perf_counter()
+        try:
+            completion = await llm_scheduler.complete(priority, model=model, **kwargs)
+        except RateLimited:
+            breaker.record_abandoned()
+            raise
+        except LLMError:
+            breaker.record_failure()
+            raise
+        except asyncio.CancelledError:
+            breaker.record_abandoned()
+            raise
+        breaker.record_success()
+        self.latency.record(model, time.perf_counter() - started)
+        return completion
+    
+    async def _hedged(self, breaker: CircuitBreaker, priority: int, model: str, **kwargs) -> Completion:
+        primary = asyncio.create_task(self._attempt(breaker, priority, model, **kwargs))
+        hedge_after = self.latency.percentile(model, LLM_HEDGE_PERCENTILE)
+        if priority != PRIORITY_INTERACTIVE or hedge_after is None:
+            return await primary
+        
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_after)
+            if done or not breaker.allow():
+                return await primary
+            
+            self.hedges += 1
+            backup = asyncio.create_task(self._attempt(breaker, priority, model, **kwargs))
+            pending = {primary, backup}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    async def complete(self, priority: int, model: str, instructions: str, prompt: str,
+                       temperature: float = 0.8, max_tokens: int = 200,
+                       schema: Optional[Dict] = None) -> Completion:
+        breaker = self._breaker()
+        for attempt in range(LLM_RETRIES + 1):
+            if not breaker.allow():
+                raise CircuitOpen(f"LLM backend {get_backend().name} is unavailable")
+            try:
+                return await self._hedged(
+                    breaker, priority, model,
+                    instructions=instructions, prompt=prompt,
+                    temperature=temperature, max_tokens=max_tokens, schema=schema
+                )
+            except RateLimited:
+                raise
+            except LLMError:
+                if attempt == LLM_RETRIES:
+                    raise
+            self.retries += 1
+            await asyncio.sleep(self._backoff(attempt))
+    
+    async def stream(self, priority: int, model: str, instructions: str, prompt: str,
+                     temperature: float = 0.8, max_tokens: int = 200) -> AsyncIterator[str]:
+        # Streams are retried only until the first token; after that the reply is already on screen
+        breaker = self._breaker()
+        for attempt in range(LLM_RETRIES + 1):
+            if not breaker.allow():
+                raise CircuitOpen(f"LLM backend {get_backend().name} is unavailable")
+            started = False
+            try:
+                async for delta in llm_scheduler.stream(priority, model, instructions, prompt, temperature, max_tokens):
+                    if not started:
+                        started = True
+                        breaker.record_success()
+                    yield delta
+                if not started:
+                    breaker.record_success()
+                return
+            except RateLimited:
+                breaker.record_abandoned()
+                raise
+            except LLMError:
+                if not started:
+                    breaker.record_failure()
+                if started or attempt == LLM_RETRIES:
+                    raise
+            except (asyncio.CancelledError, GeneratorExit):
+                if not started:
+                    breaker.record_abandoned()
+                raise
+            self.retries += 1
+            await asyncio.sleep(self._backoff(attempt))
+    
+    def record_fallback(self):
+        self.fallbacks += 1
+    
+    def stats(self) -> Dict:
+        return {
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "fallbacks": self.fallbacks,
+            "breakers": {name: breaker.snapshot() for name, breaker in self.breakers.items()},
+            "latency": self.latency.snapshot()
+        }
+
+resilient_llm = ResilientLLM()
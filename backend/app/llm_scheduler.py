@@ -0,0 +1,262 @@
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, List, Optional
+from app.llm import Completion, LLMError, RateLimited, get_backend
+from app.tracing import record_span
+import asyncio
+import heapq
+import itertools
+import os
+import time
+
+# Provider budgets are per account, so each worker process gets an equal share
+WEB_CONCURRENCY = max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", os.getenv("LLM_MAX_CONNECTIONS", "20")))
+LLM_RATE_LIMIT_RETRIES = int(os.getenv("LLM_RATE_LIMIT_RETRIES", "2"))
+LLM_DEFAULT_RETRY_AFTER = float(os.getenv("LLM_DEFAULT_RETRY_AFTER", "2"))
+LLM_WAIT_SAMPLES = 1000
+
+# Lower numbers are dispatched first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_PREFETCH = 1
+PRIORITY_SUGGESTION = 2
+PRIORITY_SUMMARY = 3
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_PREFETCH: "prefetch",
+    PRIORITY_SUGGESTION: "suggestion",
+    PRIORITY_SUMMARY: "summary"
+}
+
+def estimate_tokens(instructions: str, prompt: str, max_tokens: int) -> int:
+    return (len(instructions) + len(prompt)) // 4 + max_tokens
+
+class TokenBucket:
+    # A zero or negative rate means no limit
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def delay(self, amount: float) -> float:
+        if self.capacity <= 0:
+            return 0.0
+        self._refill()
+        # A request larger than the whole bucket waits for a full bucket rather than forever
+        needed = min(amount, self.capacity) - self.tokens
+        return needed / self.rate if needed > 0 else 0.0
+    
+    def take(self, amount: float):
+        if self.capacity > 0:
+            self._refill()
+            self.tokens -= amount
+    
+    def refund(self, amount: float):
+        if self.capacity > 0:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+class _Waiter:
+    def __init__(self, priority: int, seq: int, tokens: int, future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.future = future
+        self.queued = time.monotonic()
+    
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class PriorityStats:
+    def __init__(self):
+        self.requests = 0
+        self.completed = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.queued = 0
+        self.waited = 0
+        self.wait_total = 0.0
+        self.max_wait = 0.0
+        self.waits: Deque[float] = deque(maxlen=LLM_WAIT_SAMPLES)
+    
+    def record_wait(self, seconds: float):
+        self.waited += 1
+        self.wait_total += seconds
+        self.max_wait = max(self.max_wait, seconds)
+        self.waits.append(seconds)
+    
+    def snapshot(self) -> Dict:
+        waits = sorted(self.waits)
+        
+        def percentile(fraction: float) -> float:
+            return waits[min(int(fraction * len(waits)), len(waits) - 1)] if waits else 0.0
+        
+        return {
+            "requests": self.requests,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rate_limited": self.rate_limited,
+            "queued": self.queued,
+            "avg_wait_seconds": self.wait_total / self.waited if self.waited else 0.0,
+            "p50_wait_seconds": percentile(0.5),
+            "p95_wait_seconds": percentile(0.95),
+            "max_wait_seconds": self.max_wait
+        }
+
+class LLMScheduler:
+    # Every LLM call in the process goes through one priority queue. A call is dispatched when it is
+    # the most urgent one waiting, a concurrency slot is free, and both the request and token
+    # buckets can cover it. A 429 pauses all dispatch for the provider's Retry-After.
+    def __init__(self, requests_per_minute: float = LLM_REQUESTS_PER_MINUTE / WEB_CONCURRENCY,
+                 tokens_per_minute: float = LLM_TOKENS_PER_MINUTE / WEB_CONCURRENCY,
+                 max_in_flight: int = LLM_MAX_IN_FLIGHT):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_in_flight = max(max_in_flight, 1)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self._queue: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.priorities = {priority: PriorityStats() for priority in PRIORITY_NAMES}
+    
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        
+        while self._queue and self.in_flight < self.max_in_flight:
+            head = self._queue[0]
+            if head.future.done():
+                heapq.heappop(self._queue)
+                continue
+            
+            wait = max(
+                self.blocked_until - time.monotonic(),
+                self.requests.delay(1),
+                self.tokens.delay(head.tokens)
+            )
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            
+            heapq.heappop(self._queue)
+            self.requests.take(1)
+            self.tokens.take(head.tokens)
+            self.in_flight += 1
+            head.future.set_result(None)
+    
+    async def _acquire(self, priority: int, tokens: int):
+        stats = self.priorities[priority]
+        waiter = _Waiter(priority, next(self._seq), tokens, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queue, waiter)
+        stats.queued += 1
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as the caller gave up; hand the slot to the next waiter
+                self._release(tokens, 0)
+            else:
+                waiter.future.cancel()
+            raise
+        finally:
+            stats.queued -= 1
+            waited = time.monotonic() - waiter.queued
+            stats.record_wait(waited)
+            record_span("llm_queue", waited, priority=PRIORITY_NAMES[priority])
+    
+    def _release(self, estimated: int, used: Optional[int]):
+        self.in_flight -= 1
+        if used is not None:
+            # Settle the token bucket with what the call actually cost
+            self.tokens.refund(estimated - used)
+        self._dispatch()
+    
+    def _rate_limited(self, priority: int, error: RateLimited):
+        self.priorities[priority].rate_limited += 1
+        retry_after = error.retry_after if error.retry_after is not None else LLM_DEFAULT_RETRY_AFTER
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+    
+    async def complete(self, priority: int, model: str, instructions: str, prompt: str,
+                       temperature: float = 0.8, max_tokens: int = 200,
+                       schema: Optional[Dict] = None) -> Completion:
+        stats = self.priorities[priority]
+        stats.requests += 1
+        estimated = estimate_tokens(instructions, prompt, max_tokens)
+        for attempt in range(LLM_RATE_LIMIT_RETRIES + 1):
+            await self._acquire(priority, estimated)
+            used = None
+            try:
+                completion = await get_backend().complete(model, instructions, prompt, temperature, max_tokens, schema)
+                used = completion.input_tokens + completion.output_tokens
+                stats.completed += 1
+                return completion
+            except RateLimited as e:
+                self._rate_limited(priority, e)
+                if attempt == LLM_RATE_LIMIT_RETRIES:
+                    stats.failed += 1
+                    raise
+            except LLMError:
+                stats.failed += 1
+                raise
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                stats.failed += 1
+                raise LLMError(str(e)) from e
+            finally:
+                self._release(estimated, used)
+    
+    async def stream(self, priority: int, model: str, instructions: str, prompt: str,
+                     temperature: float = 0.8, max_tokens: int = 200) -> AsyncIterator[str]:
+        # Only a rate limit before the first token is retried; streams report no usage, so the
+        # estimate stands as the cost
+        stats = self.priorities[priority]
+        stats.requests += 1
+        estimated = estimate_tokens(instructions, prompt, max_tokens)
+        for attempt in range(LLM_RATE_LIMIT_RETRIES + 1):
+            await self._acquire(priority, estimated)
+            started = False
+            try:
+                async for delta in get_backend().stream(model, instructions, prompt, temperature, max_tokens):
+                    started = True
+                    yield delta
+                stats.completed += 1
+                return
+            except RateLimited as e:
+                self._rate_limited(priority, e)
+                if started or attempt == LLM_RATE_LIMIT_RETRIES:
+                    stats.failed += 1
+                    raise
+            except LLMError:
+                stats.failed += 1
+                raise
+            except (asyncio.CancelledError, GeneratorExit):
+                raise
+            except Exception as e:
+                stats.failed += 1
+                raise LLMError(str(e)) from e
+            finally:
+                self._release(estimated, None)
+    
+    def stats(self) -> Dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queued": sum(1 for waiter in self._queue if not waiter.future.done()),
+            "paused_seconds": max(self.blocked_until - time.monotonic(), 0.0),
+            "requests_per_minute": self.requests.capacity,
+            "tokens_per_minute": self.tokens.capacity,
+            "priorities": {PRIORITY_NAMES[priority]: stats.snapshot() for priority, stats in self.priorities.items()}
+        }
+
+llm_scheduler = LLMScheduler()
@@ -1,13 +1,36 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import List, Optional
-from app.database import get_db, init_db
-from app.game_engine import GameEngine
+from typing import Dict, List, Optional
+from app.database import AsyncSessionLocal, SessionLocal, dispose_engines, engine as db_engine, get_db, init_db, pool_status
+from app.game_engine import GameEngine, TurnState
+from app.async_store import load_turn_state
 from app.dm_assistant import DMAssistant
 from app.models import Campaign, Character, Message
+from app import dice_stats, llm, metrics
+from app.dice import DiceExpressionError
+from app.dice_stats import DICE_MONTE_CARLO_TRIALS
+from app.combat_engine import COMBAT_MAX_AUTO_TURNS, CombatEngine, combat_prefetcher
+from app.combat_sim import COMBAT_SIM_TRIALS, Combatant, combatant_from_character, simulate, validate_combatant
+from app.ai_player import prompt_stats
+from app.party_batch import party_mode_stats
+from app.suggestion_cache import suggestion_cache
+from app.event_log import DURABILITY_MODES, MESSAGE_DURABILITY, event_log
+from app.state_cache import state_cache
+from app.speculation import speculator
+from app.prefetch_store import prefetch_store
+from app.llm_scheduler import llm_scheduler
+from app.llm_resilience import resilient_llm
+from app.model_router import model_router
+from app.campaign_lock import CampaignLockTimeout, campaign_locks
+from app.tracing import TracingMiddleware, span, tracer
+from app.profiler import PROFILER_ENABLED, PROFILER_MAX_SECONDS, profiler
 import asyncio
+import hashlib
+import json
+import threading
 
 app = FastAPI(title="AI Dungeon Master API", root_path="/api")
 
@@ -17,28 +40,96 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
+app.add_middleware(TracingMiddleware)
 
 @app.on_event("startup")
-def startup_event():
+async def startup_event():
     init_db()
+    if MESSAGE_DURABILITY not in DURABILITY_MODES:
+        raise ValueError(f"MESSAGE_DURABILITY must be one of: {', '.join(DURABILITY_MODES)}")
+    if MESSAGE_DURABILITY == "async":
+        event_log.start()
+    if db_engine.dialect.name == "postgresql":
+        state_cache.start_listener(db_engine.url.set(drivername="postgresql").render_as_string(hide_password=False))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await event_log.stop()
+    state_cache.stop_listener()
+    await llm.shutdown()
+    await dispose_engines()
 
 class CampaignCreate(BaseModel):
     name: str
     description: str
     party_size: int
+    dice_seed: Optional[int] = None
+
+class CampaignSettings(BaseModel):
+    party_mode: Optional[str] = None
+    dice_seed: Optional[int] = None
+    speculative_drafts: Optional[bool] = None
+    model_routing: Optional[Dict[str, str]] = None
 
 class DMInput(BaseModel):
     message: str
 
 class DiceRoll(BaseModel):
-    dice_type: str
+    dice_type: Optional[str] = None
     count: int = 1
     modifier: int = 0
+    expression: Optional[str] = None
+
+class DiceAnalysisRequest(BaseModel):
+    expression: str
+    dc: Optional[int] = None
+    method: str = "auto"
+    trials: int = DICE_MONTE_CARLO_TRIALS
+    include_outcomes: bool = True
+
+class AttackOddsRequest(BaseModel):
+    attack: str
+    damage: str
+    armor_class: int
 
 class ScenarioRequest(BaseModel):
     context: str = ""
 
+class EnemyStatBlock(BaseModel):
+    name: str
+    hit_points: int
+    armor_class: int
+    attack_bonus: int
+    damage: str
+    initiative_bonus: int = 0
+    attacks: int = 1
+    count: int = 1
+
+class CombatSimulationRequest(BaseModel):
+    enemies: List[EnemyStatBlock]
+    trials: int = COMBAT_SIM_TRIALS
+
+class CombatStartRequest(BaseModel):
+    enemies: List[EnemyStatBlock] = []
+
+class CombatEffect(BaseModel):
+    character_id: Optional[int] = None
+    enemy_id: Optional[str] = None
+    hp_change: int
+    note: Optional[str] = None
+
+class EncounterRequest(BaseModel):
+    environment: str
+
+def _etag(*parts) -> str:
+    digest = hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()[:16]
+    return f'W/"{digest}"'
+
+def _not_modified(request: Request, etag: str) -> bool:
+    return etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+
 @app.get("/")
 def read_root():
     return {"message": "AI Dungeon Master API", "status": "running"}
@@ -47,12 +138,15 @@ def read_root():
 def create_campaign(campaign: CampaignCreate, db: Session = Depends(get_db)):
     if campaign.party_size < 1 or campaign.party_size > 6:
         raise HTTPException(status_code=400, detail="Party size must be between 1 and 6")
+    if campaign.dice_seed is not None and campaign.dice_seed < 0:
+        raise HTTPException(status_code=400, detail="dice_seed must not be negative")
     
     engine = GameEngine(db)
     new_campaign = engine.create_campaign(
         name=campaign.name,
         description=campaign.description,
-        party_size=campaign.party_size
+        party_size=campaign.party_size,
+        dice_seed=campaign.dice_seed
     )
     
     return {
@@ -77,15 +171,26 @@ def get_campaign(campaign_id: int, db: Session = Depends(get_db)):
         "description": campaign.description,
         "party_size": campaign.party_size,
         "created_at": campaign.created_at,
-        "is_active": campaign.is_active
+        "is_active": campaign.is_active,
+        "settings": campaign.settings or {}
     }
 
+@app.patch("/campaigns/{campaign_id}/settings")
+def update_campaign_settings(campaign_id: int, settings: CampaignSettings, db: Session = Depends(get_db)):
+    engine = GameEngine(db)
+    result = engine.update_settings(campaign_id, settings.dict(exclude_none=True))
+    
+    if "error" in result:
+        raise HTTPException(status_code=400, detail=result["error"])
+    
+    return result
+
 @app.get("/campaigns/{campaign_id}/characters")
-def get_characters(campaign_id: int, db: Session = Depends(get_db)):
+def get_characters(campaign_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     engine = GameEngine(db)
     characters = engine.get_characters(campaign_id)
     
-    return [
+    payload = [
         {
             "id": char.id,
             "name": char.name,
@@ -107,33 +212,140 @@ def get_characters(campaign_id: int, db: Session = Depends(get_db)):
         }
         for char in characters
     ]
+    
+    etag = _etag(payload)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    response.headers["ETag"] = etag
+    return payload
 
 @app.post("/campaigns/{campaign_id}/dm-input")
 async def dm_input(campaign_id: int, dm_input: DMInput, db: Session = Depends(get_db)):
     engine = GameEngine(db)
-    campaign = engine.get_campaign(campaign_id)
     
-    if not campaign:
+    # One DM input per campaign at a time, across every worker, so turns never interleave
+    try:
+        async with campaign_locks.hold(campaign_id):
+            # With DB_ASYNC the whole turn reads and writes through asyncpg without blocking the loop
+            if AsyncSessionLocal is not None:
+                async with AsyncSessionLocal() as session:
+                    state = await load_turn_state(session, campaign_id)
+                    return await _run_dm_turn(engine, state, dm_input.message, session)
+            
+            state = await asyncio.to_thread(engine.load_turn_state, campaign_id)
+            return await _run_dm_turn(engine, state, dm_input.message)
+    except CampaignLockTimeout:
+        raise HTTPException(status_code=409, detail="The party is still responding to the previous DM input")
+
+async def _run_dm_turn(engine: GameEngine, state: Optional[TurnState], message: str, session=None) -> Dict:
+    if state is None:
         raise HTTPException(status_code=404, detail="Campaign not found")
     
-    engine.add_message(
-        campaign_id=campaign_id,
-        role="dm",
-        content=dm_input.message,
-        message_type="narrative"
-    )
-    
-    responses = await engine.get_party_responses(campaign_id, dm_input.message)
+    with span("dm_turn", campaign_id=state.campaign_id, characters=len(state.characters)):
+        turn = engine.begin_turn()
+        dm_message = turn.add_message(
+            campaign_id=state.campaign_id,
+            role="dm",
+            content=message,
+            message_type="narrative"
+        )
+        responses = await engine.get_party_responses(state.campaign_id, message, turn=turn, state=state)
+        await engine.commit_turn(turn, session)
     
     return {
-        "dm_message": dm_input.message,
+        "dm_message": message,
+        "dm_message_id": dm_message.get("id"),
         "party_responses": responses
     }
 
+@app.post("/campaigns/{campaign_id}/dm-input/draft")
+async def dm_input_draft(campaign_id: int, dm_input: DMInput, db: Session = Depends(get_db)):
+    # Starts the party thinking about an unfinished DM message; the real dm-input reuses the
+    # replies if the message sent ends up close enough to this draft
+    engine = GameEngine(db)
+    # Called on every debounced keystroke, so the state is loaded without blocking the event loop;
+    # the drafts themselves are started here since they are tasks on the loop
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as session:
+            state = await load_turn_state(session, campaign_id)
+    else:
+        state = await asyncio.to_thread(engine.load_turn_state, campaign_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    
+    result = engine.speculate(campaign_id, dm_input.message, state)
+    if "error" in result:
+        raise HTTPException(status_code=404, detail=result["error"])
+    return result
+
+@app.post("/campaigns/{campaign_id}/dm-input/stream")
+async def dm_input_stream(campaign_id: int, dm_input: DMInput, db: Session = Depends(get_db)):
+    engine = GameEngine(db)
+    campaign = await asyncio.to_thread(engine.get_campaign, campaign_id)
+    
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    
+    async def events():
+        # The request-scoped session may be closed before the body is sent, so stream on our own
+        stream_db = SessionLocal()
+        try:
+            # The lock is taken inside the stream so a dropped connection always releases it
+            async with campaign_locks.hold(campaign_id):
+                with span("dm_turn", campaign_id=campaign_id, streamed=True):
+                    stream_engine = GameEngine(stream_db)
+                    # Loaded before the DM message is committed, as dm-input does, so the message isn't
+                    # in the party context twice
+                    state = await asyncio.to_thread(stream_engine.load_turn_state, campaign_id)
+                    speculative = await stream_engine.take_speculation(campaign_id, dm_input.message, state)
+                    turn = stream_engine.begin_turn()
+                    dm_message = turn.add_message(
+                        campaign_id=campaign_id,
+                        role="dm",
+                        content=dm_input.message,
+                        message_type="narrative"
+                    )
+                    await stream_engine.commit_turn(turn, durable=True)
+                    
+                    yield f"data: {json.dumps({'type': 'dm', 'message_id': dm_message.get('id')})}\n\n"
+                    async for event in stream_engine.stream_party_responses(
+                        campaign_id, dm_input.message, speculative=speculative, state=state
+                    ):
+                        yield f"data: {json.dumps(event)}\n\n"
+            yield f"data: {json.dumps({'type': 'end'})}\n\n"
+        except CampaignLockTimeout:
+            yield f"data: {json.dumps({'type': 'error', 'detail': 'The party is still responding to the previous DM input'})}\n\n"
+        finally:
+            stream_db.close()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/campaigns/{campaign_id}/messages")
-def get_messages(campaign_id: int, limit: int = 50, db: Session = Depends(get_db)):
+def get_messages(campaign_id: int, request: Request, response: Response, limit: int = 50,
+                 before_id: Optional[int] = None, after_id: Optional[int] = None,
+                 since_id: Optional[int] = None, db: Session = Depends(get_db)):
+    if limit < 1 or limit > 500:
+        raise HTTPException(status_code=400, detail="Limit must be between 1 and 500")
+    
     engine = GameEngine(db)
-    messages = engine.get_messages(campaign_id, limit)
+    after_id = since_id if since_id is not None else after_id
+    
+    # The newest message ID changes whenever the log does, so it is enough to validate the cache
+    latest_id = engine.latest_message_id(campaign_id)
+    etag = _etag(campaign_id, latest_id, limit, before_id, after_id)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    
+    if after_id is not None and after_id >= latest_id:
+        return []
+    
+    messages = engine.get_messages(campaign_id, limit, before_id=before_id, after_id=after_id)
     
     return [
         {
@@ -153,7 +365,9 @@ def roll_dice(campaign_id: int, dice_roll: DiceRoll, db: Session = Depends(get_d
     result = engine.roll_dice(
         dice_type=dice_roll.dice_type,
         count=dice_roll.count,
-        modifier=dice_roll.modifier
+        modifier=dice_roll.modifier,
+        expression=dice_roll.expression,
+        campaign_id=campaign_id
     )
     
     if "error" in result:
@@ -161,47 +375,328 @@ def roll_dice(campaign_id: int, dice_roll: DiceRoll, db: Session = Depends(get_d
     
     return result
 
+@app.post("/dice/analyze")
+def analyze_dice(request: DiceAnalysisRequest):
+    if request.trials < 1:
+        raise HTTPException(status_code=400, detail="trials must be positive")
+    try:
+        return dice_stats.analyze(
+            request.expression,
+            dc=request.dc,
+            method=request.method,
+            trials=request.trials,
+            include_outcomes=request.include_outcomes
+        )
+    except DiceExpressionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/dice/attack-odds")
+def attack_odds(request: AttackOddsRequest):
+    try:
+        return dice_stats.attack_odds(request.attack, request.damage, request.armor_class)
+    except DiceExpressionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _enemy_combatants(blocks: List[EnemyStatBlock]) -> List[Combatant]:
+    enemies = [
+        Combatant(
+            name=block.name,
+            max_hp=block.hit_points,
+            armor_class=block.armor_class,
+            attack_bonus=block.attack_bonus,
+            damage=block.damage,
+            initiative_bonus=block.initiative_bonus,
+            attacks=block.attacks,
+            count=block.count
+        )
+        for block in blocks
+    ]
+    for enemy in enemies:
+        validate_combatant(enemy)
+    return enemies
+
 @app.post("/campaigns/{campaign_id}/combat/start")
-def start_combat(campaign_id: int, db: Session = Depends(get_db)):
+async def start_combat(campaign_id: int, request: Optional[CombatStartRequest] = None,
+                       db: Session = Depends(get_db)):
     engine = GameEngine(db)
-    result = engine.start_combat(campaign_id)
+    try:
+        enemies = _enemy_combatants(request.enemies if request else [])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Starting combat waits on the campaign's transaction lock, so keep it off the event loop
+    result = await asyncio.to_thread(engine.start_combat, campaign_id, enemies)
     
     if "error" in result:
         raise HTTPException(status_code=400, detail=result["error"])
     
+    # Actions another worker prefetched for an earlier fight are no use in this one
+    await asyncio.to_thread(prefetch_store.discard, campaign_id, "combat")
+    state = await asyncio.to_thread(engine.get_campaign_state, campaign_id)
+    CombatEngine(engine).prefetch(state)
     return result
 
+@app.get("/campaigns/{campaign_id}/combat")
+def get_combat(campaign_id: int, db: Session = Depends(get_db)):
+    status = CombatEngine(GameEngine(db)).status(campaign_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Combat state not found")
+    return status
+
+@app.get("/campaigns/{campaign_id}/combat/events")
+def get_combat_events(campaign_id: int, after_id: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    if limit < 1 or limit > 500:
+        raise HTTPException(status_code=400, detail="Limit must be between 1 and 500")
+    return CombatEngine(GameEngine(db)).events(campaign_id, after_id, limit)
+
+async def _combat_action(campaign_id: int, action) -> Dict:
+    try:
+        async with campaign_locks.hold(campaign_id):
+            result = await action()
+    except CampaignLockTimeout:
+        raise HTTPException(status_code=409, detail="Another action is still being resolved for this campaign")
+    
+    if "error" in result:
+        raise HTTPException(status_code=400, detail=result["error"])
+    return result
+
+@app.post("/campaigns/{campaign_id}/combat/advance")
+async def advance_combat_turn(campaign_id: int, db: Session = Depends(get_db)):
+    combat = CombatEngine(GameEngine(db))
+    return await _combat_action(campaign_id, lambda: combat.advance_turn(campaign_id))
+
+@app.post("/campaigns/{campaign_id}/combat/effects")
+async def apply_combat_effect(campaign_id: int, effect: CombatEffect, db: Session = Depends(get_db)):
+    if (effect.character_id is None) == (effect.enemy_id is None):
+        raise HTTPException(status_code=400, detail="Give exactly one of character_id or enemy_id")
+    
+    target = effect.enemy_id if effect.enemy_id is not None else f"c{effect.character_id}"
+    combat = CombatEngine(GameEngine(db))
+    return await _combat_action(
+        campaign_id,
+        lambda: combat.apply_effect(campaign_id, target, effect.hp_change, effect.note)
+    )
+
+@app.post("/campaigns/{campaign_id}/combat/auto-run")
+async def auto_run_combat(campaign_id: int, max_turns: int = COMBAT_MAX_AUTO_TURNS, db: Session = Depends(get_db)):
+    if max_turns < 1 or max_turns > COMBAT_MAX_AUTO_TURNS:
+        raise HTTPException(status_code=400, detail=f"max_turns must be between 1 and {COMBAT_MAX_AUTO_TURNS}")
+    
+    combat = CombatEngine(GameEngine(db))
+    return await _combat_action(campaign_id, lambda: combat.run_ai_turns(campaign_id, max_turns))
+
+@app.post("/campaigns/{campaign_id}/combat/simulate")
+def simulate_combat(campaign_id: int, request: CombatSimulationRequest, db: Session = Depends(get_db)):
+    engine = GameEngine(db)
+    characters = engine.get_characters(campaign_id)
+    if not characters:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    
+    try:
+        enemies = _enemy_combatants(request.enemies)
+        result = simulate([combatant_from_character(char) for char in characters], enemies, trials=request.trials)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return result.to_dict()
+
 @app.post("/campaigns/{campaign_id}/combat/end")
 def end_combat(campaign_id: int, db: Session = Depends(get_db)):
     engine = GameEngine(db)
     engine.end_combat(campaign_id)
+    combat_prefetcher.cancel_campaign(campaign_id)
+    prefetch_store.discard(campaign_id, "combat")
     return {"message": "Combat ended"}
 
+def _assistant(engine: GameEngine, campaign_id: int) -> DMAssistant:
+    state = engine.get_campaign_state(campaign_id)
+    settings = (state.campaign.settings or {}) if state else {}
+    return DMAssistant(settings.get("model_routing"))
+
 @app.post("/dm-assistant/scenarios")
-def get_scenario_suggestions(
+async def get_scenario_suggestions(
     campaign_id: int,
     scenario_request: ScenarioRequest,
     db: Session = Depends(get_db)
 ):
     engine = GameEngine(db)
-    characters = engine.get_characters(campaign_id)
     
-    char_info = [
-        {
-            "name": char.name,
-            "race": char.race,
-            "char_class": char.char_class,
-            "level": char.level,
-            "personality_traits": char.personality_traits
-        }
-        for char in characters
-    ]
+    def load():
+        char_info = [
+            {
+                "name": char.name,
+                "race": char.race,
+                "char_class": char.char_class,
+                "level": char.level,
+                "personality_traits": char.personality_traits
+            }
+            for char in engine.get_characters(campaign_id)
+        ]
+        return char_info, _assistant(engine, campaign_id)
     
-    assistant = DMAssistant()
-    suggestions = assistant.suggest_scenarios(scenario_request.context, char_info)
+    # The reads use the sync session, so they run in a worker thread; only the LLM call is awaited here
+    char_info, assistant = await asyncio.to_thread(load)
+    suggestions = await assistant.suggest_scenarios(scenario_request.context, char_info)
     
     return {"suggestions": suggestions}
 
+@app.post("/dm-assistant/encounter")
+async def get_encounter_suggestion(
+    campaign_id: int,
+    encounter_request: EncounterRequest,
+    db: Session = Depends(get_db)
+):
+    engine = GameEngine(db)
+    
+    def load():
+        characters = engine.get_characters(campaign_id)
+        if not characters:
+            return None
+        party = [combatant_from_character(char) for char in characters]
+        party_level = round(sum(char.level for char in characters) / len(characters))
+        return party_level, party, _assistant(engine, campaign_id)
+    
+    # Sync session reads go to a worker thread, as for scenario suggestions
+    loaded = await asyncio.to_thread(load)
+    if loaded is None:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    
+    party_level, party, assistant = loaded
+    return await assistant.suggest_encounter(party_level, encounter_request.environment, party)
+
+@app.get("/stats/prompt-cache")
+def prompt_cache_stats():
+    return prompt_stats.snapshot()
+
+@app.get("/stats/party-modes")
+def party_mode_statistics():
+    return party_mode_stats.snapshot()
+
+@app.get("/stats/suggestion-cache")
+def suggestion_cache_statistics():
+    return suggestion_cache.stats()
+
+@app.get("/stats/event-log")
+def event_log_statistics():
+    return event_log.stats()
+
+@app.get("/stats/state-cache")
+def state_cache_statistics():
+    return state_cache.stats()
+
+@app.get("/stats/campaign-locks")
+def campaign_lock_statistics():
+    return campaign_locks.stats()
+
+@app.get("/stats/dice-analytics")
+def dice_analytics_statistics():
+    return dice_stats.cache_stats()
+
+@app.get("/stats/combat-prefetch")
+def combat_prefetch_statistics():
+    return combat_prefetcher.stats()
+
+@app.get("/stats/speculation")
+def speculation_statistics():
+    return speculator.stats()
+
+@app.get("/stats/llm-scheduler")
+def llm_scheduler_statistics():
+    return llm_scheduler.stats()
+
+@app.get("/stats/llm-resilience")
+def llm_resilience_statistics():
+    return resilient_llm.stats()
+
+@app.get("/stats/model-routing")
+def model_routing_statistics():
+    return model_router.stats()
+
+@app.get("/stats/db-pool")
+def db_pool_statistics():
+    return pool_status()
+
+@app.get("/stats/traces")
+async def trace_statistics(limit: int = 20, campaign_id: Optional[int] = None, min_ms: float = 0):
+    # Served on the event loop, which is the only writer of the trace buffer
+    return {**tracer.stats(), "traces": tracer.traces(limit, campaign_id, min_ms / 1000)}
+
+def _runtime_gauges() -> metrics.Gauges:
+    gauges = metrics.Gauges()
+    scheduler = llm_scheduler.stats()
+    gauges.add("dungeon_llm_in_flight", "LLM calls currently running", scheduler["in_flight"])
+    gauges.add("dungeon_llm_paused_seconds", "Seconds left in a rate limit pause", scheduler["paused_seconds"])
+    for priority, stats in scheduler["priorities"].items():
+        gauges.add("dungeon_llm_queue_depth", "LLM calls waiting for dispatch", stats["queued"], priority=priority)
+        gauges.add("dungeon_llm_requests_total", "LLM calls submitted", stats["requests"], "counter", priority=priority)
+        gauges.add("dungeon_llm_failures_total", "LLM calls failed", stats["failed"], "counter", priority=priority)
+        gauges.add(
+            "dungeon_llm_rate_limited_total", "LLM calls answered with a rate limit", stats["rate_limited"], "counter",
+            priority=priority
+        )
+    
+    for tier, stats in model_router.stats()["tiers"].items():
+        for token_type in ("input", "cached", "output"):
+            gauges.add(
+                "dungeon_llm_tokens_total", "LLM tokens by model tier", stats[f"{token_type}_tokens"], "counter",
+                tier=tier, type=token_type
+            )
+        gauges.add(
+            "dungeon_llm_cost_usd_total", "Estimated LLM spend by model tier", stats["cost_usd"], "counter", tier=tier
+        )
+    
+    resilience = resilient_llm.stats()
+    for name in ("retries", "hedges", "fallbacks"):
+        gauges.add(f"dungeon_llm_{name}_total", f"LLM {name}", resilience[name], "counter")
+    for backend, breaker in resilience["breakers"].items():
+        gauges.add(
+            "dungeon_llm_breaker_open", "1 while the backend's circuit breaker is open",
+            int(breaker["state"] == "open"), backend=backend
+        )
+    
+    for name, status in pool_status().items():
+        gauges.add("dungeon_db_pool_size", "Connections kept in the pool", status.get("size", 0), engine=name)
+        gauges.add("dungeon_db_pool_checked_out", "Connections in use", status.get("checked_out", 0), engine=name)
+        gauges.add("dungeon_db_pool_overflow", "Connections beyond the pool size", max(status.get("overflow", 0), 0), engine=name)
+        gauges.add("dungeon_db_pool_checkouts_total", "Connection checkouts", status["checkouts"], "counter", engine=name)
+        gauges.add(
+            "dungeon_db_pool_wait_seconds_total", "Time spent waiting for a connection",
+            status["avg_wait_seconds"] * status["checkouts"], "counter", engine=name
+        )
+    
+    events = event_log.stats()
+    gauges.add("dungeon_event_log_queue_depth", "Messages waiting for the write-behind log", events["queue_depth"])
+    gauges.add("dungeon_event_log_dropped_total", "Messages dropped after failed flushes", events["dropped"], "counter")
+    cache = state_cache.stats()
+    gauges.add("dungeon_state_cache_campaigns", "Campaigns held in the state cache", cache["campaigns"])
+    gauges.add("dungeon_state_cache_hits_total", "State cache hits", cache["hits"], "counter")
+    gauges.add("dungeon_state_cache_misses_total", "State cache misses", cache["misses"], "counter")
+    gauges.add("dungeon_speculation_in_flight", "Campaigns with a draft being answered", speculator.stats()["in_flight"])
+    gauges.add("dungeon_combat_prefetch_pending", "Combat actions prefetching", combat_prefetcher.stats()["pending"])
+    return gauges
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    # Read on the event loop so the stats objects are never walked while a coroutine changes them
+    return PlainTextResponse(metrics.render(_runtime_gauges()), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profile")
+async def profile(seconds: float = 10, all_threads: bool = False):
+    # Samples the event loop (or every thread) for a while and returns collapsed stacks for a flame graph
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiler is disabled")
+    if seconds <= 0 or seconds > PROFILER_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be between 0 and {PROFILER_MAX_SECONDS}")
+    if profiler.running:
+        raise HTTPException(status_code=409, detail="A profile is already being taken")
+    
+    profiler.start(None if all_threads else threading.get_ident())
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.stop()
+    return PlainTextResponse(profiler.collapsed())
+
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
@@ -0,0 +1,111 @@
+from typing import Dict, Iterable, List, Tuple
+import bisect
+import math
+import threading
+
+# Prometheus text exposition (format 0.0.4), rendered by hand so scraping needs no client library
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+    return f"{{{pairs}}}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: non-cumulative bucket counts (last one is +Inf), sum of observations.
+        # Database statements are observed from threadpool threads, hence the lock.
+        self._series: Dict[LabelKey, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1][0] += value
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(counts), total[0]) for key, (counts, total) in self._series.items())
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', _format_value(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+class Gauges:
+    # Values read from the existing stats objects at scrape time rather than tracked twice
+    def __init__(self):
+        self._families: Dict[str, Tuple[str, str, List[Tuple[LabelKey, float]]]] = {}
+    
+    def add(self, name: str, help_text: str, value: float, metric_type: str = "gauge", **labels):
+        family = self._families.setdefault(name, (metric_type, help_text, []))
+        family[2].append((_label_key(labels), value))
+    
+    def render(self) -> List[str]:
+        lines = []
+        for name, (kind, help_text, samples) in self._families.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            lines += [f"{name}{_format_labels(key)} {_format_value(value)}" for key, value in samples]
+        return lines
+
+span_seconds = Histogram(
+    "dungeon_span_seconds",
+    "Duration of traced stages (HTTP requests, turn stages, LLM calls) in seconds"
+)
+db_query_seconds = Histogram("dungeon_db_query_seconds", "Database statement execution time in seconds")
+llm_call_seconds = Histogram(
+    "dungeon_llm_call_seconds",
+    "LLM call latency in seconds by call type and model tier, including queueing and retries",
+    LLM_LATENCY_BUCKETS
+)
+http_requests = Counter("dungeon_http_requests_total", "HTTP requests by route and status")
+
+def render(gauges: Gauges) -> str:
+    lines = []
+    for metric in (span_seconds, db_query_seconds, llm_call_seconds, http_requests, gauges):
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
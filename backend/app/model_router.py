@@ -0,0 +1,189 @@
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+from app.llm import Completion
+from app.llm_resilience import resilient_llm
+from app.llm_scheduler import estimate_tokens
+from app.metrics import llm_call_seconds
+from app.tracing import record_span, span
+import json
+import os
+import time
+
+# Model tiers from most to least capable; a tier breaching its latency SLO hands over to the next
+MODEL_TIERS = ("premium", "standard", "fast")
+DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o")
+TIER_MODELS = {
+    "premium": os.getenv("MODEL_TIER_PREMIUM", DEFAULT_MODEL),
+    "standard": os.getenv("MODEL_TIER_STANDARD", DEFAULT_MODEL),
+    "fast": os.getenv("MODEL_TIER_FAST", "gpt-4o-mini")
+}
+
+def _prices(tier: str, default: str) -> Tuple[float, float, float]:
+    # USD per million input, cached input and output tokens
+    values = [float(value) for value in os.getenv(f"MODEL_TIER_{tier.upper()}_PRICES", default).split(",")]
+    return values[0], values[1], values[2]
+
+TIER_PRICES = {
+    "premium": _prices("premium", "2.5,1.25,10"),
+    "standard": _prices("standard", "2.5,1.25,10"),
+    "fast": _prices("fast", "0.15,0.075,0.6")
+}
+
+CALL_TYPES = ("party_response", "party_batch", "combat_action", "scenarios", "npc_dialogue", "encounter", "summary")
+DEFAULT_POLICY = {
+    "party_response": "standard",
+    "party_batch": "standard",
+    "combat_action": "fast",
+    "scenarios": "standard",
+    "npc_dialogue": "fast",
+    "encounter": "premium",
+    "summary": "fast"
+}
+# p95 latency targets in seconds
+DEFAULT_SLOS = {
+    "party_response": 4.0,
+    "party_batch": 8.0,
+    "combat_action": 4.0,
+    "scenarios": 10.0,
+    "npc_dialogue": 5.0,
+    "encounter": 20.0,
+    "summary": 60.0
+}
+MODEL_ROUTING_POLICY = {**DEFAULT_POLICY, **json.loads(os.getenv("MODEL_ROUTING_POLICY", "{}"))}
+MODEL_ROUTING_SLOS = {**DEFAULT_SLOS, **json.loads(os.getenv("MODEL_ROUTING_SLOS", "{}"))}
+MODEL_ROUTING_WINDOW = int(os.getenv("MODEL_ROUTING_WINDOW", "50"))
+MODEL_ROUTING_MIN_SAMPLES = int(os.getenv("MODEL_ROUTING_MIN_SAMPLES", "10"))
+MODEL_ROUTING_COOLDOWN = float(os.getenv("MODEL_ROUTING_COOLDOWN", "120"))
+MODEL_LATENCY_SAMPLES = 1000
+
+def validate_routing(routing: Dict) -> Optional[str]:
+    for call_type, tier in routing.items():
+        if call_type not in CALL_TYPES:
+            return f"model_routing call types must be among: {', '.join(CALL_TYPES)}"
+        if tier not in MODEL_TIERS:
+            return f"model_routing tiers must be one of: {', '.join(MODEL_TIERS)}"
+    return None
+
+def _percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)] if ordered else 0.0
+
+class TierStats:
+    def __init__(self):
+        self.calls = 0
+        self.input_tokens = 0
+        self.cached_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+        self.latencies: Deque[float] = deque(maxlen=MODEL_LATENCY_SAMPLES)
+    
+    def record(self, tier: str, seconds: float, input_tokens: int, cached_tokens: int, output_tokens: int):
+        input_price, cached_price, output_price = TIER_PRICES[tier]
+        self.calls += 1
+        self.input_tokens += input_tokens
+        self.cached_tokens += cached_tokens
+        self.output_tokens += output_tokens
+        self.cost += (
+            (input_tokens - cached_tokens) * input_price + cached_tokens * cached_price + output_tokens * output_price
+        ) / 1_000_000
+        self.latencies.append(seconds)
+    
+    def snapshot(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "input_tokens": self.input_tokens,
+            "cached_tokens": self.cached_tokens,
+            "output_tokens": self.output_tokens,
+            "cost_usd": round(self.cost, 6),
+            "p50_latency": _percentile(self.latencies, 0.5),
+            "p95_latency": _percentile(self.latencies, 0.95)
+        }
+
+class ModelRouter:
+    # Picks a tier per call type: the campaign's model_routing setting if it has one, else the
+    # policy. Each (call type, tier) keeps a short latency window; once its p95 breaks the call
+    # type's SLO the tier is skipped for that call type until the cooldown passes, then tried afresh.
+    def __init__(self, policy: Dict[str, str] = MODEL_ROUTING_POLICY, slos: Dict[str, float] = MODEL_ROUTING_SLOS):
+        self.policy = policy
+        self.slos = slos
+        self._windows: Dict[Tuple[str, str], Deque[float]] = {}
+        self._downgraded: Dict[Tuple[str, str], float] = {}
+        self.tiers = {tier: TierStats() for tier in MODEL_TIERS}
+        self.downgrades = 0
+    
+    def route(self, call_type: str, routing: Optional[Dict] = None) -> Tuple[str, str]:
+        tier = (routing or {}).get(call_type) or self.policy[call_type]
+        index = MODEL_TIERS.index(tier)
+        now = time.monotonic()
+        while index < len(MODEL_TIERS) - 1 and self._downgraded.get((call_type, MODEL_TIERS[index]), 0) > now:
+            index += 1
+        tier = MODEL_TIERS[index]
+        return tier, TIER_MODELS[tier]
+    
+    def record(self, call_type: str, tier: str, seconds: float,
+               input_tokens: int, cached_tokens: int, output_tokens: int):
+        self.tiers[tier].record(tier, seconds, input_tokens, cached_tokens, output_tokens)
+        llm_call_seconds.observe(seconds, call_type=call_type, tier=tier)
+        
+        key = (call_type, tier)
+        window = self._windows.setdefault(key, deque(maxlen=MODEL_ROUTING_WINDOW))
+        window.append(seconds)
+        if tier != MODEL_TIERS[-1] and len(window) >= MODEL_ROUTING_MIN_SAMPLES \
+                and _percentile(window, 0.95) > self.slos[call_type]:
+            self._downgraded[key] = time.monotonic() + MODEL_ROUTING_COOLDOWN
+            window.clear()
+            self.downgrades += 1
+    
+    async def complete(self, call_type: str, priority: int, routing: Optional[Dict] = None, **kwargs) -> Completion:
+        tier, model = self.route(call_type, routing)
+        with span("llm", call_type=call_type, tier=tier, model=model) as current:
+            started = time.perf_counter()
+            completion = await resilient_llm.complete(priority, model=model, **kwargs)
+            self.record(
+                call_type, tier, time.perf_counter() - started,
+                completion.input_tokens, completion.cached_tokens, completion.output_tokens
+            )
+            current.set(
+                input_tokens=completion.input_tokens,
+                cached_tokens=completion.cached_tokens,
+                output_tokens=completion.output_tokens
+            )
+        return completion
+    
+    async def stream(self, call_type: str, priority: int, instructions: str, prompt: str,
+                     temperature: float = 0.8, max_tokens: int = 200,
+                     routing: Optional[Dict] = None) -> AsyncIterator[str]:
+        # Streams report no usage, so cost is estimated from the prompt size and the deltas received.
+        # The span is recorded afterwards since a generator's context is its consumer's between yields.
+        tier, model = self.route(call_type, routing)
+        started = time.perf_counter()
+        deltas = 0
+        async for delta in resilient_llm.stream(priority, model, instructions, prompt, temperature, max_tokens):
+            deltas += 1
+            yield delta
+        seconds = time.perf_counter() - started
+        self.record(call_type, tier, seconds, estimate_tokens(instructions, prompt, 0), 0, deltas)
+        record_span("llm", seconds, call_type=call_type, tier=tier, model=model, streamed=True, output_tokens=deltas)
+    
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        return {
+            "tiers": {
+                tier: {"model": TIER_MODELS[tier], **stats.snapshot()} for tier, stats in self.tiers.items()
+            },
+            "call_types": {
+                call_type: {
+                    "policy_tier": self.policy[call_type],
+                    "current_tier": self.route(call_type)[0],
+                    "slo_seconds": self.slos[call_type]
+                }
+                for call_type in CALL_TYPES
+            },
+            "downgrades": self.downgrades,
+            "downgraded": {
+                f"{call_type}:{tier}": round(until - now, 1)
+                for (call_type, tier), until in self._downgraded.items() if until > now
+            }
+        }
+
+model_router = ModelRouter()
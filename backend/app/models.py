@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Boolean, JSON
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Boolean, JSON, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -15,16 +15,20 @@ class Campaign(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = Column(Boolean, default=True)
+    settings = Column(JSON, default=dict)
+    state_version = Column(Integer, default=0)
+    dice_rolls = Column(Integer, default=0)
     
     characters = relationship("Character", back_populates="campaign", cascade="all, delete-orphan")
     messages = relationship("Message", back_populates="campaign", cascade="all, delete-orphan")
     combat_state = relationship("CombatState", back_populates="campaign", uselist=False, cascade="all, delete-orphan")
+    summary = relationship("CampaignSummary", back_populates="campaign", uselist=False, cascade="all, delete-orphan")
 
 class Character(Base):
     __tablename__ = "characters"
     
     id = Column(Integer, primary_key=True, index=True)
-    campaign_id = Column(Integer, ForeignKey("campaigns.id"), nullable=False)
+    campaign_id = Column(Integer, ForeignKey("campaigns.id"), nullable=False, index=True)
     name = Column(String, nullable=False)
     race = Column(String, nullable=False)
     char_class = Column(String, nullable=False)
@@ -51,6 +55,10 @@ class Character(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_campaign_id_id", "campaign_id", "id"),
+        Index("ix_messages_campaign_id_timestamp", "campaign_id", "timestamp"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     campaign_id = Column(Integer, ForeignKey("campaigns.id"), nullable=False)
@@ -66,10 +74,52 @@ class CombatState(Base):
     __tablename__ = "combat_state"
     
     id = Column(Integer, primary_key=True, index=True)
-    campaign_id = Column(Integer, ForeignKey("campaigns.id"), nullable=False, unique=True)
+    campaign_id = Column(Integer, ForeignKey("campaigns.id"), nullable=False, unique=True, index=True)
     is_active = Column(Boolean, default=False)
     current_turn = Column(Integer, default=0)
     round_number = Column(Integer, default=1)
     initiative_order = Column(JSON, default=list)
+    enemies = Column(JSON, default=list)
     
     campaign = relationship("Campaign", back_populates="combat_state")
+
+class CombatEvent(Base):
+    __tablename__ = "combat_events"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    campaign_id = Column(Integer, ForeignKey("campaigns.id"), nullable=False, index=True)
+    round_number = Column(Integer, nullable=False)
+    turn = Column(Integer, nullable=False)
+    kind = Column(String, nullable=False)
+    delta = Column(JSON, default=dict)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class CampaignSummary(Base):
+    __tablename__ = "campaign_summaries"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    campaign_id = Column(Integer, ForeignKey("campaigns.id"), nullable=False, unique=True)
+    content = Column(Text, default="")
+    last_message_id = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    campaign = relationship("Campaign", back_populates="summary")
+
+class PrefetchResult(Base):
+    # Finished prefetches shared between workers; see prefetch_store
+    __tablename__ = "prefetch_results"
+    __table_args__ = (
+        Index("ix_prefetch_results_campaign_id_kind_key", "campaign_id", "kind", "key"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    campaign_id = Column(Integer, ForeignKey("campaigns.id"), nullable=False)
+    kind = Column(String, nullable=False)
+    key = Column(String, nullable=False)
+    character_id = Column(Integer, nullable=False)
+    draft = Column(Text, default="")
+    text = Column(Text, nullable=False)
+    model = Column(String)
+    input_tokens = Column(Integer, default=0)
+    output_tokens = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
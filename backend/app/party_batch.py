@@ -0,0 +1,94 @@
+from typing import Dict, List, Optional, Tuple
+import json
+from app.ai_player import AIPlayer, PLAYER_INSTRUCTIONS, prompt_stats
+from app.llm import Completion
+from app.model_router import model_router
+from app.llm_scheduler import PRIORITY_INTERACTIVE
+from app.context_manager import format_party_context
+from app.models import Character
+
+PARTY_MODES = ("individual", "batch")
+
+BATCH_INSTRUCTIONS = """You are playing every member of the party described below at once. Each character replies separately, in their own voice, following the roleplay instructions above.
+
+Reply with a JSON object that maps each character's ID to that character's reply."""
+
+class PartyModeStats:
+    def __init__(self):
+        self.modes = {
+            mode: {"turns": 0, "llm_calls": 0, "input_tokens": 0, "output_tokens": 0, "latency_total": 0.0}
+            for mode in PARTY_MODES
+        }
+    
+    def record(self, mode: str, latency: float, completions: List[Completion]):
+        stats = self.modes[mode]
+        stats["turns"] += 1
+        stats["llm_calls"] += len(completions)
+        stats["input_tokens"] += sum(c.input_tokens for c in completions)
+        stats["output_tokens"] += sum(c.output_tokens for c in completions)
+        stats["latency_total"] += latency
+    
+    def snapshot(self) -> Dict:
+        snapshot = {}
+        for mode, stats in self.modes.items():
+            turns = stats["turns"] or 1
+            snapshot[mode] = {
+                **stats,
+                "avg_latency": stats["latency_total"] / turns,
+                "avg_input_tokens": stats["input_tokens"] / turns,
+                "avg_output_tokens": stats["output_tokens"] / turns
+            }
+        return snapshot
+
+party_mode_stats = PartyModeStats()
+
+def _build_batch_instructions(ai_players: Dict[int, AIPlayer], characters: List[Character]) -> str:
+    sheets = "\n\n".join(
+        f"CHARACTER ID {char.id}:\n{ai_players[char.id].character_sheet()}" for char in characters
+    )
+    return f"{PLAYER_INSTRUCTIONS}\n\n{BATCH_INSTRUCTIONS}\n\n{sheets}"
+
+def _build_batch_prompt(characters: List[Character], dm_message: str, party_context: Optional[List[Dict]]) -> str:
+    context_text = format_party_context(party_context)
+    names = ", ".join(f"{char.name} (ID {char.id})" for char in characters)
+    return f"{context_text}DM: {dm_message}\n\nRespond as each of {names}:"
+
+async def get_batch_responses(ai_players: Dict[int, AIPlayer], characters: List[Character],
+                              dm_message: str, party_context: Optional[List[Dict]] = None,
+                              routing: Optional[Dict] = None) -> Tuple[Dict[int, str], Optional[Completion]]:
+    schema = {
+        "type": "object",
+        "properties": {str(char.id): {"type": "string"} for char in characters},
+        "required": [str(char.id) for char in characters],
+        "additionalProperties": False
+    }
+    
+    try:
+        completion = await model_router.complete(
+            "party_batch",
+            PRIORITY_INTERACTIVE,
+            routing,
+            instructions=_build_batch_instructions(ai_players, characters),
+            prompt=_build_batch_prompt(characters, dm_message, party_context),
+            temperature=0.8,
+            max_tokens=200 * len(characters),
+            schema=schema
+        )
+    except Exception:
+        return {}, None
+    
+    prompt_stats.record_completion(completion)
+    try:
+        payload = json.loads(completion.text)
+    except ValueError:
+        return {}, completion
+    if not isinstance(payload, dict):
+        return {}, completion
+    
+    # Anything missing or malformed is left out so the caller falls back to a per-character call
+    replies = {}
+    for char in characters:
+        reply = payload.get(str(char.id))
+        if isinstance(reply, str) and reply.strip():
+            replies[char.id] = reply.strip()
+    return replies, completion
@@ -0,0 +1,67 @@
+from collections import OrderedDict
+from typing import Dict, Optional
+import os
+import threading
+import time
+from app.ai_player import AIPlayer
+
+# Registry limits
+AI_PLAYER_REGISTRY_MAX_CAMPAIGNS = int(os.getenv("AI_PLAYER_REGISTRY_MAX_CAMPAIGNS", "100"))
+AI_PLAYER_REGISTRY_MAX_PLAYERS = int(os.getenv("AI_PLAYER_REGISTRY_MAX_PLAYERS", "600"))
+AI_PLAYER_REGISTRY_TTL = float(os.getenv("AI_PLAYER_REGISTRY_TTL", "1800"))
+
+class PlayerRegistry:
+    def __init__(self, max_campaigns: int = AI_PLAYER_REGISTRY_MAX_CAMPAIGNS,
+                 max_players: int = AI_PLAYER_REGISTRY_MAX_PLAYERS,
+                 ttl: float = AI_PLAYER_REGISTRY_TTL):
+        self.max_campaigns = max_campaigns
+        self.max_players = max_players
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, Dict[int, AIPlayer]]" = OrderedDict()
+        self._last_used: Dict[int, float] = {}
+        self._player_count = 0
+        self._lock = threading.Lock()
+    
+    def get(self, campaign_id: int) -> Optional[Dict[int, AIPlayer]]:
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            players = self._entries.get(campaign_id)
+            if players is not None:
+                self._entries.move_to_end(campaign_id)
+                self._last_used[campaign_id] = now
+            return players
+    
+    def put(self, campaign_id: int, players: Dict[int, AIPlayer]):
+        with self._lock:
+            self._remove(campaign_id)
+            self._entries[campaign_id] = players
+            self._last_used[campaign_id] = time.monotonic()
+            self._player_count += len(players)
+            while len(self._entries) > 1 and (
+                len(self._entries) > self.max_campaigns or self._player_count > self.max_players
+            ):
+                self._remove(next(iter(self._entries)))
+    
+    def evict(self, campaign_id: int):
+        with self._lock:
+            self._remove(campaign_id)
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"campaigns": len(self._entries), "players": self._player_count}
+    
+    def _expire(self, now: float):
+        while self._entries:
+            oldest = next(iter(self._entries))
+            if now - self._last_used[oldest] < self.ttl:
+                break
+            self._remove(oldest)
+    
+    def _remove(self, campaign_id: int):
+        players = self._entries.pop(campaign_id, None)
+        if players is not None:
+            self._player_count -= len(players)
+            del self._last_used[campaign_id]
+
+player_registry = PlayerRegistry()
@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import delete, or_, select
+from app.database import SessionLocal
+from app.llm import Completion
+from app.models import PrefetchResult
+import logging
+
+logger = logging.getLogger(__name__)
+
+class PrefetchStore:
+    # Finished prefetches (draft replies, combat actions) are written here so the request that
+    # needs one can use it whichever worker it lands on. In-flight prefetches still only exist in
+    # the worker that started them. Results are one-shot: take() deletes what it returns.
+    def __init__(self):
+        self.saved = 0
+        self.save_errors = 0
+    
+    def save(self, campaign_id: int, kind: str, key: str, character_id: int, text: str,
+             completion: Optional[Completion] = None, draft: str = "", ttl: Optional[float] = None):
+        db = SessionLocal()
+        try:
+            stale = [PrefetchResult.key != key]
+            if ttl is not None:
+                stale.append(PrefetchResult.created_at < datetime.utcnow() - timedelta(seconds=ttl))
+            # Anything prefetched against another state of the campaign can never be used again
+            db.execute(delete(PrefetchResult).where(
+                PrefetchResult.campaign_id == campaign_id, PrefetchResult.kind == kind, or_(*stale)
+            ))
+            db.add(PrefetchResult(
+                campaign_id=campaign_id,
+                kind=kind,
+                key=key,
+                character_id=character_id,
+                draft=draft,
+                text=text,
+                model=completion.model if completion else None,
+                input_tokens=completion.input_tokens if completion else 0,
+                output_tokens=completion.output_tokens if completion else 0
+            ))
+            db.commit()
+            self.saved += 1
+        except Exception:
+            # Sharing is best effort; the worker that made the prefetch can still use it
+            db.rollback()
+            self.save_errors += 1
+            logger.exception("Failed to share %s prefetch for campaign %s", kind, campaign_id)
+        finally:
+            db.close()
+    
+    def take(self, campaign_id: int, kind: str, key: str, character_id: Optional[int] = None,
+             ttl: Optional[float] = None) -> List[Dict]:
+        conditions = [PrefetchResult.campaign_id == campaign_id, PrefetchResult.kind == kind, PrefetchResult.key == key]
+        if character_id is not None:
+            conditions.append(PrefetchResult.character_id == character_id)
+        if ttl is not None:
+            conditions.append(PrefetchResult.created_at >= datetime.utcnow() - timedelta(seconds=ttl))
+        
+        db = SessionLocal()
+        try:
+            rows = db.execute(select(PrefetchResult).where(*conditions).order_by(PrefetchResult.id)).scalars().all()
+            if not rows:
+                return []
+            results = [
+                {
+                    "character_id": row.character_id,
+                    "draft": row.draft or "",
+                    "text": row.text,
+                    "completion": Completion(
+                        text=row.text,
+                        model=row.model or "",
+                        input_tokens=row.input_tokens or 0,
+                        output_tokens=row.output_tokens or 0
+                    ) if row.model else None
+                }
+                for row in rows
+            ]
+            # Only the worker whose delete removed the rows gets to use them
+            deleted = db.execute(delete(PrefetchResult).where(PrefetchResult.id.in_([row.id for row in rows])))
+            db.commit()
+            return results if deleted.rowcount == len(rows) else []
+        finally:
+            db.close()
+    
+    def discard(self, campaign_id: int, kind: str):
+        db = SessionLocal()
+        try:
+            db.execute(delete(PrefetchResult).where(
+                PrefetchResult.campaign_id == campaign_id, PrefetchResult.kind == kind
+            ))
+            db.commit()
+        finally:
+            db.close()
+    
+    def stats(self) -> Dict:
+        return {"saved": self.saved, "save_errors": self.save_errors}
+
+prefetch_store = PrefetchStore()
@@ -0,0 +1,65 @@
+from collections import Counter
+from typing import Dict, Optional
+import os
+import sys
+import threading
+
+# On-demand sampling profiler; off unless PROFILER_ENABLED is set since it exposes code structure
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+PROFILER_HZ = float(os.getenv("PROFILER_HZ", "100"))
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    # A background thread reads the stacks of the watched threads at a fixed rate and counts
+    # identical stacks. Output is in collapsed-stack format, which flamegraph.pl and speedscope
+    # read directly. Sampling costs the watched threads nothing beyond the GIL handoffs.
+    def __init__(self, hz: float = PROFILER_HZ):
+        self.interval = 1.0 / max(hz, 1.0)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+    
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+    
+    def start(self, thread_id: Optional[int] = None):
+        # thread_id limits sampling to one thread (e.g. the event loop); None samples them all
+        self.samples = Counter()
+        self.sample_count = 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(thread_id,), name="sampling-profiler", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    def _run(self, thread_id: Optional[int]):
+        own = threading.get_ident()
+        names: Dict[int, str] = {}
+        while not self._stop.wait(self.interval):
+            self.sample_count += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (thread_id is not None and ident != thread_id):
+                    continue
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+    
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+profiler = SamplingProfiler()
@@ -0,0 +1,199 @@
+from difflib import SequenceMatcher
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+from app.ai_player import AIPlayer
+from app.llm import Completion
+from app.llm_scheduler import PRIORITY_PREFETCH
+from app.prefetch_store import prefetch_store
+from app.tracing import background_task
+import asyncio
+import os
+import time
+
+# Speculative pre-generation configuration
+SPECULATION_MIN_CHARS = int(os.getenv("SPECULATION_MIN_CHARS", "20"))
+SPECULATION_SIMILARITY = float(os.getenv("SPECULATION_SIMILARITY", "0.9"))
+SPECULATION_TTL = float(os.getenv("SPECULATION_TTL", "120"))
+
+def normalize_draft(text: str) -> str:
+    return " ".join(text.lower().split())
+
+def similarity(a: str, b: str) -> float:
+    if a == b:
+        return 1.0
+    return SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+class Speculation:
+    def __init__(self, draft: str, fingerprint: str, tasks: Dict[int, asyncio.Task]):
+        self.draft = draft
+        self.fingerprint = fingerprint
+        self.tasks = tasks
+        self.started = time.monotonic()
+
+async def _generate(ai_player: AIPlayer, dm_message: str, party_context: Optional[List[Dict]],
+                    routing: Optional[Dict]) -> Tuple[str, Completion]:
+    completion = await ai_player.complete_response(dm_message, party_context, PRIORITY_PREFETCH, routing)
+    return completion.text, completion
+
+class Speculator:
+    # One in-flight guess per campaign at what the DM is about to send. A draft close to the running
+    # guess keeps it; anything else cancels it and starts over. The final message reuses the guess
+    # when it is close enough and the party state it was generated against hasn't changed.
+    # Finished replies also go to the prefetch store, for when the message lands on another worker.
+    def __init__(self, min_chars: int = SPECULATION_MIN_CHARS, threshold: float = SPECULATION_SIMILARITY,
+                 ttl: float = SPECULATION_TTL):
+        self.min_chars = min_chars
+        self.threshold = threshold
+        self.ttl = ttl
+        self._entries: Dict[int, Speculation] = {}
+        self.drafts = 0
+        self.started = 0
+        self.generations = 0
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.cancelled = 0
+        self.wasted = 0
+        self.wasted_tokens = 0
+        self.used_tokens = 0
+        self.seconds_ahead = 0.0
+    
+    def _expire(self, campaign_id: int):
+        entry = self._entries.get(campaign_id)
+        if entry is not None and time.monotonic() - entry.started > self.ttl:
+            self._discard(self._entries.pop(campaign_id))
+    
+    def _discard(self, entry: Speculation):
+        # Finished generations are spent tokens; unfinished ones are cancelled before they cost more
+        for task in entry.tasks.values():
+            self.wasted += 1
+            if not task.done():
+                task.cancel()
+                self.cancelled += 1
+            elif not task.cancelled() and task.exception() is None:
+                completion = task.result()[1]
+                if completion is not None:
+                    self.wasted_tokens += completion.input_tokens + completion.output_tokens
+    
+    def submit(self, campaign_id: int, draft: str, fingerprint: str,
+               ai_players: Dict[int, AIPlayer], party_context: Optional[List[Dict]] = None,
+               routing: Optional[Dict] = None) -> str:
+        self.drafts += 1
+        self._expire(campaign_id)
+        normalized = normalize_draft(draft)
+        if len(normalized) < self.min_chars:
+            return "too_short"
+        
+        current = self._entries.get(campaign_id)
+        if current is not None:
+            if current.fingerprint == fingerprint and similarity(current.draft, normalized) >= self.threshold:
+                return "running"
+            self._discard(self._entries.pop(campaign_id))
+        
+        tasks = {
+            character_id: background_task(
+                "speculation", _generate(ai_player, draft, party_context, routing),
+                campaign_id=campaign_id, character_id=character_id
+            )
+            for character_id, ai_player in ai_players.items()
+        }
+        for character_id, task in tasks.items():
+            task.add_done_callback(partial(self._share, campaign_id, character_id, fingerprint, normalized))
+        self._entries[campaign_id] = Speculation(normalized, fingerprint, tasks)
+        self.started += 1
+        self.generations += len(tasks)
+        return "started"
+    
+    def _share(self, campaign_id: int, character_id: int, fingerprint: str, draft: str, task: asyncio.Task):
+        if task.cancelled() or task.exception() is not None:
+            return
+        text, completion = task.result()
+        background_task(
+            "share_speculation",
+            asyncio.to_thread(
+                prefetch_store.save, campaign_id, "speculation", fingerprint, character_id, text, completion,
+                draft, self.ttl
+            ),
+            campaign_id=campaign_id, character_id=character_id
+        )
+    
+    def take(self, campaign_id: int, dm_message: str, fingerprint: str) -> Dict[int, asyncio.Task]:
+        self._expire(campaign_id)
+        entry = self._entries.pop(campaign_id, None)
+        if entry is None:
+            return {}
+        
+        if entry.fingerprint != fingerprint:
+            self.stale += 1
+            self._discard(entry)
+            return {}
+        score = similarity(entry.draft, normalize_draft(dm_message))
+        if score < self.threshold:
+            self.misses += 1
+            self._discard(entry)
+            return {}
+        
+        if score == 1.0:
+            self.exact_hits += 1
+        else:
+            self.near_hits += 1
+        self.seconds_ahead += time.monotonic() - entry.started
+        return entry.tasks
+    
+    def take_shared(self, campaign_id: int, dm_message: str,
+                    fingerprint: str) -> Dict[int, Tuple[str, Optional[Completion]]]:
+        # For when the drafts were answered by another worker; reads the database, so call it off the loop
+        drafts: Dict[str, Dict[int, Tuple[str, Optional[Completion]]]] = {}
+        for row in prefetch_store.take(campaign_id, "speculation", fingerprint, ttl=self.ttl):
+            drafts.setdefault(row["draft"], {})[row["character_id"]] = (row["text"], row["completion"])
+        if not drafts:
+            return {}
+        
+        score, draft = max((similarity(draft, normalize_draft(dm_message)), draft) for draft in drafts)
+        if score < self.threshold:
+            self.misses += 1
+            return {}
+        
+        if score == 1.0:
+            self.exact_hits += 1
+        else:
+            self.near_hits += 1
+        self.shared_hits += 1
+        return drafts[draft]
+    
+    def record_used(self, completion: Optional[Completion]):
+        if completion is not None:
+            self.used_tokens += completion.input_tokens + completion.output_tokens
+    
+    def cancel_campaign(self, campaign_id: int):
+        entry = self._entries.pop(campaign_id, None)
+        if entry is not None:
+            self._discard(entry)
+    
+    def stats(self) -> Dict:
+        resolved = self.exact_hits + self.near_hits + self.misses + self.stale
+        spent = self.used_tokens + self.wasted_tokens
+        hits = self.exact_hits + self.near_hits
+        return {
+            "drafts": self.drafts,
+            "started": self.started,
+            "generations": self.generations,
+            "in_flight": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": hits / resolved if resolved else 0.0,
+            "cancelled": self.cancelled,
+            "wasted_generations": self.wasted,
+            "waste_rate": self.wasted / self.generations if self.generations else 0.0,
+            "used_tokens": self.used_tokens,
+            "wasted_tokens": self.wasted_tokens,
+            "token_waste_rate": self.wasted_tokens / spent if spent else 0.0,
+            "avg_seconds_ahead": self.seconds_ahead / hits if hits else 0.0
+        }
+
+speculator = Speculator()
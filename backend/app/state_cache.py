@@ -0,0 +1,204 @@
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+from sqlalchemy import func, select, update
+from app.models import Campaign
+import logging
+import os
+import select as select_module
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Hot campaign state cache configuration
+STATE_CACHE_ENABLED = os.getenv("STATE_CACHE_ENABLED", "true").lower() == "true"
+STATE_CACHE_TTL = float(os.getenv("STATE_CACHE_TTL", "600"))
+STATE_CACHE_MAX_CAMPAIGNS = int(os.getenv("STATE_CACHE_MAX_CAMPAIGNS", "500"))
+STATE_CACHE_RECENT_MESSAGES = int(os.getenv("STATE_CACHE_RECENT_MESSAGES", "100"))
+STATE_NOTIFY_CHANNEL = "campaign_state"
+
+CAMPAIGN_FIELDS = ("id", "name", "description", "party_size", "created_at", "is_active", "settings", "state_version")
+CHARACTER_FIELDS = (
+    "id", "campaign_id", "name", "race", "char_class", "level", "strength", "dexterity", "constitution",
+    "intelligence", "wisdom", "charisma", "max_hp", "current_hp", "armor_class", "personality_traits",
+    "background", "inventory"
+)
+COMBAT_FIELDS = ("id", "campaign_id", "is_active", "current_turn", "round_number", "initiative_order", "enemies")
+SUMMARY_FIELDS = ("campaign_id", "content", "last_message_id")
+MESSAGE_FIELDS = ("id", "campaign_id", "character_id", "role", "content", "message_type")
+
+def _copy(row, fields) -> SimpleNamespace:
+    return SimpleNamespace(**{field: getattr(row, field) for field in fields})
+
+class CampaignState:
+    def __init__(self, campaign, characters, combat_state, summary, messages):
+        self.version = campaign.state_version or 0
+        self.campaign = _copy(campaign, CAMPAIGN_FIELDS)
+        self.characters = [_copy(char, CHARACTER_FIELDS) for char in characters]
+        self.combat_state = _copy(combat_state, COMBAT_FIELDS) if combat_state else None
+        self.summary = _copy(summary, SUMMARY_FIELDS) if summary else None
+        # Unsummarized messages, newest first
+        self.messages = [_copy(msg, MESSAGE_FIELDS) for msg in messages]
+        self.last_used = time.monotonic()
+
+class StateCache:
+    def __init__(self, ttl: float = STATE_CACHE_TTL, max_campaigns: int = STATE_CACHE_MAX_CAMPAIGNS):
+        self.ttl = ttl
+        self.max_campaigns = max_campaigns
+        self._entries: "OrderedDict[int, CampaignState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.listening = False
+        self._listener: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+    
+    def peek(self, campaign_id: int, version: Optional[int] = None) -> Optional[CampaignState]:
+        # Without a known-good version the entry is only trusted while NOTIFY invalidation is running
+        if not STATE_CACHE_ENABLED:
+            return None
+        with self._lock:
+            self._expire(time.monotonic())
+            entry = self._entries.get(campaign_id)
+            if entry is None or (version is None and not self.listening) or (version is not None and entry.version != version):
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry.last_used = time.monotonic()
+            self._entries.move_to_end(campaign_id)
+            return entry
+    
+    def put(self, campaign_id: int, entry: CampaignState):
+        if not STATE_CACHE_ENABLED:
+            return
+        with self._lock:
+            self._entries[campaign_id] = entry
+            self._entries.move_to_end(campaign_id)
+            while len(self._entries) > self.max_campaigns:
+                self._entries.popitem(last=False)
+    
+    def apply(self, campaign_id: int, version: int, campaign: Optional[Dict] = None,
+              characters: Optional[Dict[int, Dict]] = None, combat_state: Optional[Dict] = None,
+              messages: Optional[List[Dict]] = None):
+        with self._lock:
+            entry = self._entries.get(campaign_id)
+            if entry is None:
+                return
+            # Another writer got in between; reload instead of patching a stale copy
+            if entry.version != version - 1:
+                self._drop(campaign_id)
+                return
+            
+            entry.version = version
+            entry.campaign.state_version = version
+            for field, value in (campaign or {}).items():
+                setattr(entry.campaign, field, value)
+            for char in entry.characters:
+                for field, value in (characters or {}).get(char.id, {}).items():
+                    setattr(char, field, value)
+            if combat_state and entry.combat_state is not None:
+                for field, value in combat_state.items():
+                    setattr(entry.combat_state, field, value)
+            if messages:
+                entry.messages = [
+                    SimpleNamespace(**{field: row.get(field) for field in MESSAGE_FIELDS})
+                    for row in reversed(messages)
+                ] + entry.messages
+                del entry.messages[STATE_CACHE_RECENT_MESSAGES:]
+    
+    def invalidate(self, campaign_id: int, version: Optional[int] = None):
+        with self._lock:
+            entry = self._entries.get(campaign_id)
+            if entry is not None and (version is None or entry.version < version):
+                self._drop(campaign_id)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": STATE_CACHE_ENABLED,
+            "campaigns": len(self._entries),
+            "listening": self.listening,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations
+        }
+    
+    def start_listener(self, dsn: str):
+        if not STATE_CACHE_ENABLED or self._listener is not None:
+            return
+        self._stop.clear()
+        self._listener = threading.Thread(target=self._listen, args=(dsn,), name="state-cache-listener", daemon=True)
+        self._listener.start()
+    
+    def stop_listener(self):
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.join(timeout=5)
+            self._listener = None
+        self.listening = False
+    
+    def _listen(self, dsn: str):
+        import psycopg2
+        
+        while not self._stop.is_set():
+            try:
+                conn = psycopg2.connect(dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {STATE_NOTIFY_CHANNEL}")
+                # Anything cached before LISTEN may have missed a notification
+                self.clear()
+                self.listening = True
+                
+                while not self._stop.is_set():
+                    if select_module.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        campaign_id, version = (int(part) for part in notify.payload.split(":"))
+                        self.invalidate(campaign_id, version)
+                conn.close()
+            except Exception:
+                logger.exception("State cache listener lost its connection; retrying")
+                self.listening = False
+                self._stop.wait(5)
+        self.listening = False
+    
+    def _expire(self, now: float):
+        while self._entries:
+            oldest_id, oldest = next(iter(self._entries.items()))
+            if now - oldest.last_used < self.ttl:
+                break
+            self._entries.popitem(last=False)
+    
+    def _drop(self, campaign_id: int):
+        if self._entries.pop(campaign_id, None) is not None:
+            self.invalidations += 1
+
+def bump_version_statement(campaign_id: int):
+    return update(Campaign)\
+        .where(Campaign.id == campaign_id)\
+        .values(state_version=func.coalesce(Campaign.state_version, 0) + 1)\
+        .returning(Campaign.state_version)
+
+def notify_statement(dialect_name: str, campaign_id: int, version: int):
+    if dialect_name != "postgresql":
+        return None
+    return select(func.pg_notify(STATE_NOTIFY_CHANNEL, f"{campaign_id}:{version}"))
+
+def bump_version(db, campaign_id: int) -> int:
+    version = db.execute(bump_version_statement(campaign_id)).scalar_one()
+    notify = notify_statement(db.get_bind().dialect.name, campaign_id, version)
+    if notify is not None:
+        db.execute(notify)
+    return version
+
+state_cache = StateCache()
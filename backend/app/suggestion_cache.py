@@ -0,0 +1,100 @@
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set
+from app.tracing import background_task
+import asyncio
+import json
+import os
+import time
+
+# Suggestion cache configuration
+SUGGESTION_CACHE_TTL = float(os.getenv("SUGGESTION_CACHE_TTL", "600"))
+SUGGESTION_CACHE_MAX_KEYS = int(os.getenv("SUGGESTION_CACHE_MAX_KEYS", "256"))
+SUGGESTION_CACHE_ALTERNATIVES = int(os.getenv("SUGGESTION_CACHE_ALTERNATIVES", "3"))
+
+class SuggestionCache:
+    def __init__(self, ttl: float = SUGGESTION_CACHE_TTL, max_keys: int = SUGGESTION_CACHE_MAX_KEYS,
+                 alternatives: int = SUGGESTION_CACHE_ALTERNATIVES):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.alternatives = alternatives
+        self._entries: "OrderedDict[str, Deque[Any]]" = OrderedDict()
+        self._created: Dict[str, float] = {}
+        self._prefetching: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def key(kind: str, **inputs) -> str:
+        normalized = {
+            name: " ".join(str(value).lower().split()) if value is not None else ""
+            for name, value in inputs.items()
+        }
+        return json.dumps([kind, normalized], sort_keys=True)
+    
+    def get(self, key: str) -> Optional[Any]:
+        self._expire(key)
+        items = self._entries.get(key)
+        if not items:
+            self.misses += 1
+            return None
+        
+        # Rotate so repeated clicks cycle through the cached alternatives
+        self.hits += 1
+        self._entries.move_to_end(key)
+        item = items.popleft()
+        items.append(item)
+        return item
+    
+    def add(self, key: str, value: Any):
+        self._expire(key)
+        if key not in self._entries:
+            self._entries[key] = deque(maxlen=self.alternatives)
+            self._created[key] = time.monotonic()
+        self._entries[key].append(value)
+        self._entries.move_to_end(key)
+        
+        while len(self._entries) > self.max_keys:
+            oldest, _ = self._entries.popitem(last=False)
+            del self._created[oldest]
+    
+    def prefetch(self, key: str, generate: Callable[[], Awaitable[Any]]):
+        missing = self.alternatives - len(self._entries.get(key, ()))
+        if missing <= 0 or key in self._prefetching:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        
+        self._prefetching.add(key)
+        task = background_task("suggestion_prefetch", self._fill(key, generate, missing), alternatives=missing)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _fill(self, key: str, generate: Callable[[], Awaitable[Any]], missing: int):
+        try:
+            results = await asyncio.gather(*(generate() for _ in range(missing)), return_exceptions=True)
+            for result in results:
+                if not isinstance(result, Exception):
+                    self.add(key, result)
+        finally:
+            self._prefetching.discard(key)
+    
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "keys": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "prefetching": len(self._prefetching)
+        }
+    
+    def _expire(self, key: str):
+        created = self._created.get(key)
+        if created is not None and time.monotonic() - created >= self.ttl:
+            del self._entries[key]
+            del self._created[key]
+
+suggestion_cache = SuggestionCache()
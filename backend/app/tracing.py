@@ -0,0 +1,233 @@
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Any, Coroutine, Deque, Dict, Iterator, List, Optional
+from sqlalchemy import event
+from app.metrics import db_query_seconds, http_requests, span_seconds
+import asyncio
+import itertools
+import logging
+import os
+import random
+import time
+
+# Per-turn tracing configuration
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1"))
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+TRACE_SLOW_SECONDS = float(os.getenv("TRACE_SLOW_SECONDS", "0"))
+TRACE_MAX_SPANS = 500
+TRACE_STATEMENT_CHARS = 120
+
+# Tags a span takes from its parent unless given its own
+INHERITED_TAGS = ("campaign_id", "character_id")
+# Monitoring requests are timed but their traces are not kept
+UNTRACED_ROUTES = ("/metrics", "/stats/", "/debug/")
+
+logger = logging.getLogger(__name__)
+
+class Trace:
+    def __init__(self, trace_id: int, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans = 0
+
+class Span:
+    def __init__(self, name: str, trace: Trace, attributes: Dict, started: Optional[float] = None):
+        self.name = name
+        self.trace = trace
+        self.attributes = attributes
+        self.children: List["Span"] = []
+        self.started = started if started is not None else time.perf_counter()
+        self.wall_started = time.time() - (time.perf_counter() - self.started)
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+    
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+    
+    def add_child(self, child: "Span"):
+        if self.trace.sampled and self.trace.spans < TRACE_MAX_SPANS:
+            self.trace.spans += 1
+            self.children.append(child)
+    
+    def finish(self, duration: Optional[float] = None):
+        self.duration = duration if duration is not None else time.perf_counter() - self.started
+        span_seconds.observe(self.duration, span=self.name)
+    
+    def to_dict(self, origin: float) -> Dict:
+        return {
+            "name": self.name,
+            "offset_ms": round((self.started - origin) * 1000, 2),
+            "duration_ms": round(self.duration * 1000, 2) if self.duration is not None else None,
+            **({"error": self.error} if self.error else {}),
+            "attributes": self.attributes,
+            "children": [child.to_dict(origin) for child in self.children]
+        }
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def _tags(parent: Optional[Span], attributes: Dict) -> Dict:
+    if parent is not None:
+        for tag in INHERITED_TAGS:
+            if tag in parent.attributes:
+                attributes.setdefault(tag, parent.attributes[tag])
+    return attributes
+
+class Tracer:
+    # Keeps the most recent sampled traces in memory. A trace starts with the first span opened
+    # outside any other (normally the HTTP request) and is kept once that span finishes.
+    def __init__(self, sample_rate: float = TRACE_SAMPLE_RATE, buffer_size: int = TRACE_BUFFER_SIZE,
+                 slow_seconds: float = TRACE_SLOW_SECONDS):
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self._ids = itertools.count(1)
+        self._recent: Deque[Span] = deque(maxlen=buffer_size)
+        self.started = 0
+        self.kept = 0
+        self.slow = 0
+    
+    def new_trace(self) -> Trace:
+        self.started += 1
+        return Trace(next(self._ids), random.random() < self.sample_rate)
+    
+    def finish_trace(self, root: Span):
+        if not root.trace.sampled:
+            return
+        self.kept += 1
+        self._recent.append(root)
+        if self.slow_seconds and root.duration >= self.slow_seconds:
+            self.slow += 1
+            logger.warning("Slow trace %d: %s took %.3fs %s", root.trace.trace_id, root.name,
+                           root.duration, _summary(root))
+    
+    def traces(self, limit: int = 20, campaign_id: Optional[int] = None,
+               min_duration: float = 0.0) -> List[Dict]:
+        found = []
+        for root in reversed(self._recent):
+            if campaign_id is not None and root.attributes.get("campaign_id") != campaign_id:
+                continue
+            if root.duration < min_duration:
+                continue
+            found.append({
+                "trace_id": root.trace.trace_id,
+                "started_at": root.wall_started,
+                **root.to_dict(root.started)
+            })
+            if len(found) >= limit:
+                break
+        return found
+    
+    def stats(self) -> Dict:
+        return {
+            "sample_rate": self.sample_rate,
+            "started": self.started,
+            "kept": self.kept,
+            "buffered": len(self._recent),
+            "slow": self.slow
+        }
+
+tracer = Tracer()
+
+def _summary(root: Span) -> str:
+    # Time spent per stage name across the whole trace, largest first
+    totals: Dict[str, float] = {}
+    stack = list(root.children)
+    while stack:
+        current = stack.pop()
+        totals[current.name] = totals.get(current.name, 0.0) + (current.duration or 0.0)
+        stack.extend(current.children)
+    return ", ".join(f"{name}={seconds:.3f}s" for name, seconds in sorted(totals.items(), key=lambda item: -item[1]))
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    parent = _current.get()
+    current = Span(name, parent.trace if parent is not None else tracer.new_trace(), _tags(parent, attributes))
+    if parent is not None:
+        parent.add_child(current)
+    _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        # Restored explicitly rather than via a reset token, since async generators may finish in another context
+        _current.set(parent)
+        current.finish()
+        if parent is None:
+            tracer.finish_trace(current)
+
+def record_span(name: str, seconds: float, **attributes):
+    # For stages timed elsewhere (queue waits, database statements, streams): adds a finished
+    # span under the current one, or only feeds the histogram when nothing is being traced
+    parent = _current.get()
+    if parent is None:
+        span_seconds.observe(seconds, span=name)
+        return
+    child = Span(name, parent.trace, _tags(parent, attributes), time.perf_counter() - seconds)
+    child.finish(seconds)
+    parent.add_child(child)
+
+def background_task(name: str, coro: Coroutine[Any, Any, Any], **attributes) -> asyncio.Task:
+    # Work a request hands off (prefetches, drafts, summaries) outlives it, so it gets a trace of its own
+    async def run():
+        with span(name, **attributes):
+            return await coro
+    
+    context = copy_context()
+    context.run(_current.set, None)
+    task = asyncio.get_running_loop().create_task(run(), context=context)
+    # A task cancelled before it first runs never awaits coro; closing it keeps that quiet
+    task.add_done_callback(lambda _: coro.close())
+    return task
+
+def instrument_engine(engine):
+    # Times every statement; the span lands under whatever stage issued it
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+    
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info["query_started"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        db_query_seconds.observe(seconds, operation=operation)
+        record_span("db_query", seconds, operation=operation, statement=statement[:TRACE_STATEMENT_CHARS])
+    
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        if context.connection is not None and context.connection.info.get("query_started"):
+            context.connection.info["query_started"].pop()
+
+class TracingMiddleware:
+    # Plain ASGI rather than BaseHTTPMiddleware so streamed responses are timed to their last byte
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        status = 500
+        
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        with span(scope["method"]) as request_span:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                # The route template keeps label cardinality bounded; it is known only after routing
+                route = getattr(scope.get("route"), "path", "unmatched")
+                request_span.name = f"{scope['method']} {route}"
+                request_span.set(status=status)
+                campaign_id = scope.get("path_params", {}).get("campaign_id")
+                if campaign_id is not None and str(campaign_id).isdigit():
+                    request_span.set(campaign_id=int(campaign_id))
+                if route.startswith(UNTRACED_ROUTES):
+                    request_span.trace.sampled = False
+                http_requests.inc(method=scope["method"], route=route, status=str(status))
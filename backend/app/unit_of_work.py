@@ -0,0 +1,166 @@
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+from app.models import Character, CombatEvent, CombatState, Message
+from app.state_cache import bump_version_statement, notify_statement
+
+class TurnTransaction:
+    def __init__(self, db: Session):
+        self.db = db
+        self.messages: List[Dict] = []
+        self.character_updates: Dict[int, Dict] = {}
+        self.combat_updates: Dict[int, Dict] = {}
+        self.combat_events: List[Dict] = []
+        self.callbacks: List[Callable[[], None]] = []
+        self.character_campaigns: Dict[int, int] = {}
+        self.campaign_ids: Set[int] = set()
+        self.versions: Dict[int, int] = {}
+    
+    def add_message(self, campaign_id: int, role: str, content: str,
+                    character_id: Optional[int] = None, message_type: str = "narrative") -> Dict:
+        # The row's "id" is filled in by commit()
+        row = {
+            "campaign_id": campaign_id,
+            "character_id": character_id,
+            "role": role,
+            "content": content,
+            "message_type": message_type
+        }
+        self.messages.append(row)
+        self.campaign_ids.add(campaign_id)
+        return row
+    
+    def update_character(self, campaign_id: int, character_id: int, **fields):
+        self.character_updates.setdefault(character_id, {}).update(fields)
+        self.character_campaigns[character_id] = campaign_id
+        self.campaign_ids.add(campaign_id)
+    
+    def update_combat(self, campaign_id: int, **fields):
+        self.combat_updates.setdefault(campaign_id, {}).update(fields)
+        self.campaign_ids.add(campaign_id)
+    
+    def add_combat_event(self, campaign_id: int, round_number: int, turn: int, kind: str, delta: Dict):
+        self.combat_events.append({
+            "campaign_id": campaign_id,
+            "round_number": round_number,
+            "turn": turn,
+            "kind": kind,
+            "delta": delta
+        })
+        self.campaign_ids.add(campaign_id)
+    
+    def take_messages(self) -> List[Dict]:
+        messages, self.messages = self.messages, []
+        if not self.character_updates and not self.combat_updates and not self.combat_events:
+            self.campaign_ids = set()
+        return messages
+    
+    def pending_changes(self) -> Dict[int, Dict]:
+        # Message rows are shared, not copied, so they carry their IDs once committed
+        changes = {
+            campaign_id: {"messages": [], "characters": {}, "combat_state": None}
+            for campaign_id in self.campaign_ids
+        }
+        for row in self.messages:
+            changes[row["campaign_id"]]["messages"].append(row)
+        for character_id, fields in self.character_updates.items():
+            changes[self.character_campaigns[character_id]]["characters"][character_id] = dict(fields)
+        for campaign_id, fields in self.combat_updates.items():
+            changes[campaign_id]["combat_state"] = dict(fields)
+        return changes
+    
+    def after_commit(self, callback: Callable[[], None]):
+        self.callbacks.append(callback)
+    
+    def commit(self):
+        try:
+            dialect_name = self.db.get_bind().dialect.name
+            for kind, key, statement, params in self._statements():
+                result = self.db.execute(statement, params) if params is not None else self.db.execute(statement)
+                if kind == "messages":
+                    self._assign_ids(result.scalars().all())
+                elif kind == "version":
+                    self.versions[key] = result.scalar_one()
+                    notify = notify_statement(dialect_name, key, self.versions[key])
+                    if notify is not None:
+                        self.db.execute(notify)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        finally:
+            callbacks = self._reset()
+        
+        for callback in callbacks:
+            callback()
+    
+    async def commit_async(self, session):
+        try:
+            dialect_name = session.bind.dialect.name
+            for kind, key, statement, params in self._statements():
+                result = await session.execute(statement, params) if params is not None else await session.execute(statement)
+                if kind == "messages":
+                    self._assign_ids(result.scalars().all())
+                elif kind == "version":
+                    self.versions[key] = result.scalar_one()
+                    notify = notify_statement(dialect_name, key, self.versions[key])
+                    if notify is not None:
+                        await session.execute(notify)
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            callbacks = self._reset()
+        
+        for callback in callbacks:
+            callback()
+    
+    def _statements(self) -> Iterator[Tuple]:
+        if self.messages:
+            yield (
+                "messages",
+                None,
+                insert(Message).returning(Message.id, sort_by_parameter_order=True),
+                [{key: value for key, value in row.items() if key != "id"} for row in self.messages]
+            )
+        
+        if self.character_updates:
+            yield (
+                "characters",
+                None,
+                update(Character),
+                [{"id": character_id, **fields} for character_id, fields in self.character_updates.items()]
+            )
+        
+        for campaign_id, fields in self.combat_updates.items():
+            yield "combat", campaign_id, update(CombatState).where(CombatState.campaign_id == campaign_id).values(**fields), None
+        
+        if self.combat_events:
+            yield "combat_events", None, insert(CombatEvent), self.combat_events
+        
+        # Every campaign touched by this turn moves to a new state version
+        for campaign_id in sorted(self.campaign_ids):
+            yield "version", campaign_id, bump_version_statement(campaign_id), None
+    
+    def _assign_ids(self, message_ids: List[int]):
+        for row, message_id in zip(self.messages, message_ids):
+            row["id"] = message_id
+    
+    def _reset(self) -> List[Callable[[], None]]:
+        callbacks = self.callbacks
+        self.messages = []
+        self.character_updates = {}
+        self.character_campaigns = {}
+        self.combat_updates = {}
+        self.combat_events = []
+        self.callbacks = []
+        self.campaign_ids = set()
+        return callbacks
+    
+    def __enter__(self) -> "TurnTransaction":
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
@@ -0,0 +1,277 @@
+from typing import Awaitable, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+# Load test for the full campaign flow against the fake LLM backend. Run from backend/:
+#   python -m bench.load_test --campaigns 20 --turns 5 --save-baseline
+#   python -m bench.load_test --campaigns 20 --turns 5 --baseline bench/baseline.json
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+REQUEST_TIMEOUT = 300.0
+# Latency changes smaller than this are noise whatever the relative change, as is the tail of a small sample
+REGRESSION_FLOOR_MS = 10.0
+REGRESSION_P95_MIN_SAMPLES = 100
+
+DM_LINES = (
+    "You push open the tavern door and the room falls silent.",
+    "A hooded figure at the bar slides a sealed letter toward you.",
+    "The road north is washed out; a ferryman offers passage for a price.",
+    "Goblin tracks lead off the path and into the pines.",
+    "The mayor begs you to find her missing son before nightfall.",
+    "A rumble shakes the cavern and dust rains from the ceiling."
+)
+DICE_EXPRESSIONS = ("1d20+3", "2d6+2", "4d6kh3", "1d8+1d6")
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Drive the API with simulated campaigns and report latency")
+    parser.add_argument("--campaigns", type=int, default=10, help="Campaigns played concurrently")
+    parser.add_argument("--turns", type=int, default=5, help="DM turns per campaign")
+    parser.add_argument("--party-size", type=int, default=4)
+    parser.add_argument("--party-mode", choices=("individual", "batch"), default="individual")
+    parser.add_argument("--stream-every", type=int, default=0,
+                        help="Every Nth turn goes through dm-input/stream (0: never)")
+    parser.add_argument("--no-combat", action="store_true", help="Skip the combat round after the turns")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Fake LLM seconds per call")
+    parser.add_argument("--llm-jitter", type=float, default=0.2, help="Random spread of the fake latency")
+    parser.add_argument("--llm-output-tokens", type=int, default=60, help="Tokens per fake reply")
+    parser.add_argument("--database-url", help="Database to run against (default: a fresh SQLite file)")
+    parser.add_argument("--url", help="Base URL of a running server (e.g. http://localhost:8000/api) "
+                                      "instead of the in-process app; its LLM backend is left as configured")
+    parser.add_argument("--output", help="Write the full results as JSON")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, help="Save the results as a baseline")
+    parser.add_argument("--baseline", help="Compare against a saved baseline and exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed relative slowdown against the baseline (default: 0.25)")
+    return parser.parse_args(argv)
+
+def configure_environment(args: argparse.Namespace):
+    # Must run before the app is imported, since its modules read configuration at import time
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["FAKE_LLM_LATENCY"] = str(args.llm_latency)
+    os.environ["FAKE_LLM_JITTER"] = str(args.llm_jitter)
+    os.environ["FAKE_LLM_OUTPUT_TOKENS"] = str(args.llm_output_tokens)
+    # Provider rate limits would measure the token buckets, not the app; set them explicitly to include them
+    os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "0")
+    os.environ.setdefault("LLM_TOKENS_PER_MINUTE", "0")
+    os.environ["DATABASE_URL"] = args.database_url or \
+        f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='dungeon-bench-'), 'bench.sqlite')}"
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)] if ordered else 0.0
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.error_samples: List[str] = []
+    
+    async def call(self, operation: str, request: Awaitable):
+        started = time.perf_counter()
+        try:
+            response = await request
+        except Exception as e:
+            self._error(operation, f"{operation}: {type(e).__name__}: {e}")
+            return None
+        self.latencies.setdefault(operation, []).append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self._error(operation, f"{operation}: HTTP {response.status_code} {response.text[:200]}")
+            return None
+        return response
+    
+    def _error(self, operation: str, detail: str):
+        self.errors[operation] = self.errors.get(operation, 0) + 1
+        if len(self.error_samples) < 10:
+            self.error_samples.append(detail)
+    
+    def summary(self, elapsed: float) -> Dict:
+        operations = {}
+        for operation in sorted(set(self.latencies) | set(self.errors)):
+            latencies = self.latencies.get(operation, [])
+            operations[operation] = {
+                "count": len(latencies),
+                "errors": self.errors.get(operation, 0),
+                "per_second": round(len(latencies) / elapsed, 2),
+                "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+                "p50_ms": round(_percentile(latencies, 0.5) * 1000, 2),
+                "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+                "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+                "max_ms": round(max(latencies, default=0.0) * 1000, 2)
+            }
+        requests = sum(len(latencies) for latencies in self.latencies.values())
+        turns = len(self.latencies.get("dm_input", [])) + len(self.latencies.get("dm_input_stream", []))
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "requests": requests,
+            "errors": sum(self.errors.values()),
+            "requests_per_second": round(requests / elapsed, 2),
+            "turns_per_second": round(turns / elapsed, 2),
+            "operations": operations
+        }
+
+class _Failed:
+    def __init__(self, text: str):
+        self.status_code = 409
+        self.text = text
+
+async def _stream_turn(client, campaign_id: int, message: str):
+    # Timed until the last event; the in-process transport buffers the body, so time to first token
+    # is only meaningful with --url
+    async with client.stream("POST", f"/campaigns/{campaign_id}/dm-input/stream", json={"message": message}) as response:
+        async for line in response.aiter_lines():
+            if line.startswith("data: ") and json.loads(line[6:]).get("type") == "error":
+                return _Failed(line[6:])
+    return response
+
+async def play_campaign(client, index: int, args: argparse.Namespace, recorder: Recorder):
+    response = await recorder.call("create_campaign", client.post("/campaigns", json={
+        "name": f"Bench campaign {index}",
+        "description": "Load test",
+        "party_size": args.party_size,
+        "dice_seed": index
+    }))
+    if response is None:
+        return
+    campaign_id = response.json()["id"]
+    if args.party_mode != "individual":
+        await client.patch(f"/campaigns/{campaign_id}/settings", json={"party_mode": args.party_mode})
+    
+    last_id = 0
+    for turn in range(args.turns):
+        message = f"{DM_LINES[(index + turn) % len(DM_LINES)]} (turn {turn + 1})"
+        if args.stream_every and (turn + 1) % args.stream_every == 0:
+            await recorder.call("dm_input_stream", _stream_turn(client, campaign_id, message))
+        else:
+            await recorder.call("dm_input", client.post(f"/campaigns/{campaign_id}/dm-input", json={"message": message}))
+        await recorder.call("roll_dice", client.post(
+            f"/campaigns/{campaign_id}/roll-dice",
+            json={"expression": DICE_EXPRESSIONS[turn % len(DICE_EXPRESSIONS)]}
+        ))
+        response = await recorder.call("fetch_messages", client.get(
+            f"/campaigns/{campaign_id}/messages", params={"since_id": last_id, "limit": 100}
+        ))
+        if response is not None and response.json():
+            last_id = max(message["id"] for message in response.json() if message.get("id") is not None)
+    
+    if not args.no_combat:
+        if await recorder.call("combat_start", client.post(f"/campaigns/{campaign_id}/combat/start")) is not None:
+            await recorder.call("combat_auto_run", client.post(f"/campaigns/{campaign_id}/combat/auto-run"))
+            await recorder.call("combat_end", client.post(f"/campaigns/{campaign_id}/combat/end"))
+    await recorder.call("fetch_history", client.get(f"/campaigns/{campaign_id}/messages", params={"limit": 50}))
+
+async def run_scenario(client, args: argparse.Namespace) -> Dict:
+    recorder = Recorder()
+    started = time.perf_counter()
+    await asyncio.gather(*(play_campaign(client, index, args, recorder) for index in range(args.campaigns)))
+    results = recorder.summary(time.perf_counter() - started)
+    results["error_samples"] = recorder.error_samples
+    
+    server = {}
+    for name in ("llm-scheduler", "model-routing", "db-pool", "state-cache", "party-modes"):
+        response = await client.get(f"/stats/{name}")
+        if response.status_code == 200:
+            server[name] = response.json()
+    results["server"] = server
+    return results
+
+async def run(args: argparse.Namespace) -> Dict:
+    import httpx
+    
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=REQUEST_TIMEOUT) as client:
+            return await run_scenario(client, args)
+    
+    from app.main import app
+    async with app.router.lifespan_context(app):
+        # Server errors come back as 500s, as they would from a real server
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=REQUEST_TIMEOUT) as client:
+            return await run_scenario(client, args)
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    regressions = []
+    for operation, current in results["operations"].items():
+        previous = baseline["operations"].get(operation)
+        if not previous or not previous["count"]:
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            if key == "p95_ms" and min(current["count"], previous["count"]) < REGRESSION_P95_MIN_SAMPLES:
+                continue
+            limit = max(previous[key] * (1 + tolerance), previous[key] + REGRESSION_FLOOR_MS)
+            if current[key] > limit:
+                regressions.append(f"{operation} {key}: {previous[key]:.1f} -> {current[key]:.1f}")
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{operation} errors: {previous['errors']} -> {current['errors']}")
+    if results["requests_per_second"] < baseline["requests_per_second"] * (1 - tolerance):
+        regressions.append(
+            f"requests_per_second: {baseline['requests_per_second']:.1f} -> {results['requests_per_second']:.1f}"
+        )
+    return regressions
+
+def print_report(results: Dict):
+    print(f"{'operation':<18}{'count':>7}{'errors':>8}{'per s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for operation, stats in results["operations"].items():
+        print(
+            f"{operation:<18}{stats['count']:>7}{stats['errors']:>8}{stats['per_second']:>9.1f}"
+            f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['max_ms']:>10.1f}"
+        )
+    print(
+        f"\n{results['requests']} requests in {results['elapsed_seconds']:.1f}s: "
+        f"{results['requests_per_second']:.1f} requests/s, {results['turns_per_second']:.2f} DM turns/s, "
+        f"{results['errors']} errors"
+    )
+    for sample in results["error_samples"]:
+        print(f"  {sample}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    if not args.url:
+        configure_environment(args)
+    
+    results = asyncio.run(run(args))
+    results["config"] = {
+        "campaigns": args.campaigns,
+        "turns": args.turns,
+        "party_size": args.party_size,
+        "party_mode": args.party_mode,
+        "stream_every": args.stream_every,
+        "combat": not args.no_combat,
+        "llm_latency": args.llm_latency,
+        "llm_jitter": args.llm_jitter,
+        "llm_output_tokens": args.llm_output_tokens,
+        "database": "server" if args.url else os.environ["DATABASE_URL"].split(":", 1)[0],
+        "python": platform.python_version(),
+        "machine": platform.node()
+    }
+    print_report(results)
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({key: value for key, value in results.items() if key != "server"}, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("config", {}) != results["config"]:
+            print("\nWarning: the baseline was recorded with a different configuration or machine")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressions beyond {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+import os
+import pytest
+import tempfile
+
+# The app reads its configuration at import time, so tests point it at a throwaway SQLite
+# database and the fake LLM before any app module is imported
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.sqlite')}"
+os.environ["LLM_BACKEND"] = "fake"
+os.environ["FAKE_LLM_LATENCY"] = "0"
+os.environ["FAKE_LLM_JITTER"] = "0"
+os.environ["LLM_REQUESTS_PER_MINUTE"] = "0"
+os.environ["LLM_TOKENS_PER_MINUTE"] = "0"
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+@pytest.fixture(scope="module")
+def client():
+    from fastapi.testclient import TestClient
+    from app.main import app
+    
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture
+def campaign(client):
+    response = client.post("/campaigns", json={"name": "Test", "description": "Tests", "party_size": 2})
+    assert response.status_code == 200
+    return response.json()["id"]
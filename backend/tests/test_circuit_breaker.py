@@ -0,0 +1,116 @@
+import asyncio
+import pytest
+from app import llm, llm_resilience
+from app.llm import Completion, LLMBackend, LLMError
+from app.llm_resilience import CircuitBreaker, CircuitOpen, ResilientLLM
+from app.llm_scheduler import PRIORITY_INTERACTIVE
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def monotonic(self) -> float:
+        return self.now
+    
+    def perf_counter(self) -> float:
+        return self.now
+
+class FlakyBackend(LLMBackend):
+    name = "flaky"
+    
+    def __init__(self):
+        self.failing = True
+        self.calls = 0
+    
+    async def complete(self, model, instructions, prompt, temperature=0.8, max_tokens=200, schema=None):
+        self.calls += 1
+        if self.failing:
+            raise LLMError("backend down")
+        return Completion(text="ok", model=model)
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(llm_resilience, "time", fake)
+    return fake
+
+@pytest.fixture
+def flaky(monkeypatch):
+    previous = llm._backend
+    backend = FlakyBackend()
+    llm.set_backend(backend)
+    monkeypatch.setattr(ResilientLLM, "_backoff", lambda self, attempt: 0)
+    yield backend
+    llm.set_backend(previous)
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(threshold=3, cooldown=30)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == "closed"
+    
+    breaker.record_success()
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.snapshot() == {"state": "open", "consecutive_failures": 3, "opens": 1, "rejected": 1}
+
+def test_half_open_lets_one_trial_through(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=30)
+    breaker.record_failure()
+    clock.now += 29
+    assert not breaker.allow()
+    
+    clock.now += 1
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+def test_failed_trial_reopens_for_a_full_cooldown(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.opens == 2
+    clock.now += 29
+    assert breaker.state == "open"
+
+def test_abandoned_trial_frees_the_slot(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_abandoned()
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+def test_resilient_calls_trip_and_recover(clock, flaky):
+    resilient = ResilientLLM()
+    
+    async def call():
+        return await resilient.complete(PRIORITY_INTERACTIVE, "model", "", "hello")
+    
+    # Threshold 5 with 2 retries: the first call fails 3 times, the second trips the breaker
+    with pytest.raises(LLMError):
+        asyncio.run(call())
+    with pytest.raises(CircuitOpen):
+        asyncio.run(call())
+    assert flaky.calls == 5
+    
+    # While open, calls fail fast without reaching the backend
+    with pytest.raises(CircuitOpen):
+        asyncio.run(call())
+    assert flaky.calls == 5
+    
+    clock.now += llm_resilience.LLM_BREAKER_COOLDOWN
+    flaky.failing = False
+    assert asyncio.run(call()).text == "ok"
+    assert resilient.stats()["breakers"]["flaky"]["state"] == "closed"
+    assert resilient.retries == 4
@@ -0,0 +1,53 @@
+import pytest
+from app import combat_sim
+from app.combat_sim import (
+    COMBAT_SIM_MAX_ATTACKS, COMBAT_SIM_MAX_COMBATANTS, COMBAT_SIM_MAX_DAMAGE_DICE, COMBAT_SIM_MAX_DAMAGE_SIDES,
+    Combatant, default_party, simulate, validate_combatant
+)
+from app.database import SessionLocal
+from app.dice import campaign_rng
+from app.game_engine import GameEngine
+
+def goblin(**fields) -> Combatant:
+    return Combatant(**{"name": "Goblin", "max_hp": 7, "armor_class": 15, "attack_bonus": 4, "damage": "1d6+2", **fields})
+
+@pytest.mark.parametrize("fields", [
+    {"count": COMBAT_SIM_MAX_COMBATANTS + 1},
+    {"attacks": COMBAT_SIM_MAX_ATTACKS + 1},
+    {"damage": f"{COMBAT_SIM_MAX_DAMAGE_DICE + 1}d6"},
+    {"damage": f"1d{COMBAT_SIM_MAX_DAMAGE_SIDES + 1}"},
+    {"count": 0},
+])
+def test_oversized_combatants_are_rejected(fields):
+    with pytest.raises(ValueError):
+        validate_combatant(goblin(**fields))
+
+def test_combatant_limit_is_checked_before_expanding(monkeypatch):
+    monkeypatch.setattr(combat_sim, "_expand", lambda combatants: pytest.fail("expanded an oversized fight"))
+    with pytest.raises(ValueError):
+        simulate(default_party(1, 2), [goblin(count=10 ** 9)])
+
+def test_simulation_is_reproducible_and_sane():
+    party = default_party(3, 4)
+    enemies = [goblin(count=3), goblin(name="Boss", max_hp=40, attacks=3, damage="2d6+3")]
+    first = simulate(party, enemies, trials=500, rng=campaign_rng(11))
+    assert simulate(party, enemies, trials=500, rng=campaign_rng(11)) == first
+    assert first.win_rate + first.loss_rate + first.stalemate_rate == pytest.approx(1.0)
+    assert 0 < first.avg_hp_lost_fraction <= 1
+    assert simulate(party, [goblin(max_hp=1, armor_class=1)], trials=500, rng=campaign_rng(11)).win_rate > 0.95
+
+def test_start_combat_rejects_oversized_encounters(client, campaign):
+    block = {"name": "Goblin", "hit_points": 7, "armor_class": 15, "attack_bonus": 4, "damage": "1d6+2"}
+    too_many = client.post(f"/campaigns/{campaign}/combat/start", json={"enemies": [
+        {**block, "count": COMBAT_SIM_MAX_COMBATANTS},
+    ]})
+    assert too_many.status_code == 400
+    
+    db = SessionLocal()
+    try:
+        assert "error" in GameEngine(db).start_combat(campaign, [goblin(count=COMBAT_SIM_MAX_COMBATANTS)])
+    finally:
+        db.close()
+    
+    started = client.post(f"/campaigns/{campaign}/combat/start", json={"enemies": [{**block, "count": 3}]})
+    assert started.status_code == 200
@@ -0,0 +1,53 @@
+import pytest
+from app.dice import (
+    DICE_MAX_COUNT, DICE_MAX_MODIFIER, DICE_MAX_SIDES, DICE_MAX_TERMS, DiceExpressionError, DiceRoller,
+    campaign_rng, parse_expression, sample_expression
+)
+
+def test_parse_terms_and_modifier():
+    expression = parse_expression(" 2d6 + 1d4 - 3 ")
+    assert expression.text == "2d6+1d4-3"
+    assert [(term.count, term.sides, term.sign) for term in expression.terms] == [(2, 6, 1), (1, 4, 1)]
+    assert expression.modifier == -3
+    assert parse_expression("d%").terms[0].sides == 100
+
+def test_drop_is_rewritten_as_keep():
+    assert parse_expression("4d6dl1").terms[0].keep == "kh"
+    assert parse_expression("4d6dl1").terms[0].keep_count == 3
+    assert parse_expression("2d20dh1").terms[0].keep == "kl"
+    assert parse_expression("2d20k1").terms[0].keep == "kh"
+
+@pytest.mark.parametrize("text", [
+    "",
+    "2d",
+    "d20+",
+    "1d20 5",
+    "0d6",
+    "1d0",
+    "4d6kh5",
+    f"1d{DICE_MAX_SIDES + 1}",
+    f"{DICE_MAX_COUNT + 1}d6",
+    "+".join(["1d6"] * (DICE_MAX_TERMS + 1)),
+    f"1d20+{DICE_MAX_MODIFIER + 1}",
+    "1d20-99999999999999999999999",
+])
+def test_invalid_expressions_are_rejected(text):
+    with pytest.raises(DiceExpressionError):
+        parse_expression(text)
+
+def test_modifier_limit_applies_to_the_total():
+    assert parse_expression(f"1d20+{DICE_MAX_MODIFIER}").modifier == DICE_MAX_MODIFIER
+    with pytest.raises(DiceExpressionError):
+        parse_expression(f"1d20+{DICE_MAX_MODIFIER}+1")
+
+def test_rolls_stay_in_range():
+    totals = sample_expression(parse_expression("3d6+2"), 10000, campaign_rng(7))
+    assert totals.min() >= 5 and totals.max() <= 20
+    result = DiceRoller.evaluate("4d6kh3")
+    assert len(result.rolls[0]) == 4 and len(result.kept[0]) == 3
+    assert result.total == sum(result.kept[0])
+
+def test_seeded_campaigns_reproduce_each_roll():
+    first = DiceRoller.evaluate("10d20", campaign_rng(42, 3)).rolls
+    assert DiceRoller.evaluate("10d20", campaign_rng(42, 3)).rolls == first
+    assert DiceRoller.evaluate("10d20", campaign_rng(42, 4)).rolls != first
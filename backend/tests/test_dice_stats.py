@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from app import dice_stats
+from app.dice import parse_expression
+from app.dice_stats import DistributionTooLarge
+
+def test_exact_distribution_matches_known_odds():
+    dist = dice_stats.exact_distribution("2d6")
+    assert dist.exact
+    assert dist.minimum == 2 and dist.maximum == 12
+    assert dist.outcomes()[7] == pytest.approx(6 / 36)
+    assert dice_stats.analyze("4d6kh3", include_outcomes=False)["mean"] == pytest.approx(12.2446, abs=1e-4)
+
+def test_outcome_limit_falls_back_to_monte_carlo():
+    with pytest.raises(DistributionTooLarge):
+        dice_stats.exact_distribution("1000d1000")
+    result = dice_stats.analyze("1000d1000", include_outcomes=False)
+    assert not result["exact"]
+    assert result["mean"] == pytest.approx(500500, rel=0.01)
+
+def test_keep_work_limit_falls_back_to_monte_carlo():
+    # Under the outcome limit, but the keep/drop dynamic program would take seconds
+    with pytest.raises(DistributionTooLarge):
+        dice_stats.exact_distribution("20d1000kh19")
+    with pytest.raises(DistributionTooLarge):
+        dice_stats.analyze("20d1000kh19", method="exact")
+    assert not dice_stats.analyze("20d1000kh19", include_outcomes=False)["exact"]
+    assert dice_stats.exact_distribution("20d20kh19").exact
+
+def test_attack_odds_bonus_dice_respect_outcome_limit():
+    result = dice_stats.attack_odds("1d20+9999d1000", "1d8+3", 15)
+    assert not result["exact"]
+    # The bonus always beats AC 15, so only a natural 1 misses
+    assert result["p_miss"] == pytest.approx(0.05)
+    assert result["p_crit"] == pytest.approx(0.05)
+
+def test_attack_odds_exact():
+    result = dice_stats.attack_odds("1d20+5", "1d8+3", 15)
+    assert result["exact"]
+    # 10-19 hit, 20 crits, 1-9 miss
+    assert result["p_hit"] == pytest.approx(0.55)
+    assert result["p_miss"] == pytest.approx(0.45)
+    assert result["expected_damage"] == pytest.approx(0.5 * 7.5 + 0.05 * 12.0)
+
+def test_monte_carlo_trials_are_bounded_by_dice_rolled():
+    expression = parse_expression("10000d6")
+    dist = dice_stats.monte_carlo_distribution(expression, trials=1000000, rng=np.random.default_rng(1))
+    trials = dice_stats.DICE_MONTE_CARLO_MAX_ROLLS // expression.dice_count
+    counts = dist.probs * trials
+    assert np.allclose(counts, np.round(counts))
+    assert dist.probs.sum() == pytest.approx(1.0)
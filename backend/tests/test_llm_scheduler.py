@@ -0,0 +1,140 @@
+import asyncio
+import time
+import pytest
+from app import llm
+from app.llm import Completion, LLMBackend, RateLimited
+from app.llm_scheduler import (
+    PRIORITY_INTERACTIVE, PRIORITY_PREFETCH, PRIORITY_SUMMARY, LLMScheduler, TokenBucket, estimate_tokens
+)
+
+class ScriptedBackend(LLMBackend):
+    # Calls block until released; each prompt is recorded in dispatch order
+    name = "scripted"
+    
+    def __init__(self, usage: int = 10, rate_limits: int = 0):
+        self.started = []
+        self.release = asyncio.Event()
+        self.usage = usage
+        self.rate_limits = rate_limits
+    
+    async def complete(self, model, instructions, prompt, temperature=0.8, max_tokens=200, schema=None):
+        self.started.append(prompt)
+        if self.rate_limits:
+            self.rate_limits -= 1
+            raise RateLimited("slow down", retry_after=0.05)
+        await self.release.wait()
+        return Completion(text=prompt, model=model, input_tokens=self.usage, output_tokens=0)
+
+@pytest.fixture
+def restore_backend():
+    previous = llm._backend
+    yield
+    llm.set_backend(previous)
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(60)
+    bucket.take(60)
+    assert bucket.delay(1) == pytest.approx(1.0, abs=0.01)
+    bucket.refund(30)
+    assert bucket.delay(1) == 0.0
+    # Larger than the whole bucket: waits for a full bucket instead of forever
+    assert bucket.delay(1000) == pytest.approx(30.0, abs=0.01)
+
+def test_zero_rate_means_unlimited():
+    bucket = TokenBucket(0)
+    bucket.take(10 ** 9)
+    assert bucket.delay(10 ** 9) == 0.0
+
+def test_waiting_calls_dispatch_by_priority(restore_backend):
+    async def scenario():
+        scripted = ScriptedBackend()
+        llm.set_backend(scripted)
+        scheduler = LLMScheduler(requests_per_minute=0, tokens_per_minute=0, max_in_flight=1)
+        
+        async def call(priority, prompt):
+            return await scheduler.complete(priority, "model", "", prompt)
+        
+        first = asyncio.create_task(call(PRIORITY_PREFETCH, "first"))
+        await asyncio.sleep(0)
+        waiting = [
+            asyncio.create_task(call(PRIORITY_SUMMARY, "summary")),
+            asyncio.create_task(call(PRIORITY_PREFETCH, "prefetch")),
+            asyncio.create_task(call(PRIORITY_INTERACTIVE, "interactive")),
+        ]
+        await asyncio.sleep(0.01)
+        assert scripted.started == ["first"]
+        assert scheduler.stats()["queued"] == 3
+        
+        scripted.release.set()
+        await asyncio.gather(first, *waiting)
+        return scripted.started, scheduler
+    
+    started, scheduler = run(scenario())
+    assert started == ["first", "interactive", "prefetch", "summary"]
+    assert scheduler.in_flight == 0
+    assert scheduler.stats()["priorities"]["interactive"]["completed"] == 1
+
+def test_request_budget_delays_dispatch(restore_backend):
+    async def scenario():
+        scripted = ScriptedBackend()
+        scripted.release.set()
+        llm.set_backend(scripted)
+        # 600 requests a minute refills one request every 0.1 s
+        scheduler = LLMScheduler(requests_per_minute=600, tokens_per_minute=0, max_in_flight=10)
+        scheduler.requests.tokens = 0
+        started = time.monotonic()
+        await scheduler.complete(PRIORITY_INTERACTIVE, "model", "", "hello")
+        return time.monotonic() - started
+    
+    assert run(scenario()) >= 0.09
+
+def test_token_budget_is_settled_with_actual_usage(restore_backend):
+    async def scenario():
+        scripted = ScriptedBackend(usage=10)
+        scripted.release.set()
+        llm.set_backend(scripted)
+        scheduler = LLMScheduler(requests_per_minute=0, tokens_per_minute=6000, max_in_flight=10)
+        await scheduler.complete(PRIORITY_INTERACTIVE, "model", "x" * 400, "y" * 400, max_tokens=200)
+        return scheduler.tokens.tokens
+    
+    # The estimate (400 tokens) is taken up front; 390 come back once the call reports 10 used
+    assert estimate_tokens("x" * 400, "y" * 400, 200) == 400
+    assert run(scenario()) == pytest.approx(5990, abs=1)
+
+def test_rate_limit_pauses_and_retries(restore_backend):
+    async def scenario():
+        scripted = ScriptedBackend(rate_limits=1)
+        scripted.release.set()
+        llm.set_backend(scripted)
+        scheduler = LLMScheduler(requests_per_minute=0, tokens_per_minute=0, max_in_flight=10)
+        started = time.monotonic()
+        completion = await scheduler.complete(PRIORITY_INTERACTIVE, "model", "", "hello")
+        return completion, time.monotonic() - started, scheduler
+    
+    completion, elapsed, scheduler = run(scenario())
+    assert completion.text == "hello"
+    # The retry waited out the provider's Retry-After
+    assert elapsed >= 0.04
+    assert scheduler.stats()["priorities"]["interactive"]["rate_limited"] == 1
+
+def test_cancelled_waiter_gives_up_its_place(restore_backend):
+    async def scenario():
+        scripted = ScriptedBackend()
+        llm.set_backend(scripted)
+        scheduler = LLMScheduler(requests_per_minute=0, tokens_per_minute=0, max_in_flight=1)
+        first = asyncio.create_task(scheduler.complete(PRIORITY_INTERACTIVE, "model", "", "first"))
+        await asyncio.sleep(0)
+        abandoned = asyncio.create_task(scheduler.complete(PRIORITY_INTERACTIVE, "model", "", "abandoned"))
+        second = asyncio.create_task(scheduler.complete(PRIORITY_PREFETCH, "model", "", "second"))
+        await asyncio.sleep(0.01)
+        abandoned.cancel()
+        scripted.release.set()
+        await asyncio.gather(first, second)
+        return scripted.started, scheduler
+    
+    started, scheduler = run(scenario())
+    assert started == ["first", "second"]
+    assert scheduler.in_flight == 0
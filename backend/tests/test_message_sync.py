@@ -0,0 +1,63 @@
+def dm_turn(client, campaign_id, message):
+    response = client.post(f"/campaigns/{campaign_id}/dm-input", json={"message": message})
+    assert response.status_code == 200
+    return response.json()
+
+def test_messages_revalidate_with_etag(client, campaign):
+    dm_turn(client, campaign, "A door creaks open")
+    first = client.get(f"/campaigns/{campaign}/messages")
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and first.json()
+    
+    unchanged = client.get(f"/campaigns/{campaign}/messages", headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.headers["ETag"] == etag
+    
+    dm_turn(client, campaign, "Something moves in the dark")
+    changed = client.get(f"/campaigns/{campaign}/messages", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert len(changed.json()) > len(first.json())
+
+def test_since_id_returns_only_newer_messages(client, campaign):
+    dm_turn(client, campaign, "The tavern is quiet")
+    seen = client.get(f"/campaigns/{campaign}/messages").json()
+    last_id = seen[-1]["id"]
+    
+    caught_up = client.get(f"/campaigns/{campaign}/messages", params={"since_id": last_id})
+    assert caught_up.status_code == 200 and caught_up.json() == []
+    
+    turn = dm_turn(client, campaign, "A stranger walks in")
+    newer = client.get(f"/campaigns/{campaign}/messages", params={"since_id": last_id}).json()
+    ids = [message["id"] for message in newer]
+    assert ids == sorted(ids) and ids[0] > last_id
+    assert newer[0]["id"] == turn["dm_message_id"] and newer[0]["role"] == "dm"
+    assert len(newer) == 1 + len(turn["party_responses"])
+
+def test_since_id_etag_tracks_the_cursor(client, campaign):
+    dm_turn(client, campaign, "Rain starts to fall")
+    last_id = client.get(f"/campaigns/{campaign}/messages").json()[-1]["id"]
+    polled = client.get(f"/campaigns/{campaign}/messages", params={"since_id": last_id})
+    etag = polled.headers["ETag"]
+    assert client.get(
+        f"/campaigns/{campaign}/messages", params={"since_id": last_id}, headers={"If-None-Match": etag}
+    ).status_code == 304
+    # Another cursor is a different response, even with no new messages
+    assert client.get(
+        f"/campaigns/{campaign}/messages", params={"since_id": last_id - 1}, headers={"If-None-Match": etag}
+    ).status_code == 200
+
+def test_keyset_pages_do_not_overlap(client, campaign):
+    for line in ("One", "Two", "Three"):
+        dm_turn(client, campaign, line)
+    everything = [message["id"] for message in client.get(f"/campaigns/{campaign}/messages").json()]
+    newest = client.get(f"/campaigns/{campaign}/messages", params={"limit": 2}).json()
+    older = client.get(f"/campaigns/{campaign}/messages", params={"limit": 2, "before_id": newest[0]["id"]}).json()
+    assert [message["id"] for message in older + newest] == everything[-4:]
+    assert client.get(f"/campaigns/{campaign}/messages", params={"limit": 501}).status_code == 400
+
+def test_characters_revalidate_with_etag(client, campaign):
+    first = client.get(f"/campaigns/{campaign}/characters")
+    assert first.status_code == 200 and len(first.json()) == 2
+    again = client.get(f"/campaigns/{campaign}/characters", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
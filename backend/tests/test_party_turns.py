@@ -0,0 +1,146 @@
+import asyncio
+import time
+from app import llm
+from app.database import SessionLocal
+from app.game_engine import GameEngine
+from app.llm import Completion, FakeBackend, LLMError
+from app.party_batch import party_mode_stats
+
+class RecordingBackend(FakeBackend):
+    name = "recording"
+    
+    def __init__(self):
+        super().__init__(latency=0, jitter=0, output_tokens=5)
+        self.prompts = []
+    
+    async def complete(self, model, instructions, prompt, temperature=0.8, max_tokens=200, schema=None):
+        self.prompts.append(prompt)
+        return await super().complete(model, instructions, prompt, temperature, max_tokens, schema)
+    
+    async def stream(self, model, instructions, prompt, temperature=0.8, max_tokens=200):
+        self.prompts.append(prompt)
+        async for delta in super().stream(model, instructions, prompt, temperature, max_tokens):
+            yield delta
+
+def recording():
+    previous = llm._backend
+    backend = RecordingBackend()
+    llm.set_backend(backend)
+    return backend, previous
+
+def stream_turn(client, campaign_id, message):
+    with client.stream("POST", f"/campaigns/{campaign_id}/dm-input/stream", json={"message": message}) as response:
+        assert response.status_code == 200
+        return [line for line in response.iter_lines() if line.startswith("data:")]
+
+def test_streamed_and_plain_turns_send_the_dm_message_once(client, campaign):
+    backend, previous = recording()
+    try:
+        assert client.post(f"/campaigns/{campaign}/dm-input", json={"message": "Plain turn"}).status_code == 200
+        plain = list(backend.prompts)
+        stream_turn(client, campaign, "Streamed turn")
+        streamed = backend.prompts[len(plain):]
+    finally:
+        llm.set_backend(previous)
+    
+    assert len(plain) == 2 and len(streamed) == 2
+    assert all(prompt.count("Plain turn") == 1 for prompt in plain)
+    assert all(prompt.count("Streamed turn") == 1 for prompt in streamed)
+    # The earlier turn is context for the streamed one, exactly as dm-input would have seen it
+    assert all("Plain turn" in prompt for prompt in streamed)
+
+def test_failed_draft_reply_streams_a_live_reply(client, campaign):
+    async def scenario():
+        db = SessionLocal()
+        try:
+            engine = GameEngine(db)
+            characters = engine.get_characters(campaign)
+            failed = asyncio.get_running_loop().create_future()
+            failed.set_exception(LLMError("draft failed"))
+            return [
+                event async for event in engine.stream_party_responses(
+                    campaign, "The bridge collapses", speculative={characters[0].id: failed}
+                )
+            ]
+        finally:
+            db.close()
+    
+    events = asyncio.run(scenario())
+    done = [event for event in events if event["type"] == "done"]
+    assert len(done) == 2
+    assert not any(event["fallback"] for event in done)
+    assert {event["character_id"] for event in events if event["type"] == "token"} == {
+        event["character_id"] for event in done
+    }
+
+class HangingBackend(FakeBackend):
+    name = "hanging"
+    
+    async def complete(self, model, instructions, prompt, temperature=0.8, max_tokens=200, schema=None):
+        await asyncio.sleep(60)
+
+def test_batch_fallback_stays_within_the_turn_timeout(client, campaign):
+    assert client.patch(f"/campaigns/{campaign}/settings", json={"party_mode": "batch"}).status_code == 200
+    
+    async def scenario():
+        db = SessionLocal()
+        try:
+            started = time.perf_counter()
+            responses = await GameEngine(db).get_party_responses(campaign, "Who goes first?", timeout=0.4)
+            return responses, time.perf_counter() - started
+        finally:
+            db.close()
+    
+    previous = llm._backend
+    llm.set_backend(HangingBackend())
+    try:
+        responses, elapsed = asyncio.run(scenario())
+    finally:
+        llm.set_backend(previous)
+    
+    assert [response["status"] for response in responses] == ["no_response", "no_response"]
+    # The batch call and the per-character fallbacks share one timeout instead of each getting it
+    assert elapsed < 0.7
+
+class CombatRaceBackend(FakeBackend):
+    # A combat action that finishes right after a party reply, as a combat prefetch can
+    name = "combat_race"
+    
+    def __init__(self):
+        super().__init__(latency=0, jitter=0, output_tokens=5)
+        self.party_replied = asyncio.Event()
+    
+    async def complete(self, model, instructions, prompt, temperature=0.8, max_tokens=200, schema=None):
+        if "COMBAT SITUATION" in prompt:
+            await self.party_replied.wait()
+            return Completion(text="I attack.", model=model, input_tokens=1000, output_tokens=1000)
+        completion = await super().complete(model, instructions, prompt, temperature, max_tokens, schema)
+        self.party_replied.set()
+        return completion
+
+def test_combat_prefetch_does_not_leak_into_party_usage(client, campaign):
+    assert client.patch(f"/campaigns/{campaign}/settings", json={"party_mode": "individual"}).status_code == 200
+    
+    async def scenario():
+        db = SessionLocal()
+        try:
+            engine = GameEngine(db)
+            characters = engine.get_characters(campaign)
+            player = engine._get_ai_players(campaign, characters)[characters[0].id]
+            before = party_mode_stats.snapshot()["individual"]
+            prefetch = asyncio.create_task(player.get_combat_action("Goblins ahead"))
+            await engine.get_party_responses(campaign, "Goblins burst out of the bushes")
+            await prefetch
+            return before, party_mode_stats.snapshot()["individual"]
+        finally:
+            db.close()
+    
+    previous = llm._backend
+    llm.set_backend(CombatRaceBackend())
+    try:
+        before, after = asyncio.run(scenario())
+    finally:
+        llm.set_backend(previous)
+    
+    assert after["llm_calls"] - before["llm_calls"] == 2
+    assert after["output_tokens"] - before["output_tokens"] == 10
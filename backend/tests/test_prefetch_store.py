@@ -0,0 +1,78 @@
+import asyncio
+from app.combat_engine import CombatPrefetcher
+from app.database import SessionLocal
+from app.game_engine import GameEngine, turn_fingerprint
+from app.prefetch_store import prefetch_store
+from app.speculation import Speculator
+
+def players_and_state(campaign):
+    db = SessionLocal()
+    try:
+        engine = GameEngine(db)
+        state = engine.load_turn_state(campaign)
+        return engine._get_ai_players(campaign, state.characters), state
+    finally:
+        db.close()
+
+async def settle(tasks):
+    saved = prefetch_store.saved
+    tasks = list(tasks)
+    await asyncio.gather(*tasks)
+    # The results are shared in the background once each task is done
+    for _ in range(200):
+        if prefetch_store.saved - saved >= len(tasks):
+            return
+        await asyncio.sleep(0.005)
+    raise AssertionError("prefetched results were not shared")
+
+def test_draft_replies_are_shared_with_other_workers(campaign):
+    ai_players, state = players_and_state(campaign)
+    fingerprint = turn_fingerprint(state)
+    draft = "The innkeeper slides a sealed letter across the bar"
+    
+    async def scenario():
+        here, elsewhere = Speculator(), Speculator()
+        assert here.submit(campaign, draft, fingerprint, ai_players, state.party_context) == "started"
+        await settle(here._entries[campaign].tasks.values())
+        shared = await asyncio.to_thread(elsewhere.take_shared, campaign, draft + "!", fingerprint)
+        again = await asyncio.to_thread(elsewhere.take_shared, campaign, draft, fingerprint)
+        return shared, again, elsewhere.stats()
+    
+    shared, again, stats = asyncio.run(scenario())
+    assert set(shared) == set(ai_players)
+    assert all(text and completion.output_tokens for text, completion in shared.values())
+    # Taken results are gone, so no other worker can reuse them
+    assert again == {}
+    assert stats["shared_hits"] == 1 and stats["near_hits"] == 1
+
+def test_shared_draft_replies_need_a_matching_state_and_message(campaign):
+    ai_players, state = players_and_state(campaign)
+    fingerprint = turn_fingerprint(state)
+    
+    async def scenario():
+        here, elsewhere = Speculator(), Speculator()
+        here.submit(campaign, "A dragon lands on the tower roof", fingerprint, ai_players, state.party_context)
+        await settle(here._entries[campaign].tasks.values())
+        stale = await asyncio.to_thread(elsewhere.take_shared, campaign, "A dragon lands on the tower roof", "other")
+        unrelated = await asyncio.to_thread(
+            elsewhere.take_shared, campaign, "You find a quiet inn for the night", fingerprint
+        )
+        return stale, unrelated
+    
+    assert asyncio.run(scenario()) == ({}, {})
+
+def test_combat_actions_are_shared_per_round(campaign):
+    ai_players, state = players_and_state(campaign)
+    character_id = next(iter(ai_players))
+    
+    async def scenario():
+        here, elsewhere = CombatPrefetcher(), CombatPrefetcher()
+        here.schedule(campaign, character_id, "Goblins ahead", 2, ai_players[character_id], state.party_context)
+        await settle([task for _, task in here._tasks.values()])
+        wrong_round = await elsewhere.take(campaign, character_id, "Goblins ahead", 3)
+        shared = await elsewhere.take(campaign, character_id, "Goblins ahead", 2)
+        return wrong_round, await shared, elsewhere.stats()
+    
+    wrong_round, action, stats = asyncio.run(scenario())
+    assert wrong_round is None and action
+    assert stats["shared_hits"] == 1 and stats["misses"] == 1
@@ -0,0 +1,17 @@
+from app.database import SessionLocal
+from app.game_engine import GameEngine
+
+def test_negative_dice_seed_is_rejected(client, campaign):
+    response = client.patch(f"/campaigns/{campaign}/settings", json={"dice_seed": -1})
+    assert response.status_code == 400
+    
+    response = client.patch(f"/campaigns/{campaign}/settings", json={"dice_seed": 5})
+    assert response.status_code == 200 and response.json()["dice_seed"] == 5
+
+def test_unset_dice_seed_is_accepted(campaign):
+    db = SessionLocal()
+    try:
+        settings = GameEngine(db).update_settings(campaign, {"dice_seed": None, "party_mode": "batch"})
+    finally:
+        db.close()
+    assert "error" not in settings and settings["party_mode"] == "batch"
@@ -0,0 +1,33 @@
+import asyncio
+from app import context_manager
+from app.database import SessionLocal
+from app.models import Campaign, CampaignSummary
+
+def summary_row(campaign_id):
+    db = SessionLocal()
+    try:
+        summary = db.query(CampaignSummary).filter(CampaignSummary.campaign_id == campaign_id).first()
+        version = db.query(Campaign.state_version).filter(Campaign.id == campaign_id).scalar()
+        return (summary.content, summary.last_message_id) if summary else None, version
+    finally:
+        db.close()
+
+def test_summary_folds_old_messages_and_skips_stale_writes(client, campaign, monkeypatch):
+    monkeypatch.setattr(context_manager, "SUMMARY_KEEP_RECENT", 2)
+    monkeypatch.setattr(context_manager, "SUMMARY_MIN_NEW_MESSAGES", 3)
+    for line in ("The gate opens", "A guard shouts"):
+        assert client.post(f"/campaigns/{campaign}/dm-input", json={"message": line}).status_code == 200
+    messages = client.get(f"/campaigns/{campaign}/messages").json()
+    
+    asyncio.run(context_manager._update_summary(campaign))
+    (content, last_message_id), version = summary_row(campaign)
+    assert content
+    assert last_message_id == messages[-3]["id"]
+    
+    # A second writer that started from no summary (or an older one) loses
+    context_manager._save_summary(campaign, "stale", 0, messages[-1]["id"])
+    assert summary_row(campaign) == ((content, last_message_id), version)
+    
+    # Too few new messages since the last fold: nothing to do
+    asyncio.run(context_manager._update_summary(campaign))
+    assert summary_row(campaign) == ((content, last_message_id), version)
@@ -35,8 +35,13 @@ function ChatLog({ messages, characters }) {
         </div>
       );
     } else if (msg.role === 'player') {
+      const fallback = msg.message_type === 'fallback';
       return (
-        <div key={msg.id} className="message player-message">
+        <div
+          key={msg.id}
+          className={`message player-message${msg.streaming ? ' streaming' : ''}${fallback ? ' fallback' : ''}`}
+          title={fallback ? 'Stand-in reply: the AI was unavailable' : undefined}
+        >
           <div className="message-header">
             <span className="message-author player-badge">
               ⚔️ {getCharacterName(msg.character_id)}
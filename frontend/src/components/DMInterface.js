@@ -1,13 +1,45 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import axios from 'axios';
 import './DMInterface.css';
 
-function DMInterface({ campaignId, characters, onNewMessages }) {
+function DMInterface({ campaignId, characters, onNewMessages, onMessageUpdate }) {
   const [message, setMessage] = useState('');
   const [loading, setLoading] = useState(false);
   const [suggestions, setSuggestions] = useState([]);
   const [showSuggestions, setShowSuggestions] = useState(false);
   const [loadingSuggestions, setLoadingSuggestions] = useState(false);
+  const [speculative, setSpeculative] = useState(false);
+
+  useEffect(() => {
+    axios.get(`/api/campaigns/${campaignId}`)
+      .then(response => setSpeculative(Boolean(response.data.settings.speculative_drafts)))
+      .catch(error => console.error('Failed to load campaign settings:', error));
+  }, [campaignId]);
+
+  // Let the party start on the draft once the DM pauses typing
+  useEffect(() => {
+    if (!speculative || loading || message.trim().length < 20) return;
+
+    const timer = setTimeout(() => {
+      axios.post(`/api/campaigns/${campaignId}/dm-input/draft`, { message })
+        .then(response => {
+          if (response.data.status === 'disabled') setSpeculative(false);
+        })
+        .catch(error => console.error('Failed to send draft:', error));
+    }, 1200);
+    return () => clearTimeout(timer);
+  }, [campaignId, message, speculative, loading]);
+
+  const toggleSpeculative = async () => {
+    try {
+      const response = await axios.patch(`/api/campaigns/${campaignId}/settings`, {
+        speculative_drafts: !speculative
+      });
+      setSpeculative(Boolean(response.data.speculative_drafts));
+    } catch (error) {
+      console.error('Failed to update settings:', error);
+    }
+  };
 
   const handleSubmit = async (e) => {
     e.preventDefault();
@@ -17,28 +49,80 @@ function DMInterface({ campaignId, characters, onNewMessages }) {
     const dmMessage = message;
     setMessage('');
 
+    const dmId = `dm-${Date.now()}`;
+    onNewMessages([{
+      id: dmId,
+      role: 'dm',
+      content: dmMessage,
+      timestamp: new Date().toISOString()
+    }]);
+
+    const streamIds = {};
+    const handleEvent = (event) => {
+      if (event.type === 'dm') {
+        onMessageUpdate({ id: dmId, newId: event.message_id });
+      } else if (event.type === 'token') {
+        if (!streamIds[event.character_id]) {
+          streamIds[event.character_id] = `stream-${Date.now()}-${event.character_id}`;
+        }
+        onMessageUpdate({
+          id: streamIds[event.character_id],
+          role: 'player',
+          delta: event.delta,
+          character_id: event.character_id,
+          timestamp: new Date().toISOString(),
+          streaming: true
+        });
+      } else if (event.type === 'done') {
+        onMessageUpdate({
+          id: streamIds[event.character_id] || `stream-${Date.now()}-${event.character_id}`,
+          role: 'player',
+          newId: event.message_id,
+          content: event.response,
+          character_id: event.character_id,
+          message_type: event.fallback ? 'fallback' : 'narrative',
+          timestamp: new Date().toISOString(),
+          streaming: false
+        });
+      } else if (event.type === 'no_response') {
+        onMessageUpdate({
+          id: streamIds[event.character_id] || `stream-${Date.now()}-${event.character_id}`,
+          role: 'system',
+          content: `${event.character_name} does not respond.`,
+          character_id: event.character_id,
+          timestamp: new Date().toISOString(),
+          streaming: false
+        });
+      } else if (event.type === 'error') {
+        throw new Error(event.detail);
+      }
+    };
+
     try {
-      const response = await axios.post(`/api/campaigns/${campaignId}/dm-input`, {
-        message: dmMessage
+      const response = await fetch(`/api/campaigns/${campaignId}/dm-input/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ message: dmMessage })
       });
+      if (!response.ok) {
+        throw new Error(`Request failed with status ${response.status}`);
+      }
 
-      const newMessages = [
-        {
-          id: Date.now(),
-          role: 'dm',
-          content: dmMessage,
-          timestamp: new Date().toISOString()
-        },
-        ...response.data.party_responses.map((resp, idx) => ({
-          id: Date.now() + idx + 1,
-          role: 'player',
-          content: resp.response,
-          character_id: resp.character_id,
-          timestamp: new Date().toISOString()
-        }))
-      ];
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
 
-      onNewMessages(newMessages);
+        buffer += decoder.decode(value, { stream: true });
+        const frames = buffer.split('\n\n');
+        buffer = frames.pop();
+        frames
+          .filter(frame => frame.startsWith('data: '))
+          .forEach(frame => handleEvent(JSON.parse(frame.slice(6))));
+      }
     } catch (error) {
       console.error('Failed to send message:', error);
       alert('Failed to get party response. Please try again.');
@@ -122,6 +206,14 @@ function DMInterface({ campaignId, characters, onNewMessages }) {
           <div className="character-count">
             {message.length} characters
           </div>
+          <label className="speculative-toggle" title="Start party replies while you type">
+            <input
+              type="checkbox"
+              checked={speculative}
+              onChange={toggleSpeculative}
+            />
+            ⚡ Think ahead
+          </label>
           <button 
             type="submit" 
             className="send-button"
@@ -6,6 +6,9 @@ function DiceRoller({ campaignId }) {
   const [selectedDice, setSelectedDice] = useState('d20');
   const [count, setCount] = useState(1);
   const [modifier, setModifier] = useState(0);
+  const [expression, setExpression] = useState('');
+  const [dc, setDc] = useState('');
+  const [odds, setOdds] = useState(null);
   const [result, setResult] = useState(null);
   const [rolling, setRolling] = useState(false);
 
@@ -14,19 +17,31 @@ function DiceRoller({ campaignId }) {
   const rollDice = async () => {
     setRolling(true);
     try {
-      const response = await axios.post(`/api/campaigns/${campaignId}/roll-dice`, {
-        dice_type: selectedDice,
-        count: count,
-        modifier: modifier
-      });
+      const request = expression.trim()
+        ? { expression: expression.trim() }
+        : { dice_type: selectedDice, count: count, modifier: modifier };
+      const response = await axios.post(`/api/campaigns/${campaignId}/roll-dice`, request);
 
       setResult(response.data);
+
+      setOdds(null);
+      if (dc !== '') {
+        const analysis = await axios.post('/api/dice/analyze', {
+          expression: response.data.expression,
+          dc: parseInt(dc),
+          include_outcomes: false
+        });
+        setOdds(analysis.data);
+      }
       
       setTimeout(() => {
         setRolling(false);
       }, 500);
     } catch (error) {
       console.error('Failed to roll dice:', error);
+      if (error.response?.status === 400) {
+        alert(error.response.data.detail);
+      }
       setRolling(false);
     }
   };
@@ -70,12 +85,33 @@ function DiceRoller({ campaignId }) {
         </div>
       </div>
 
+      <div className="dice-options">
+        <div className="option-group">
+          <label>Expression</label>
+          <input
+            type="text"
+            placeholder="e.g. 4d6kh3, 2d20kl1+5"
+            value={expression}
+            onChange={(e) => setExpression(e.target.value)}
+          />
+        </div>
+        <div className="option-group">
+          <label>DC</label>
+          <input
+            type="number"
+            min="1"
+            value={dc}
+            onChange={(e) => setDc(e.target.value)}
+          />
+        </div>
+      </div>
+
       <button 
         className="roll-button"
         onClick={rollDice}
         disabled={rolling}
       >
-        {rolling ? '🎲 Rolling...' : `Roll ${count}${selectedDice}${modifier !== 0 ? (modifier > 0 ? `+${modifier}` : modifier) : ''}`}
+        {rolling ? '🎲 Rolling...' : `Roll ${expression.trim() || `${count}${selectedDice}${modifier !== 0 ? (modifier > 0 ? `+${modifier}` : modifier) : ''}`}`}
       </button>
 
       {result && !rolling && (
@@ -88,6 +124,11 @@ function DiceRoller({ campaignId }) {
             Rolls: [{result.rolls.join(', ')}]
             {result.modifier !== 0 && ` ${result.modifier > 0 ? '+' : ''}${result.modifier}`}
           </div>
+          {odds && (
+            <div className="result-details">
+              Chance of {odds.dc}+: {(odds.p_at_least_dc * 100).toFixed(1)}% (average {odds.mean.toFixed(1)})
+            </div>
+          )}
         </div>
       )}
     </div>
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 import './GameInterface.css';
 import PartyView from './PartyView';
@@ -6,13 +6,26 @@ import ChatLog from './ChatLog';
 import DMInterface from './DMInterface';
 import DiceRoller from './DiceRoller';
 
+const SYNC_INTERVAL_MS = 5000;
+
+const latestMessageId = (messages) =>
+  messages.reduce((max, msg) => (Number.isInteger(msg.id) && msg.id > max ? msg.id : max), 0);
+
 function GameInterface({ campaignId, campaignData, onNewGame }) {
   const [characters, setCharacters] = useState([]);
   const [messages, setMessages] = useState([]);
   const [loading, setLoading] = useState(true);
+  const messagesRef = useRef([]);
+  const charactersEtagRef = useRef(null);
+
+  useEffect(() => {
+    messagesRef.current = messages;
+  }, [messages]);
 
   useEffect(() => {
     loadCampaignData();
+    const timer = setInterval(syncCampaignData, SYNC_INTERVAL_MS);
+    return () => clearInterval(timer);
   }, [campaignId]);
 
   const loadCampaignData = async () => {
@@ -22,6 +35,7 @@ function GameInterface({ campaignId, campaignData, onNewGame }) {
         axios.get(`/api/campaigns/${campaignId}/messages`)
       ]);
 
+      charactersEtagRef.current = charsResponse.headers.etag || null;
       setCharacters(charsResponse.data);
       setMessages(msgsResponse.data);
       setLoading(false);
@@ -31,10 +45,54 @@ function GameInterface({ campaignId, campaignData, onNewGame }) {
     }
   };
 
+  const syncCampaignData = async () => {
+    try {
+      const [charsResponse, msgsResponse] = await Promise.all([
+        axios.get(`/api/campaigns/${campaignId}/characters`, {
+          headers: charactersEtagRef.current ? { 'If-None-Match': charactersEtagRef.current } : {},
+          validateStatus: status => status === 200 || status === 304
+        }),
+        axios.get(`/api/campaigns/${campaignId}/messages`, {
+          params: { since_id: latestMessageId(messagesRef.current) }
+        })
+      ]);
+
+      if (charsResponse.status === 200) {
+        charactersEtagRef.current = charsResponse.headers.etag || null;
+        setCharacters(charsResponse.data);
+      }
+      if (msgsResponse.data.length > 0) {
+        setMessages(prev => {
+          const known = new Set(prev.map(msg => msg.id));
+          return [...prev, ...msgsResponse.data.filter(msg => !known.has(msg.id))];
+        });
+      }
+    } catch (error) {
+      console.error('Failed to sync campaign data:', error);
+    }
+  };
+
   const handleNewMessages = (newMessages) => {
     setMessages(prev => [...prev, ...newMessages]);
   };
 
+  const handleMessageUpdate = ({ delta, newId, ...update }) => {
+    setMessages(prev => {
+      const idx = prev.findIndex(msg => msg.id === update.id);
+      if (idx === -1) {
+        return [...prev, { ...update, id: newId ?? update.id, content: update.content ?? delta ?? '' }];
+      }
+      // A sync may already have appended the saved copy of this message
+      if (newId !== undefined && prev.some(msg => msg.id === newId)) {
+        return prev.filter((_, i) => i !== idx);
+      }
+      const next = [...prev];
+      const content = update.content ?? next[idx].content + (delta ?? '');
+      next[idx] = { ...next[idx], ...update, id: newId ?? update.id, content };
+      return next;
+    });
+  };
+
   if (loading) {
     return <div className="loading">Loading campaign...</div>;
   }
@@ -63,6 +121,7 @@ function GameInterface({ campaignId, campaignData, onNewGame }) {
             campaignId={campaignId} 
             characters={characters}
             onNewMessages={handleNewMessages}
+            onMessageUpdate={handleMessageUpdate}
           />
         </div>
       </div>